@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+# Run the benchmarks and print the results as JSON:
+#
+#   python -m benchmarks --sizes 100,1000,10000 --output results.json
+#   python -m benchmarks --compare results.json
+
+import argparse
+import json
+import sys
+
+from .runner import BenchmarkRunner
+
+
+parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                 description='Pipeline parser benchmarks.')
+parser.add_argument('--seed', type=int, default=0,
+                    help='seed of the pipeline generator')
+parser.add_argument('--sizes', default='100,1000,10000',
+                    help='comma separated numbers of elements')
+parser.add_argument('--repeat', type=int, default=5,
+                    help='times each benchmark is run')
+parser.add_argument('--filter', default='',
+                    help='only run the benchmarks with this in the name')
+parser.add_argument('--output', default='',
+                    help='write the results to this file')
+parser.add_argument('--compare', default='',
+                    help='compare the results with a previous results file')
+parser.add_argument('--threshold', type=float, default=1.1,
+                    help='ratio over the previous time reported as '
+                         'a regression')
+args = parser.parse_args()
+
+runner = BenchmarkRunner(args.seed,
+                         [int(size) for size in args.sizes.split(',')],
+                         args.repeat,
+                         args.filter)
+results = runner.run()
+
+if args.output == '':
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+else:
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+if args.compare != '':
+    with open(args.compare) as f:
+        previous = json.load(f)
+
+    regressions = runner.compare(previous, results, args.threshold)
+
+    for name, ratio in regressions:
+        sys.stderr.write('{0}: {1:.2f}x slower\n'.format(name, ratio))
+
+    if regressions != []:
+        sys.exit(1)
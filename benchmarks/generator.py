@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import copy
+import random
+
+
+""" Seeded generator of synthetic pipeline descriptions """
+class PipelineGenerator:
+    """
+    elements: number of elements in the pipeline.
+    chainLength: maximum number of elements piped in a chain.
+    referenceDensity: probability of piping a reference to a named element
+                      instead of a new element.
+    signalSlotDensity: average number of signals & slots per element.
+    valueSize: number of items in list and dictionary property values.
+    valueDepth: nesting depth of list and dictionary property values.
+    unavailableRatio: fraction of element types not in the available
+                      elements types.
+    """
+    def __init__(self,
+                 seed=0,
+                 elements=1000,
+                 chainLength=4,
+                 referenceDensity=0.1,
+                 signalSlotDensity=0.1,
+                 properties=2,
+                 valueSize=3,
+                 valueDepth=1,
+                 elementTypes=20,
+                 unavailableRatio=0.0):
+        self.random = random.Random(seed)
+        self.elements = elements
+        self.chainLength = chainLength
+        self.referenceDensity = referenceDensity
+        self.signalSlotDensity = signalSlotDensity
+        self.properties = properties
+        self.valueSize = valueSize
+        self.valueDepth = valueDepth
+        self.elementTypes = ['element{0}'.format(i)
+                             for i in range(elementTypes)]
+        unavailable = int(elementTypes * unavailableRatio)
+        self.availableElementTypes = self.elementTypes[unavailable:]
+        self.nameCount = 0
+
+    """ Returns a random property value in the pipeline syntax. """
+    def value(self, depth=None):
+        if depth == None:
+            depth = self.valueDepth
+
+        kind = self.random.randrange(6 if depth > 0 else 4)
+
+        if kind == 0:
+            return str(self.random.randrange(1000))
+        elif kind == 1:
+            return '{0:.3f}'.format(self.random.uniform(-100, 100))
+        elif kind == 2:
+            return 'value{0}'.format(self.random.randrange(100))
+        elif kind == 3:
+            return '"string {0}!"'.format(self.random.randrange(100))
+        elif kind == 4:
+            return '[' + ', '.join(self.value(depth - 1)
+                                   for i in range(self.valueSize)) + ']'
+
+        return '{' + ', '.join('"key{0}": {1}'.format(i, self.value(depth - 1))
+                               for i in range(self.valueSize)) + '}'
+
+    """
+    Returns a new random element as [elementName, objectName, properties,
+    ss], named elements are added to 'names'.
+    """
+    def element(self, names):
+        properties = {}
+
+        for i in range(self.properties):
+            properties['prop{0}'.format(i)] = self.value()
+
+        ss = []
+
+        # Each element has signalSlotDensity signals & slots on average.
+        count = int(self.signalSlotDensity)
+
+        if self.random.random() < self.signalSlotDensity - count:
+            count += 1
+
+        for i in range(count):
+            if names != []:
+                ss.append('signal{0}()>{1}.slot{0}()'.
+                          format(self.random.randrange(10),
+                                 self.random.choice(names)))
+
+        objectName = None
+
+        if self.random.random() < self.referenceDensity:
+            objectName = 'name{0}'.format(self.nameCount)
+            self.nameCount += 1
+            names.append(objectName)
+
+        return [self.random.choice(self.elementTypes),
+                objectName,
+                properties,
+                ss]
+
+    """
+    Returns a random pipeline model, a list of chains, each one a list of
+    elements or references.
+    """
+    def model(self):
+        chains = []
+        names = []
+        count = 0
+
+        while count < self.elements:
+            chain = []
+
+            for i in range(self.random.randint(1, self.chainLength)):
+                if names != [] and \
+                   self.random.random() < self.referenceDensity:
+                    chain.append(self.random.choice(names) + '.')
+                elif count < self.elements:
+                    chain.append(self.element(names))
+                    count += 1
+
+            if chain != []:
+                chains.append(chain)
+
+        return chains
+
+    """ Converts a pipeline model into a pipeline description. """
+    def render(self, model):
+        chains = []
+
+        for chain in model:
+            items = []
+
+            for item in chain:
+                if isinstance(item, str):
+                    items.append(item)
+
+                    continue
+
+                elementName, objectName, properties, ss = item
+                parts = [elementName]
+
+                if objectName != None:
+                    parts.append('objectName=' + objectName)
+
+                for key in properties:
+                    parts.append('{0}={1}'.format(key, properties[key]))
+
+                items.append(' '.join(parts + ss))
+
+            chains.append(' ! '.join(items))
+
+        return '\n'.join(chains)
+
+    """ Returns a new random pipeline description. """
+    def pipeline(self):
+        return self.render(self.model())
+
+    """
+    Returns a copy of the model with a fraction 'ratio' of its elements
+    edited: a property changed, the element type changed, the element
+    removed or a new element inserted after it. Named elements are never
+    removed, so all references are kept valid.
+    """
+    def edit(self, model, ratio):
+        model = copy.deepcopy(model)
+        elements = [(chain, item) for chain in model
+                                  for item in chain
+                                  if not isinstance(item, str)]
+        count = int(len(elements) * ratio)
+
+        for chain, item in self.random.sample(elements, count):
+            kind = self.random.randrange(4)
+            index = next(i for i in range(len(chain)) if chain[i] is item)
+
+            if kind == 0 and item[2] != {}:
+                key = self.random.choice(list(item[2]))
+                item[2][key] = self.value()
+            elif kind == 1:
+                item[0] = self.random.choice(self.elementTypes)
+            elif kind == 2 and item[1] == None and len(chain) > 1:
+                del chain[index]
+            else:
+                chain.insert(index + 1, self.element([]))
+
+        return model
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import json
+import platform
+import statistics
+import sys
+import time
+
+from pipelineparser import PipelineParser
+from .generator import PipelineGenerator
+
+
+""" Runs the benchmarks and collects the timings """
+class BenchmarkRunner:
+    # Values for the parseValue() benchmarks.
+    values = {'int': '1234567',
+              'float': '3.14159',
+              'string': 'value',
+              'quoted': '"Hello, world ! \\"quoted\\""',
+              'list': '[1, 2.5, "three", four, 5]',
+              'dict': '{"a": 1, "b": [2, 3], "c": {"d": "e"}}',
+              'nested': '[' * 50 + '1' + ']' * 50}
+
+    # Fraction of edited elements in the pipelineDiff() benchmarks.
+    editRatios = [0.01, 0.1, 0.5]
+
+    """
+    sizes: the numbers of elements of the generated pipelines.
+    repeat: times each benchmark is run, the results keep all timings.
+    nameFilter: only run the benchmarks with this string in the name.
+    """
+    def __init__(self, seed=0, sizes=[100, 1000], repeat=5, nameFilter=''):
+        self.seed = seed
+        self.sizes = sizes
+        self.repeat = repeat
+        self.nameFilter = nameFilter
+        self.results = []
+
+    """
+    Run 'function' 'repeat' times and add its timings to the results,
+    'setup' is called before each run and is not timed. 'loops' is the
+    number of calls done by function, the times are given per call.
+    """
+    def measure(self, name, params, function, setup=None, loops=1):
+        if not self.nameFilter in name:
+            return
+
+        times = []
+
+        for i in range(self.repeat):
+            if setup != None:
+                setup()
+
+            start = time.perf_counter()
+            function()
+            times.append((time.perf_counter() - start) / loops)
+
+        self.results.append({'name': name,
+                             'params': params,
+                             'times': times,
+                             'min': min(times),
+                             'median': statistics.median(times),
+                             'mean': statistics.mean(times)})
+
+    """ Returns a parser for the generated pipelines. """
+    def parser(self, generator, mode=None):
+        pp = PipelineParser()
+        pp.setAvailableElementsTypes(generator.availableElementTypes)
+
+        if mode != None:
+            pp.setPipelineRoutingMode(mode)
+
+        return pp
+
+    """ parseValue() with each kind of value. """
+    def benchParseValue(self):
+        pp = PipelineParser()
+        loops = 10000
+
+        for kind in self.values:
+            value = self.values[kind]
+
+            def function():
+                for i in range(loops):
+                    pp.parseValue(value)
+
+            self.measure('parseValue/' + kind,
+                         {'value': value},
+                         function,
+                         loops=loops)
+
+    """
+    parsePipeline() in each routing mode. Fail mode gives an empty graph if
+    any element type is unavailable, so all the types are available in it.
+    """
+    def benchParsePipeline(self):
+        modes = PipelineParser.PipelineRoutingMode
+
+        for size in self.sizes:
+            generator = PipelineGenerator(self.seed,
+                                          elements=size,
+                                          unavailableRatio=0.2)
+            pipeline = generator.pipeline()
+
+            for modeName in ['NoCheck', 'Fail', 'Remove', 'Force']:
+                pp = self.parser(generator, getattr(modes, modeName))
+
+                if modeName == 'Fail':
+                    pp.setAvailableElementsTypes(generator.elementTypes)
+
+                # An empty graph would only time the parsing until the first
+                # unavailable element.
+                if self.nameFilter in 'parsePipeline/' + modeName and \
+                   pp.parsePipeline(pipeline)[0] == {}:
+                    raise RuntimeError('parsePipeline/{0} gives an empty '
+                                       'graph'.format(modeName))
+
+                self.measure('parsePipeline/' + modeName,
+                             {'elements': size, 'length': len(pipeline)},
+                             lambda: pp.parsePipeline(pipeline))
+
+    """ pipelineDiff() with a fraction of the elements edited. """
+    def benchPipelineDiff(self):
+        for size in self.sizes:
+            generator = PipelineGenerator(self.seed, elements=size)
+            model = generator.model()
+            pipeline1 = generator.render(model)
+
+            for ratio in self.editRatios:
+                pipeline2 = generator.render(generator.edit(model, ratio))
+                pp = self.parser(generator)
+
+                self.measure('pipelineDiff',
+                             {'elements': size, 'editRatio': ratio},
+                             lambda: pp.pipelineDiff(pipeline2),
+                             lambda: pp.pipelineDiff(pipeline1))
+
+    """ Run all the benchmarks and returns the results. """
+    def run(self):
+        self.results = []
+        self.benchParseValue()
+        self.benchParsePipeline()
+        self.benchPipelineDiff()
+
+        return {'meta': {'seed': self.seed,
+                         'repeat': self.repeat,
+                         'python': sys.version,
+                         'implementation': platform.python_implementation(),
+                         'platform': platform.platform(),
+                         'time': time.time()},
+                'results': self.results}
+
+    """
+    Compare the median times of two results, and returns the (name, ratio)
+    of the benchmarks that are 'threshold' times slower in 'current'.
+    """
+    def compare(self, previous, current, threshold=1.1):
+        def key(result):
+            return result['name'] + json.dumps(result['params'],
+                                               sort_keys=True)
+
+        times = {key(result): result['median']
+                 for result in previous['results']}
+        regressions = []
+
+        for result in current['results']:
+            old = times.get(key(result))
+
+            if old != None and old > 0 and \
+               result['median'] / old > threshold:
+                regressions.append((key(result), result['median'] / old))
+
+        return regressions
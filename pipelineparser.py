@@ -20,7 +20,26 @@
 # Email   : hipersayan DOT x AT gmail DOT com
 # Web-Site: http://hipersayanx.blogspot.com/
 
+import asyncio
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
+import copy
+import difflib
+import itertools
+import mmap
+import multiprocessing
+import os
 import re
+import struct
+import time
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 """ Pipeline parse class """
@@ -36,6 +55,26 @@ class PipelineParser:
         ResetProperties = 6
         ConnectElement = 7
         ConnectSignalsAndSlots = 8
+        PatchProperty = 9 # Applied after SetProperties, see setDeepDiff().
+
+    """ Enumerator for the changes of PatchProperty instructions """
+    class PatchOp:
+        SetItem = 0    # Set a dictionary key or a list item.
+        InsertItem = 1 # Insert a list item.
+        DeleteItem = 2 # Delete a dictionary key or a list item.
+
+    # Order in which the instructions are applied.
+    _diffOrder = [DiffOp.DisconnectSignalsAndSlots,
+                  DiffOp.DisconnectElement,
+                  DiffOp.RemoveElement,
+                  DiffOp.ChangeId,
+                  DiffOp.AddElement,
+                  DiffOp.SetProperties,
+                  DiffOp.PatchProperty,
+                  DiffOp.ResetProperties,
+                  DiffOp.ConnectElement,
+                  DiffOp.ConnectSignalsAndSlots]
+    _diffOrder = dict(zip(_diffOrder, range(len(_diffOrder))))
 
     """ Actions to do if some element doesn't exist """
     class PipelineRoutingMode:
@@ -46,6 +85,86 @@ class PipelineParser:
         Force = 3   # If an element doesn't exist try to connect all elements
                     # connected to the lost element.
 
+    """ Enumerator for the tokens returned by tokenize() """
+    class TokenType:
+        Element = 0    # (Element, elementName)
+        Reference = 1  # (Reference, 'objectName.')
+        Pipe = 2       # (Pipe, '!')
+        Property = 3   # (Property, key, value)
+        SignalSlot = 4 # (SignalSlot, sender, signal, receiver, slot)
+                       # sender and receiver are '' for the current element.
+
+    # Marks the end of a chain in _parseChain().
+    _chainEnd = ((TokenType.Pipe, '!'),)
+
+    # Pipeline lexer. The alternatives are tried in order on each position, so
+    # the whole description is tokenized in a single left to right pass.
+    _name = '[a-zA-Z_][0-9a-zA-Z_]*'
+    _method = _name + r' *\( *(?:' + _name + ' *(?:, *' + _name + r')*)? *\)'
+
+    _tokenRe = re.compile('(?P<property>(?P<key>' + _name + ') *= *'
+                          r'(?:(?P<bare>[^\'"\[{\r^\n^ ^!][^\r^\n^ ^!]*)|'
+                          r'(?=[\'"\[{])))|'
+                          '(?P<signalSlot>'
+                          '(?:(?P<lObject>' + _name + r')\.)?'
+                          '(?P<lMethod>' + _method + ')'
+                          ' *(?P<direction><|>) *'
+                          '(?:(?P<rObject>' + _name + r')\.)?'
+                          '(?P<rMethod>' + _method + '))|'
+                          '(?P<reference>' + _name + r'\.)|'
+                          '(?P<element>' + _name + ')|'
+                          '(?P<pipe>!)')
+
+    # Placeholders of compileTemplate().
+    _placeholderRe = re.compile('\\$\\{(' + _name + ')\\}')
+
+    del _name, _method
+
+    # Property values delimiters.
+    _quotedRe = re.compile('"(?:[^"\\\\\r\n]|\\\\.)*"|'
+                           '\'(?:[^\'\\\\\r\n]|\\\\.)*\'')
+    _bracketRe = re.compile('[\\[\\]{}"\'\r\n]')
+    _bareValueRe = re.compile('[^\r^\n^ ^!]+')
+
+    # Text after an element or a reference that keeps it from becoming part
+    # of a longer token, see _finalTokens().
+    _elementEndRe = re.compile(' *[^ =(,)]')
+    _referenceEndRe = re.compile('[^a-zA-Z_]')
+
+    # Value lexer, used by parseValue() for lists and dictionaries.
+    _valueTokenRe = re.compile(r'\s*(?:'
+                               '(?P<string>"(?:[^"\\\\]|\\\\.)*"|'
+                               '\'(?:[^\'\\\\]|\\\\.)*\')|'
+                               '(?P<open>[\\[{])|'
+                               '(?P<close>[\\]}])|'
+                               '(?P<comma>,)|'
+                               '(?P<colon>:)|'
+                               '(?P<word>[^\\s,:\\[\\]{}"\']+))')
+    _escapeRe = re.compile('\\\\([\\\\\'"])')
+
+    # Compact Ids, see setCompactIds().
+    _columnBits = 32
+    _columnMask = (1 << _columnBits) - 1
+
+    # Binary snapshots, see _dumpSnapshot().
+    _snapshotMagic = b'PPGS'
+    _snapshotVersion = 2
+    _snapshotIndex = struct.Struct('<I')
+    _snapshotInt = struct.Struct('<q')
+    _snapshotFloat = struct.Struct('<d')
+
+    """ Enumerator for the records yielded by parseStream() """
+    class StreamRecord:
+        Element = 0    # (Element, id, elementName, properties)
+        Connection = 1 # (Connection, src, dst)
+        SignalSlot = 2 # (SignalSlot, sender, signal, receiver, slot)
+
+    """ Raised when a reference doesn't match the objectName of any element """
+    class UnresolvedReferenceError(KeyError):
+        def __str__(self):
+            return 'There is no element with objectName \'{0}\''. \
+                                                    format(self.args[0][: -1])
+
     """ Take no argumments """
     def __init__(self):
         # Previous pipeline graph.
@@ -55,6 +174,36 @@ class PipelineParser:
         self.availableElementTypes = []
         self.pipelineRoutingMode = self.PipelineRoutingMode.NoCheck
 
+        # Parsed graphs cache.
+        self.parseCacheSize = 0
+        self.parseCache = collections.OrderedDict()
+        self.parseCacheHits = 0
+        self.parseCacheMisses = 0
+        self.parseCacheEvictions = 0
+
+        # Chains of the previous pipeline, used by pipelineEdit().
+        self.editState = None
+
+        # Timings and counters, disabled by default.
+        self.stats = None
+
+        # Integer Ids and element records instead of strings and lists.
+        self.compactIds = False
+
+        # Property values decoded on first use.
+        self.lazyValues = False
+
+        # Minimum size of the property values patched instead of set, 0
+        # disables the patches.
+        self.deepDiffSize = 0
+
+        # (instances, connections, ss, structure) of the previous graph, see
+        # _graphStructure().
+        self.structure1 = None
+
+        # Revisions of the previous graph, disabled by default.
+        self.history = None
+
     """ Set a list of valid elements. """
     def setAvailableElementsTypes(self, availableElementTypes=[]):
         self.availableElementTypes = availableElementTypes
@@ -63,585 +212,4350 @@ class PipelineParser:
     def setPipelineRoutingMode(self, mode=PipelineRoutingMode.NoCheck):
         self.pipelineRoutingMode = mode
 
+    """
+    Set the maximum number of graphs remembered by parsePipeline(). The least
+    recently used graphs are discarded first. 0 disables the cache.
+    """
+    def setParseCacheSize(self, size=0):
+        self.parseCacheSize = size
+
+        while len(self.parseCache) > size:
+            self.parseCache.popitem(False)
+            self.parseCacheEvictions += 1
+
+    """ Discard all cached graphs and reset the counters. """
+    def clearParseCache(self):
+        self.parseCache.clear()
+        self.parseCacheHits = 0
+        self.parseCacheMisses = 0
+        self.parseCacheEvictions = 0
+
+    """ Returns the parse cache counters. """
+    def parseCacheStats(self):
+        return {'size': len(self.parseCache),
+                'maxSize': self.parseCacheSize,
+                'hits': self.parseCacheHits,
+                'misses': self.parseCacheMisses,
+                'evictions': self.parseCacheEvictions}
+
+    """
+    Set a PipelineStats object to record the time spent in each phase of
+    parsePipeline() and pipelineDiff(), and the number of tokens, elements,
+    references, matches and instructions. None disables it.
+    """
+    def setStats(self, stats=None):
+        self.stats = stats
+
+    """
+    Record the graph of every pipelineDiff(), pipelineEdit() and
+    checkoutRevision() call as a new revision of 'history', a PipelineHistory
+    object. None disables it.
+    """
+    def setHistory(self, history=None):
+        self.history = history
+
+    """
+    Use compact Ids and element records in the graphs. The Id of the element
+    in column i and row j is the integer j << 32 | i instead of the 'i,j'
+    string, and the elements are PipelineElement records instead of
+    [elementName, properties] lists, so big graphs take less memory and their
+    Ids are hashed and compared faster. formatId(), formatGraph() and
+    formatOps() render the Ids as strings.
+
+    The previous graph is converted, the parse cache and the edit state are
+    cleared.
+    """
+    def setCompactIds(self, enabled=False):
+        if enabled == self.compactIds:
+            return
+
+        self.compactIds = enabled
+        self.instances1, self.connections1, self.ss1 = \
+            self._convertGraph((self.instances1,
+                                self.connections1,
+                                self.ss1))
+        self.parseCache.clear()
+        self.editState = None
+
+    """
+    Keep the property values as LazyValue objects with their text in the
+    pipeline, decoded by LazyValue.value() on first use. Diffs compare the
+    texts first, and only decode the values if the texts differ, so the
+    values that don't change, or only change in the way they are written,
+    are never decoded. The instructions always have decoded values.
+
+    objectName is always decoded, it's needed to solve the references.
+    Changing the mode clears the parse cache and the edit state.
+    """
+    def setLazyValues(self, enabled=False):
+        if enabled == self.lazyValues:
+            return
+
+        self.lazyValues = enabled
+        self.parseCache.clear()
+        self.editState = None
+
+    """
+    Compare the dictionary and list property values item by item when the
+    new value has at least 'minSize' items, counting the items of the nested
+    values too, and change them with PatchProperty instructions instead of
+    setting the whole value:
+
+    [DiffOp.PatchProperty, [id, property, PatchOp, path, value]]
+
+    'path' is the list of keys and indexes from the property value to the
+    changed item, the last one is the key or index changed in its container.
+    SetItem sets it to 'value', InsertItem inserts 'value' in the list at
+    that index, and DeleteItem deletes it, 'value' is None. The patches of a
+    property are applied in order. A value is set as a whole if patching it
+    needs as many changes as it has items. 0 disables the patches.
+    """
+    def setDeepDiff(self, minSize=0):
+        self.deepDiffSize = minSize
+
+    """
+    Returns an Id as a string, compact Ids are rendered as 'i,j' and the
+    ghost Ids of graphDiff() as '.i,j'.
+    """
+    def formatId(self, id):
+        if isinstance(id, str):
+            return id
+
+        if id < 0:
+            return '.' + self.formatId(~id)
+
+        return '{0},{1}'.format(id & self._columnMask, id >> self._columnBits)
+
+    """ Returns the compact Id of an 'i,j' or '.i,j' string Id. """
+    def _compactId(self, id):
+        if not isinstance(id, str):
+            return id
+
+        if id.startswith('.'):
+            return ~self._compactId(id[1:])
+
+        i, j = id.split(',')
+
+        return int(j) << self._columnBits | int(i)
+
+    """ Returns the ghost Id used while 'id' is taken by other element. """
+    def _ghostId(self, id):
+        return '.' + id if isinstance(id, str) else ~id
+
+    """ Returns a function converting the columns of 'row' into Ids. """
+    def _rowIds(self, row):
+        # Bound methods, faster than a Python function for each Id.
+        if self.compactIds:
+            return (row << self._columnBits).__or__
+
+        return ('{0},' + str(row)).format
+
+    """
+    Returns a graph with compact Ids and element records as a graph with
+    string Ids and [elementName, properties] lists.
+    """
+    def formatGraph(self, graph):
+        return self._mapGraph(graph, self.formatId, list)
+
+    """ Returns the instructions of a diff with the Ids as strings. """
+    def formatOps(self, ops):
+        DiffOp = self.DiffOp
+        formatId = self.formatId
+        formatted = []
+
+        for kind, args in ops:
+            args = list(args)
+
+            if kind == DiffOp.DisconnectSignalsAndSlots or \
+               kind == DiffOp.ConnectSignalsAndSlots:
+                endpoints = (0, 2)
+            elif kind == DiffOp.DisconnectElement or \
+                 kind == DiffOp.ConnectElement or \
+                 kind == DiffOp.ChangeId:
+                endpoints = (0, 1)
+            else:
+                endpoints = (0,)
+
+            for k in endpoints:
+                args[k] = formatId(args[k])
+
+            formatted.append([kind, args])
+
+        return formatted
+
+    """ Returns a graph with the Ids and elements of the current mode. """
+    def _convertGraph(self, graph):
+        if self.compactIds:
+            return self._mapGraph(graph,
+                                  self._compactId,
+                                  PipelineElement._make)
+
+        return self.formatGraph(graph)
+
+    """ Returns a graph with its Ids and elements converted. """
+    def _mapGraph(self, graph, mapId, element):
+        instances, connections, ss = graph
+
+        return {mapId(id): element(instances[id]) for id in instances}, \
+               [[mapId(src), mapId(dst)] for src, dst in connections], \
+               [[mapId(s[0]), s[1], mapId(s[2]), s[3]] for s in ss]
+
     """ Parse a string and returns the native value. """
     def parseValue(self, value):
         # String
         if value.startswith('\'') or value.startswith('"'):
-            return value[1: -1]
-        # Dictionary
-        elif value.startswith('{'):
-            r = re.findall('(?:[0-9]+\.[0-9]+|\.[0-9]+|[0-9]+\.|[0-9]+|".*"|'
-                           '\'.*\'|\{.*\}|\[.*\])'
-                           ' *: *'
-                           '(?:[0-9]+\.[0-9]+|\.[0-9]+|[0-9]+\.|[0-9]+|".*"|'
-                           '\'.*\'|\{.*\}|\[.*\])|'
-                           ',', value[1: -1])
-
-            d = {}
-
-            for item in r:
-                if item != ',':
-                    k, v = item.split(':', 1)
-                    d[self.parseValue(k.strip())] = self.parseValue(v.strip())
-
-            return d
-        # List
-        elif value.startswith('['):
-            r = re.findall('[0-9]+\.[0-9]+|'
-                            '\.[0-9]+|'
-                            '[0-9]+\.|'
-                            '[0-9]+|'
-                            '".*"|'
-                            '\'.*\'|'
-                            '\{.*\}|'
-                            '\[.*\]|'
-                            ',', value[1: -1])
-
-            l = []
-
-            for item in r:
-                if item != ',':
-                    l.append(self.parseValue(item))
-
-            return l
+            match = self._quotedRe.match(value)
+
+            if match == None or match.end() != len(value):
+                return value[1: -1]
+
+            return self._unquote(value)
+        # Dictionary or list
+        elif value.startswith('{') or value.startswith('['):
+            return self._parseContainer(value)
         else:
+            return self._parseScalar(value)
+
+    """ Returns the contents of a quoted string. """
+    def _unquote(self, value):
+        if '\\' in value:
+            return self._escapeRe.sub('\\1', value[1: -1])
+
+        return value[1: -1]
+
+    """ Converts an unquoted word into an int, float or string. """
+    def _parseScalar(self, value):
+        try:
+            return int(value)
+        except:
             try:
-                return int(value)
+                return float(value)
             except:
-                try:
-                    return float(value)
-                except:
-                    # String
-                    return value
+                # String
+                return value
 
-    """ Converts a pipeline description string into a graph. """
-    def parsePipeline(self, pipeline=''):
-        instances = {}
-        pipes = []
-        pipe = []
-        elementName = ''
-        properties = {}
-        ss = []
-        i = 0 # Column
-        j = 0 # Row
+    """
+    Parse a list or dictionary in a single left to right pass.
 
-        r = re.findall('[a-zA-Z_][0-9a-zA-Z_]* *= *(?:\'.*\'|".*"|'
-                       '\[.*\]|\{.*\}|[^\r^\n^ ^!]+)|'
-                       '(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                       '[a-zA-Z_][0-9a-zA-Z_]* *'
-                       '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                       '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)'
-                       ' *(?:<|>) *'
-                       '(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                       '[a-zA-Z_][0-9a-zA-Z_]* *'
-                       '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                       '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)|'
-                       '[a-zA-Z_][0-9a-zA-Z_]*\.?|'
-                       '!', pipeline)
-
-        for k, p in enumerate(r):
-            # Parse property
-            if re.match('[a-zA-Z_][0-9a-zA-Z_]* *= *'
-                        '(?:\'.*\'|'
-                        '".*"|'
-                        '\[.*\]|'
-                        '\{.*\}|'
-                        '[^\r^\n^ ^!]+)', p) != None:
-                key, value = p.split('=', 1)
-                properties[key.strip()] = self.parseValue(value.strip())
-            # Parse Signals & Slots
-            #
-            # sender receiver.slot([type1, tipe2, ...])<signal([type1, type2, ...])
-            # receiver slot([type1, tipe2, ...])<sender.signal([type1, type2, ...])
-            elif re.match('(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                          '[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)'
-                          ' *< *'
-                          '(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                          '[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)',
-                          p) != None:
-                s1, s2 = p.split('<')
-                s1 = s1.strip()
-                s2 = s2.strip()
-
-                if '.' in s1:
-                    receiver, slot = s1.split('.')
-                    receiver += '.'
-                else:
-                    receiver = '{0},{1}'.format(i, j)
-                    slot = s1
+    The containers are built with an explicit stack instead of recursion, so
+    each character is read once whatever the nesting depth is. Malformed input
+    is parsed as far as possible: unclosed containers are closed at the end of
+    the value and unexpected separators are ignored.
+    """
+    def _parseContainer(self, value):
+        root = None
+        stack = [] # [container, isDict, key, hasKey]
+        pos = 0
+        match = self._valueTokenRe.match
+
+        while True:
+            token = match(value, pos)
+
+            if token == None:
+                break
+
+            pos = token.end()
+            kind = token.lastgroup
+
+            if kind == 'open':
+                item = {} if token.group(kind) == '{' else []
+            elif kind == 'string':
+                item = self._unquote(token.group(kind))
+            elif kind == 'word':
+                item = self._parseScalar(token.group(kind))
+            elif kind == 'close':
+                if stack != []:
+                    stack.pop()
+
+                if stack == []:
+                    break
 
-                if '.' in s2:
-                    sender, signal = s2.split('.')
-                    sender += '.'
-                else:
-                    sender = '{0},{1}'.format(i, j)
-                    signal = s2
+                continue
+            elif kind == 'comma':
+                if stack != []:
+                    stack[-1][3] = False
 
-                signal = ''.join(signal.split())
-                slot = ''.join(slot.split())
+                continue
+            else:
+                continue
 
-                ss.append([sender, signal, receiver, slot])
-            # Parse Signals & Slots
-            #
-            # sender signal([type1, tipe2, ...])>receiver.slot([type1, type2, ...])
-            # receiver sender.signal([type1, tipe2, ...])>slot([type1, type2, ...])
-            elif re.match('(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                          '[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)'
-                          ' *> *'
-                          '(?:[a-zA-Z_][0-9a-zA-Z_]*\.)?'
-                          '[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '\( *(?:[a-zA-Z_][0-9a-zA-Z_]* *'
-                          '(?:, *[a-zA-Z_][0-9a-zA-Z_]*)*)? *\)',
-                          p) != None:
-                s1, s2 = p.split('>')
-                s1 = s1.strip()
-                s2 = s2.strip()
-
-                if '.' in s1:
-                    sender, signal = s1.split('.')
-                    sender += '.'
+            if stack == []:
+                if root != None:
+                    break
+
+                root = item
+            else:
+                frame = stack[-1]
+
+                if not frame[1]:
+                    frame[0].append(item)
+                elif frame[3]:
+                    # Lists and dictionaries can't be keys.
+                    if not isinstance(frame[2], (list, dict)):
+                        frame[0][frame[2]] = item
+
+                    frame[3] = False
                 else:
-                    sender = '{0},{1}'.format(i, j)
-                    signal = s1
+                    frame[2] = item
+                    frame[3] = True
+
+            if kind == 'open':
+                stack.append([item, isinstance(item, dict), None, False])
+
+        return root
+
+    """
+    Returns the position where the quoted string, list or dictionary starting
+    at 'pos' ends, or -1 if it isn't closed. Values don't span lines, an
+    unbalanced bracket doesn't swallow the chains in the next lines.
+    """
+    def _valueEnd(self, pipeline, pos):
+        char = pipeline[pos]
+
+        if char == '"' or char == '\'':
+            match = self._quotedRe.match(pipeline, pos)
+
+            if match != None:
+                return match.end()
+        elif char == '[' or char == '{':
+            depth = 0
+            i = pos
+
+            while True:
+                match = self._bracketRe.search(pipeline, i)
+
+                if match == None:
+                    break
+
+                char = match.group()
 
-                if '.' in s2:
-                    receiver, slot = s2.split('.')
-                    receiver += '.'
+                if char == '\r' or char == '\n':
+                    break
+                elif char == '"' or char == '\'':
+                    match = self._quotedRe.match(pipeline, match.start())
+
+                    if match == None:
+                        break
+
+                    i = match.end()
+                elif char == '[' or char == '{':
+                    depth += 1
+                    i = match.end()
                 else:
-                    receiver = '{0},{1}'.format(i, j)
-                    slot = s2
+                    depth -= 1
+                    i = match.end()
 
-                signal = ''.join(signal.split())
-                slot = ''.join(slot.split())
+                    if depth == 0:
+                        return i
 
-                ss.append([sender, signal, receiver, slot])
-            # Parse element
+        return -1
+
+    """ Split a pipeline description into a list of typed tokens. """
+    def tokenize(self, pipeline=''):
+        return [token for start, token, closed
+                      in self._scanTokens(pipeline)]
+
+    """
+    Tokenize the pipeline starting from 'pos'. Yields (start, token, closed)
+    tuples, where start is the position of the token in the pipeline. closed
+    is False if the token is an unclosed string, list or dictionary read as
+    an unquoted value, the token may change if any text after it changes.
+    """
+    def _scanTokens(self, pipeline, pos=0):
+        TokenType = self.TokenType
+        search = self._tokenRe.search
+
+        while True:
+            match = search(pipeline, pos)
+
+            if match == None:
+                break
+
+            kind = match.lastgroup
+            pos = match.end()
+
+            if kind == 'element':
+                yield match.start(), (TokenType.Element,
+                                      match.group(kind)), True
+            elif kind == 'pipe':
+                yield match.start(), (TokenType.Pipe, '!'), True
+            elif kind == 'property':
+                value = match.group('bare')
+                closed = True
+
+                # Quoted strings, lists and dictionaries.
+                if value == None:
+                    end = self._valueEnd(pipeline, pos)
+
+                    # Not closed, read it as an unquoted value.
+                    if end < 0:
+                        end = self._bareValueRe.match(pipeline, pos).end()
+                        closed = False
+
+                    value = pipeline[pos: end]
+                    pos = end
+
+                yield match.start(), (TokenType.Property,
+                                      match.group('key'),
+                                      value), closed
+            elif kind == 'reference':
+                yield match.start(), (TokenType.Reference,
+                                      match.group(kind)), True
             else:
-                if elementName != '' and elementName != '!':
-                    if not elementName.endswith('.'):
-                        if self.pipelineRoutingMode == \
-                           self.PipelineRoutingMode.Fail and \
-                           not elementName in self.availableElementTypes:
-                            return {}, [], []
+                # Normalize both directions to (sender, signal, receiver,
+                # slot). An empty object means the current element.
+                if match.group('direction') == '>':
+                    sender, signal, receiver, slot = match.group('lObject',
+                                                                 'lMethod',
+                                                                 'rObject',
+                                                                 'rMethod')
+                else:
+                    receiver, slot, sender, signal = match.group('lObject',
+                                                                 'lMethod',
+                                                                 'rObject',
+                                                                 'rMethod')
 
-                        instances['{0},{1}'.format(i, j)] = \
-                                                    [elementName, properties]
+                yield match.start(), (TokenType.SignalSlot,
+                                      sender or '',
+                                      ''.join(signal.split()),
+                                      receiver or '',
+                                      ''.join(slot.split())), True
 
-                    pipe.append([elementName, properties])
+    """
+    Group the tokens of the pipeline in chains of piped elements, starting
+    from 'pos'. A chain starts on each element or reference not preceded by a
+    pipe, and properties and signals & slots belong to the chain of the
+    element before them. Yields (start, tokens, closed) tuples, the first
+    chain starts at 'pos' and each chain ends where the next one starts.
+    closed is False if any token in the chain isn't closed.
+    """
+    def _scanChains(self, pipeline, pos=0):
+        TokenType = self.TokenType
+        piped = True
+        tokens = []
+        start = pos
+        chainClosed = True
 
-                    i += 1
+        for pos, token, closed in self._scanTokens(pipeline, pos):
+            kind = token[0]
 
-                    if p != '!':
-                        pipes.append(pipe)
-                        pipe = []
-                        i = 0
-                        j += 1
+            if kind == TokenType.Element or kind == TokenType.Reference:
+                if not piped:
+                    yield start, tokens, chainClosed
+                    tokens = []
+                    start = pos
+                    chainClosed = True
 
-                elementName = p
-                properties = {}
+                piped = False
+            elif kind == TokenType.Pipe:
+                piped = True
 
-            if k == len(r) - 1:
-                if elementName != '' and elementName != '!':
-                    if not elementName.endswith('.'):
-                        instances['{0},{1}'.format(i, j)] = \
-                                                    [elementName, properties]
+            tokens.append(token)
 
-                    pipe.append([elementName, properties])
+            if not closed:
+                chainClosed = False
 
-                    i += 1
+        if tokens != []:
+            yield start, tokens, chainClosed
 
-                    if p != '!':
-                        pipes.append(pipe)
-                        pipe = []
-                        i = 0
-                        j += 1
+    """
+    Returns a copy of a graph that doesn't share mutable objects. Lazy values
+    are copied undecoded, so decoding or changing a copy never touches the
+    values of the graph.
+    """
+    def copyGraph(self, graph):
+        instances, connections, ss = graph
+        cInstances = {}
 
-        # Solve references.
-        #
-        # i,j. -> x,y
-        references = {}
-
-        for pipe in pipes:
-            for element in pipe:
-                if element[0].endswith('.'):
-                    for instance in instances:
-                        if 'objectName' in instances[instance][1] and \
-                           instances[instance][1]['objectName'] == \
-                                                                element[0][:-1]:
-                            references[element[0]] = instance
-
-        # Solve connections between elements.
-        connections = []
+        for id in instances:
+            elementName, properties = instances[id]
+            lazy = False
 
-        for j, pipe in enumerate(pipes):
-            for i, element in enumerate(pipe):
-                if element[0].endswith('.'):
-                    cur = references[element[0]]
-                else:
-                    cur = '{0},{1}'.format(i, j)
+            for value in properties.values():
+                if isinstance(value, (list, dict)):
+                    properties = copy.deepcopy(properties)
 
-                if i + 1 < len(pipe):
-                    nextElement = pipe[i + 1]
+                    break
 
-                    if nextElement[0].endswith('.'):
-                        nxt = references[nextElement[0]]
-                    else:
-                        nxt = '{0},{1}'.format(i + 1, j)
+                if isinstance(value, LazyValue):
+                    lazy = True
+            else:
+                if lazy:
+                    properties = {name: LazyValue(value.raw)
+                                        if isinstance(value, LazyValue)
+                                        else value
+                                  for name, value in properties.items()}
+                else:
+                    properties = properties.copy()
 
-                    connections.append([cur, nxt])
+            if isinstance(instances[id], PipelineElement):
+                cInstances[id] = PipelineElement(elementName, properties)
+            else:
+                cInstances[id] = [elementName, properties]
 
-        # Solve signals & slots.
-        for s in ss:
-            if s[0].endswith('.'):
-                s[0] = references[s[0]]
+        return cInstances, \
+               [connection[:] for connection in connections], \
+               [s[:] for s in ss]
 
-            if s[2].endswith('.'):
-                s[2] = references[s[2]]
+    """
+    Converts a pipeline description string into a graph.
 
-        if self.pipelineRoutingMode == self.PipelineRoutingMode.Remove or \
-           self.pipelineRoutingMode == self.PipelineRoutingMode.Force:
-            removeId = []
+    If the parse cache is enabled, the graph is looked up by the pipeline, the
+    routing mode and the available elements types before parsing it. Cached
+    graphs are never returned directly, the caller always gets its own copy.
+    """
+    def parsePipeline(self, pipeline=''):
+        return self._parseCached(pipeline)
 
-            for id in instances:
-                if not instances[id][0] in self.availableElementTypes:
-                    removeId.append(id)
+    """
+    parsePipeline(), keeping the chains of the pipeline in 'state' if it isn't
+    found in the cache, see _parsePipeline().
+    """
+    def _parseCached(self, pipeline, state=None):
+        if self.parseCacheSize < 1:
+            return self._parsePipeline(pipeline, state)
 
-            for id in removeId:
-                del instances[id]
+        key = (pipeline, self._routingConfig())
 
-                i = 0
-                iConns = []
-                oConns = []
+        if key in self.parseCache:
+            self.parseCacheHits += 1
+            self.parseCache.move_to_end(key)
 
-                while i < len(connections):
-                    if connections[i][0] == id or connections[i][1] == id:
-                        if connections[i][0] != id:
-                            iConns.append(connections[i][0])
+            return self.copyGraph(self.parseCache[key])
 
-                        if connections[i][1] != id:
-                            oConns.append(connections[i][1])
+        self.parseCacheMisses += 1
+        graph = self._parsePipeline(pipeline, state)
+        self.parseCache[key] = self.copyGraph(graph)
 
-                        del connections[i]
-                    else:
-                        i += 1
+        if len(self.parseCache) > self.parseCacheSize:
+            self.parseCache.popitem(False)
+            self.parseCacheEvictions += 1
 
-                if self.pipelineRoutingMode == self.PipelineRoutingMode.Force:
-                    for iConn in iConns:
-                        for oConn in oConns:
-                            if iConn != oConn and \
-                               not [iConn, oConn] in connections:
-                                connections.append([iConn, oConn])
+        return graph
 
-                i = 0
+    """
+    Returns the parser settings the graph depends on, the available elements
+    types are ignored in NoCheck mode.
+    """
+    def _routingConfig(self):
+        if self.pipelineRoutingMode == self.PipelineRoutingMode.NoCheck:
+            return self.pipelineRoutingMode, None
 
-                while i < len(ss):
-                    if ss[i][0] == id or ss[i][2] == id:
-                        del ss[i]
-                    else:
-                        i += 1
+        return self.pipelineRoutingMode, frozenset(self.availableElementTypes)
 
-        return instances, connections, ss
+    """ Returns the Id of the element referenced as 'objectName.' """
+    def _solveReference(self, references, reference):
+        try:
+            return references[reference[: -1]]
+        except KeyError:
+            raise self.UnresolvedReferenceError(reference)
 
     """
-    Compare the 'pipeline2' graph with the previous pipeline graph and returns
-    the difference as instructions.
+    Converts a pipeline description string into a graph, uncached. The
+    pipeline is tokenized, parsed and resolved in a single pass, giving the
+    same graph as building it from _scanChains() and _parseChain(), chain by
+    chain. With statistics the pass is timed as a whole, and the values
+    parsing apart.
+
+    If 'state' is a dictionary, the chains of the pipeline are kept in it for
+    pipelineEdit(), see _parseTokens(), with the unrouted instances and the
+    objectNames, unless the graph fails in Fail mode.
     """
-    def pipelineDiff(self, pipeline2=''):
-        instances2, connections2, ss2 = self.parsePipeline(pipeline2)
+    def _parsePipeline(self, pipeline, state=None):
+        stats = self.stats
+        checkTypes = self.pipelineRoutingMode == self.PipelineRoutingMode.Fail
+        tokens = self._scanTokens(pipeline)
+        chains = None if state == None else []
 
-        cInstances1 = self.instances1.copy()
-        cInstances2 = instances2.copy()
+        if stats != None:
+            clock = stats.clock()
+            tokenCount = [0]
+            tokens = self._countTokens(tokens, tokenCount)
 
-        cConnections1 = self.connections1[:]
-        cConnections2 = connections2[:]
+        parsed = self._parseTokens(tokens,
+                                   checkTypes=checkTypes,
+                                   chains=chains)
 
-        cSs1 = self.ss1[:]
-        cSs2 = ss2[:]
+        if parsed == None:
+            if stats != None:
+                clock.lap('parse')
+                stats.addCount('failedGraphs')
 
-        disconnectSignalsAndSlots = []
-        disconnectElement = []
-        removeElement = []
-        changeId = []
-        setProperties = {}
-        resetProperties = {}
-        connectElement = []
-        connectSignalsAndSlots = []
+            return {}, [], []
 
-        while cInstances1 != {}:
-            # Get an item from cInstances1.
-            instance1 = cInstances1.popitem()
-            bestMatchId = ''
-
-            # Find a similar element.
-            for instance2 in cInstances2:
-                if instance1[1][0] == cInstances2[instance2][0]:
-                    if bestMatchId == '':
-                        bestMatchId = instance2
-                    elif 'objectName' in instance1[1][1] and \
-                         'objectName' in cInstances2[instance2][1] and \
-                         instance1[1][1]['objectName'] == \
-                                        cInstances2[instance2][1]['objectName']:
-                        bestMatchId = instance2
+        instances, connections, ss, references, unresolved, chainCount = \
+            parsed
 
-                        break
+        if stats != None:
+            clock.lap('parse')
+            stats.addCount('tokens', tokenCount[0])
+            stats.addCount('chains', chainCount)
+
+        # Solve references.
+        #
+        # objectName. -> i,j
+        for reference, targets in unresolved:
+            id = self._solveReference(references, reference)
 
-            # There are no similar elements.
-            if bestMatchId == '':
-                # Remove it from the previous pipeline.
-                removeElement.append(instance1[0])
+            for item, k in targets:
+                item[k] = id
 
-                # Remove it's connections.
-                i = 0
+        if stats != None:
+            clock.lap('resolve')
+            stats.addCount('references', len(unresolved))
+            stats.addCount('elements', len(instances))
+            stats.addCount('connections', len(connections))
+            stats.addCount('signalsAndSlots', len(ss))
 
-                while i < len(cConnections1):
-                    if cConnections1[i][0] == instance1[0] or \
-                       cConnections1[i][1] == instance1[0]:
-                        disconnectElement.append(cConnections1[i])
-                        del cConnections1[i]
-                    else:
-                        i += 1
+        if state == None:
+            return self._routeGraph((instances, connections, ss))
 
-                # Remove it's signals & slots.
-                i = 0
+        state['chains'] = chains
+        state['instances'] = instances
+        state['references'] = references
 
-                while i < len(cSs1):
-                    if cSs1[i][0] == instance1[0] or cSs1[i][2] == instance1[0]:
-                        disconnectSignalsAndSlots.append(cSs1[i])
-                        del cSs1[i]
-                    else:
-                        i += 1
-            # There are at least one similar element.
+        # The routing removes elements from the dictionary it's given.
+        return self._routeGraph((dict(instances), connections, ss))
+
+    """
+    Tokenize, parse and connect the chains of 'tokens', (start, token,
+    closed) tuples, the first chain with elements taking the row 'row'.
+    Returns (instances, connections, ss, references, unresolved, chains),
+    with the references to objectNames still unsolved: references contains
+    the objectNames defined as {objectName: Id}, unresolved is a list of
+    (reference, targets) tuples, each target a (connection or signal & slot,
+    index) pair where the Id of the reference goes, and chains is the number
+    of chains. Returns None if 'checkTypes' is True and an element type isn't
+    available.
+
+    If 'chains' is a list, a (start, closed, columns, connections, ss,
+    unresolved, names) tuple is appended for each chain, with the columns it
+    takes, the part of the lists returned written in the chain, and the
+    objectNames defined in it. The first chain starts at 'pos'. If 'stop'
+    is given, the parsing stops before the first chain, after the first one,
+    whose start gives True to stop(start).
+    """
+    def _parseTokens(self,
+                     tokens,
+                     row=0,
+                     checkTypes=False,
+                     chains=None,
+                     stop=None,
+                     pos=0):
+        TokenType = self.TokenType
+        Pipe = TokenType.Pipe
+        Property = TokenType.Property
+        SignalSlot = TokenType.SignalSlot
+        availableElementTypes = set(self.availableElementTypes)
+        compactIds = self.compactIds
+
+        if self.lazyValues:
+            parseValue = LazyValue
+        elif self.stats != None:
+            parseValue = self._timedParseValue
+        else:
+            parseValue = self.parseValue
+
+        instances = {}
+        connections = []
+        ss = []
+        references = {} # objectName -> Id
+        unresolved = [] # (reference, [(connection or signal & slot, index)])
+        chainSs = []    # References of the signals & slots of the chain.
+        previous = None # Id or reference of the last element of the chain.
+        previousTargets = None
+        piped = True
+        elementName = ''
+        properties = {}
+        i = 0 # Column
+        j = row
+        count = 0 # Chains before the last one.
+        elementId = self._rowIds(j)
+
+        # Where the chain starts in the pipeline and in the lists, and if all
+        # of its tokens are closed.
+        chainStart = pos
+        chainClosed = True
+        chainNames = []
+        starts = (0, 0, 0)
+        tokens = iter(tokens)
+        first = next(tokens, None)
+
+        if first == None:
+            return instances, connections, ss, references, unresolved, 0
+
+        # The end of the pipeline flushes the last element like a pipe would.
+        for start, token, closed in itertools.chain([first],
+                                                    tokens,
+                                                    [(0, (Pipe, '!'), True)]):
+            kind = token[0]
+
+            if kind == Property:
+                properties[token[1]] = parseValue(token[2])
+
+                if not closed:
+                    chainClosed = False
+            elif kind == SignalSlot:
+                s = [token[1] + '.' if token[1] else elementId(i),
+                     token[2],
+                     token[3] + '.' if token[3] else elementId(i),
+                     token[4]]
+                ss.append(s)
+
+                if token[1]:
+                    chainSs.append((s[0], [(s, 0)]))
+
+                if token[3]:
+                    chainSs.append((s[2], [(s, 2)]))
             else:
-                # Change the Id of the element in pipeline1 by the Id of the
-                # element in pipeline2.
-                if instance1[0] != bestMatchId:
-                    if bestMatchId in cInstances1:
-                        # The new Id is used by other element. Change the Id to
-                        # a ghost Id.
-                        changeId.append([instance1[0],
-                                         '.{0}'.format(bestMatchId)])
+                if elementName != '':
+                    if elementName.endswith('.'):
+                        item = elementName
+                        targets = []
+                        unresolved.append((item, targets))
                     else:
-                        changeId.append([instance1[0], bestMatchId])
+                        targets = None
+
+                        if checkTypes and \
+                           not elementName in availableElementTypes:
+                            return None
 
-                # Copy the properties from pipeline2 to the pipeline1.
-                setProps = {}
+                        item = elementId(i)
 
-                for prop in cInstances2[bestMatchId][1]:
-                    if not prop in instance1[1][1] or \
-                       (prop in instance1[1][1] and \
-                        cInstances2[bestMatchId][1][prop] != \
-                                                        instance1[1][1][prop]):
-                        setProps[prop] = cInstances2[bestMatchId][1][prop]
+                        if compactIds:
+                            instances[item] = PipelineElement(elementName,
+                                                              properties)
+                        else:
+                            instances[item] = [elementName, properties]
 
-                if setProps != {}:
-                    setProperties[bestMatchId] = setProps
+                        objectName = properties.get('objectName')
 
-                resetProps = []
+                        if isinstance(objectName, LazyValue):
+                            objectName = objectName.value()
+                            properties['objectName'] = objectName
 
-                for prop in instance1[1][1]:
-                    if not prop in cInstances2[bestMatchId][1]:
-                        resetProps.append(prop)
+                        if isinstance(objectName, str):
+                            references[objectName] = item
 
-                if resetProps != []:
-                    resetProperties[bestMatchId] = resetProps
+                            if chains != None:
+                                chainNames.append(objectName)
 
-                del cInstances2[bestMatchId]
+                    if previous != None:
+                        connection = [previous, item]
+                        connections.append(connection)
 
-        # Converts ghost Id to the final Id.
-        i = 0
+                        if previousTargets != None:
+                            previousTargets.append((connection, 0))
 
-        while i < len(changeId):
-            if changeId[i][1].startswith('.'):
-                if changeId[i][1][1:] in removeElement:
-                    changeId[i][1] = changeId[i][1][1:]
+                        if targets != None:
+                            targets.append((connection, 1))
+
+                    previous = item
+                    previousTargets = targets
+                    i += 1
+
+                if kind == Pipe:
+                    piped = True
+                    elementName = ''
                 else:
-                    changeId.append([changeId[i][1], changeId[i][1][1:]])
+                    # A new chain, chains without elements don't take a row.
+                    if not piped:
+                        unresolved += chainSs
+                        chainSs = []
+                        count += 1
+
+                        if chains != None:
+                            chains.append((chainStart,
+                                           chainClosed,
+                                           i,
+                                           connections[starts[0]:],
+                                           ss[starts[1]:],
+                                           unresolved[starts[2]:],
+                                           chainNames))
+                            chainStart = start
+                            chainClosed = True
+                            chainNames = []
+                            starts = (len(connections),
+                                      len(ss),
+                                      len(unresolved))
+
+                        if stop != None and stop(start):
+                            return instances, \
+                                   connections, \
+                                   ss, \
+                                   references, \
+                                   unresolved, \
+                                   count
+
+                        if i > 0:
+                            j += 1
+                            elementId = self._rowIds(j)
+
+                        previous = None
+                        i = 0
 
-            i += 1
+                    piped = False
+                    elementName = token[1]
 
-        # Solve connections
-        i = 0
+                properties = {}
 
-        while i < len(cConnections1):
-            dstConnection = cConnections1[i][:]
-            fst = False
-            snd = False
+        unresolved += chainSs
 
-            for change in changeId:
-                dst = change[1][1:] if change[1].startswith('.') else change[1]
+        if chains != None:
+            chains.append((chainStart,
+                           chainClosed,
+                           i,
+                           connections[starts[0]:],
+                           ss[starts[1]:],
+                           unresolved[starts[2]:],
+                           chainNames))
 
-                if not fst and dstConnection[0] == change[0]:
-                    dstConnection[0] = dst
-                    fst = True
+        return instances, connections, ss, references, unresolved, count + 1
 
-                if not snd and dstConnection[1] == change[0]:
-                    dstConnection[1] = dst
-                    snd = True
+    """ Yields the tokens, adding them to count[0]. """
+    def _countTokens(self, tokens, count):
+        for token in tokens:
+            count[0] += 1
 
-                if fst and snd:
-                    break
+            yield token
+
+    """ Same as parseValue(), adding the time spent to the statistics. """
+    def _timedParseValue(self, value):
+        start = time.perf_counter()
+        value = self.parseValue(value)
+        self.stats.addTime('parseValue', time.perf_counter() - start)
+
+        return value
 
-            if not dstConnection in cConnections2:
-                disconnectElement.append(cConnections1[i])
-                del cConnections1[i]
+    """
+    Parse the tokens of a chain. Returns (elements, pipe, ss, names), where
+    elements is a list of [column, elementName, properties], pipe contains the
+    column or the reference of each piped element, and the elements in ss and
+    names are given by column or reference too.
+    """
+    def _parseChain(self, tokens, parseValue=None):
+        TokenType = self.TokenType
+
+        if parseValue == None:
+            parseValue = LazyValue if self.lazyValues else self.parseValue
+
+        elements = []
+        pipe = []
+        ss = []
+        names = [] # (objectName, column)
+        elementName = ''
+        properties = {}
+        i = 0 # Column
+
+        # The chain end flushes the last element like a pipe would.
+        for token in itertools.chain(tokens, self._chainEnd):
+            kind = token[0]
+
+            # Parse property
+            if kind == TokenType.Property:
+                properties[token[1]] = parseValue(token[2])
+            # Parse Signals & Slots
+            #
+            # sender receiver.slot([type1, tipe2, ...])<signal([type1, type2, ...])
+            # receiver slot([type1, tipe2, ...])<sender.signal([type1, type2, ...])
+            # sender signal([type1, tipe2, ...])>receiver.slot([type1, type2, ...])
+            # receiver sender.signal([type1, tipe2, ...])>slot([type1, type2, ...])
+            elif kind == TokenType.SignalSlot:
+                ss.append([token[1] + '.' if token[1] else i,
+                           token[2],
+                           token[3] + '.' if token[3] else i,
+                           token[4]])
+            # Parse element
             else:
-                i += 1
+                if elementName != '':
+                    if elementName.endswith('.'):
+                        pipe.append(elementName)
+                    else:
+                        elements.append([i, elementName, properties])
+                        pipe.append(i)
 
-        i = 0
+                        objectName = properties.get('objectName')
 
-        while i < len(cConnections2):
-            dstConnection = cConnections2[i][:]
-            fst = False
-            snd = False
+                        if isinstance(objectName, LazyValue):
+                            objectName = objectName.value()
+                            properties['objectName'] = objectName
 
-            for change in changeId:
-                src = change[1][1:] if change[1].startswith('.') else change[1]
+                        if isinstance(objectName, str):
+                            names.append((objectName, i))
 
-                if not fst and dstConnection[0] == src:
-                    dstConnection[0] = change[0]
-                    fst = True
+                    i += 1
 
-                if not snd and dstConnection[1] == src:
-                    dstConnection[1] = change[0]
-                    snd = True
+                elementName = '' if kind == TokenType.Pipe else token[1]
+                properties = {}
 
-                if fst and snd:
-                    break
+        return elements, pipe, ss, names
 
-            if not dstConnection in cConnections1:
-                connectElement.append(cConnections2[i])
-                del cConnections2[i]
-            else:
-                i += 1
+    """
+    Give a row to each parsed chain and solve the references between them.
+    Returns (rows, references, resolved), where resolved contains the
+    (instances, connections, ss) of each chain.
+    """
+    def _resolveChains(self, chains):
+        rows = []
+        references = {} # objectName -> Id
+        j = 0 # Row
 
-        # Solve signals & slots.
-        i = 0
+        for elements, pipe, ss, names in chains:
+            rows.append(j)
 
-        while i < len(cSs1):
-            dstSs = cSs1[i][:]
-            fst = False
-            snd = False
+            elementId = self._rowIds(j)
 
-            for change in changeId:
-                dst = change[1][1:] if change[1].startswith('.') else change[1]
+            for objectName, i in names:
+                references[objectName] = elementId(i)
 
-                if not fst and dstSs[0] == change[0]:
-                    dstSs[0] = dst
-                    fst = True
+            # Chains without elements don't take a row.
+            if pipe != []:
+                j += 1
 
-                if not snd and dstSs[2] == change[0]:
-                    dstSs[2] = dst
-                    snd = True
+        resolved = [self._resolveChain(chain, row, references)
+                    for chain, row in zip(chains, rows)]
 
-                if fst and snd:
-                    break
+        return rows, references, resolved
 
-            if not dstSs in cSs2:
-                disconnectSignalsAndSlots.append(cSs1[i])
-                del cSs1[i]
-            else:
-                i += 1
+    """ Returns the (instances, connections, ss) of a parsed chain. """
+    def _resolveChain(self, chain, row, references):
+        elements, pipe, ss, names = chain
+        elementId = self._rowIds(row)
+        instances = {}
 
-        i = 0
+        if self.compactIds:
+            for i, elementName, properties in elements:
+                instances[elementId(i)] = PipelineElement(elementName,
+                                                          properties)
+        else:
+            for i, elementName, properties in elements:
+                instances[elementId(i)] = [elementName, properties]
 
-        while i < len(cSs2):
-            dstSs = cSs2[i][:]
-            fst = False
-            snd = False
+        # Solve references and connections between elements.
+        #
+        # objectName. -> i,j
+        ids = [self._solveReference(references, item)
+               if isinstance(item, str) else elementId(item)
+               for item in pipe]
 
-            for change in changeId:
-                src = change[1][1:] if change[1].startswith('.') else change[1]
+        connections = [[ids[k - 1], ids[k]] for k in range(1, len(ids))]
 
-                if not fst and dstSs[0] == src:
-                    dstSs[0] = change[0]
-                    fst = True
+        # Solve signals & slots.
+        chainSs = []
+
+        for sender, signal, receiver, slot in ss:
+            chainSs.append([self._solveReference(references, sender)
+                            if isinstance(sender, str)
+                            else elementId(sender),
+                            signal,
+                            self._solveReference(references, receiver)
+                            if isinstance(receiver, str)
+                            else elementId(receiver),
+                            slot])
+
+        return instances, connections, chainSs
+
+    """ Join the resolved chains in a single graph. """
+    def _joinChains(self, resolved):
+        instances = {}
+        connections = []
+        ss = []
 
-                if not snd and dstSs[2] == src:
-                    dstSs[2] = change[0]
-                    snd = True
+        for chainInstances, chainConnections, chainSs in resolved:
+            instances.update(chainInstances)
+            connections += chainConnections
+            ss += chainSs
 
-                if fst and snd:
-                    break
+        return instances, connections, ss
 
-            if not dstSs in cSs1:
-                connectSignalsAndSlots.append(cSs2[i])
-                del cSs2[i]
-            else:
-                i += 1
+    """ Build the graph of a list of parsed chains. """
+    def _buildGraph(self, chains):
+        stats = self.stats
 
-        # Add elements in pipeline2 to pipeline1.
-        addElement = {}
+        if stats != None:
+            clock = stats.clock()
 
-        for instance in cInstances2:
-            addElement[instance] = cInstances2[instance][0]
+        if self.pipelineRoutingMode == self.PipelineRoutingMode.Fail:
+            availableElementTypes = set(self.availableElementTypes)
 
-            if cInstances2[instance][1] != {}:
-                setProperties[instance] = cInstances2[instance][1]
+            for chain in chains:
+                for element in chain[0]:
+                    if not element[1] in availableElementTypes:
+                        if stats != None:
+                            clock.lap('checkTypes')
+                            stats.addCount('failedGraphs')
 
-            i = 0
+                        return {}, [], []
 
-            while i < len(cConnections2):
-                if cConnections2[i][0] == instance or \
-                   cConnections2[i][1] == instance:
-                    connectElement.append(cConnections2[i])
-                    del cConnections2[i]
-                else:
-                    i += 1
+            if stats != None:
+                clock.lap('checkTypes')
 
-            i = 0
+        rows, references, resolved = self._resolveChains(chains)
 
-            while i < len(cSs2):
-                if cSs2[i][0] == instance or cSs2[i][2] == instance:
-                    connectSignalsAndSlots.append(cSs2[i])
-                    del cSs2[i]
-                else:
-                    i += 1
+        if stats != None:
+            clock.lap('resolve')
+            stats.addCount('references',
+                           sum(isinstance(item, str)
+                               for chain in chains
+                               for item in chain[1]) +
+                           sum(isinstance(s[0], str) + isinstance(s[2], str)
+                               for chain in chains
+                               for s in chain[2]))
 
-        ops = []
+        graph = self._joinChains(resolved)
 
-        for ss in disconnectSignalsAndSlots:
-            ops.append([self.DiffOp.DisconnectSignalsAndSlots, ss])
+        if stats != None:
+            clock.lap('join')
+            stats.addCount('elements', len(graph[0]))
+            stats.addCount('connections', len(graph[1]))
+            stats.addCount('signalsAndSlots', len(graph[2]))
 
-        for connection in disconnectElement:
-            ops.append([self.DiffOp.DisconnectElement, connection])
+        return self._routeGraph(graph)
 
-        for elementId in removeElement:
-            ops.append([self.DiffOp.RemoveElement, [elementId]])
+    """
+    Remove or reroute the unavailable elements of a graph. The connections
+    and signals & slots left keep their order, repeated ones included, and
+    in Force mode the new connections go after them.
+    """
+    def _routeGraph(self, graph):
+        if self.pipelineRoutingMode != self.PipelineRoutingMode.Remove and \
+           self.pipelineRoutingMode != self.PipelineRoutingMode.Force:
+            return graph
+
+        stats = self.stats
+
+        if stats != None:
+            clock = stats.clock()
+
+        instances, connections, ss = graph
+        availableElementTypes = set(self.availableElementTypes)
+        removeId = []
+
+        for id in instances:
+            if not instances[id][0] in availableElementTypes:
+                removeId.append(id)
+
+        removed = set(removeId)
+        routedConnections = [connection for connection in connections
+                             if not connection[0] in removed
+                             and not connection[1] in removed]
+        routedSs = [s for s in ss
+                    if not s[0] in removed and not s[2] in removed]
+        newConnections = []
+
+        if self.pipelineRoutingMode == self.PipelineRoutingMode.Force and \
+           removeId != []:
+            # The indexed graph removes the elements from 'instances'.
+            routed = PipelineGraph(instances,
+                                   connections,
+                                   indexElements=False)
+            routed.removeElements(removeId, True)
+            kept = set(map(tuple, routedConnections))
+            newConnections = [list(edge) for edge in routed.edges
+                              if not edge in kept]
+        else:
+            for id in removeId:
+                del instances[id]
 
-        for change in changeId:
-            ops.append([self.DiffOp.ChangeId, change])
+        if stats != None:
+            clock.lap('route')
+            stats.addCount('removedElements', len(removeId))
+            stats.addCount('removedConnections',
+                           len(set(map(tuple, connections)).difference(
+                               map(tuple, routedConnections))))
+            stats.addCount('reroutedConnections', len(newConnections))
 
-        for elementId in addElement:
-            ops.append([self.DiffOp.AddElement,
-                        [elementId, addElement[elementId]]])
+        return instances, routedConnections + newConnections, routedSs
 
-        for elementId in setProperties:
-            for prop in setProperties[elementId]:
-                ops.append([self.DiffOp.SetProperties,
-                            [elementId, prop, setProperties[elementId][prop]]])
+    """
+    Compile a pipeline description with ${name} placeholders in its property
+    values into a PipelineTemplate. The pipeline is tokenized, parsed and
+    resolved once, PipelineTemplate.instantiate() only parses the property
+    values with placeholders. The routing settings are the ones of the
+    parser when compiling.
+
+    A placeholder can be a whole property value or part of it, like in
+    objectName=src_${id}. The objectNames used in references and as sender
+    or receiver of signals & slots can have placeholders too, written the
+    same way as in the objectName: src_${id}. Placeholders in element types,
+    property names and signal and slot names are not supported.
+    """
+    def compileTemplate(self, pipeline):
+        TokenType = self.TokenType
+        prefix = '__template'
 
-        for elementId in resetProperties:
-            for prop in resetProperties[elementId]:
-                ops.append([self.DiffOp.ResetProperties, [elementId, prop]])
+        # Replace each placeholder by a marker that can't be found in the
+        # pipeline and that is valid anywhere a name is.
+        while prefix in pipeline:
+            prefix += '_'
 
-        for connection in connectElement:
-            ops.append([self.DiffOp.ConnectElement, connection])
+        markers = {}
 
-        for ss in connectSignalsAndSlots:
-            ops.append([self.DiffOp.ConnectSignalsAndSlots, ss])
+        for name in self._placeholderRe.findall(pipeline):
+            if not name in markers:
+                markers[name] = '{0}{1}__'.format(prefix, len(markers))
 
-        # Set pipeline2 as the new pipeline.
-        self.instances1 = instances2
-        self.connections1 = connections2
-        self.ss1 = ss2
+        text = self._placeholderRe.sub(lambda match:
+                                           markers[match.group(1)],
+                                       pipeline)
 
-        return ops
+        def parseValue(value):
+            if prefix in value:
+                return _TemplateValue(self.parseValue(value), value)
+
+            return self.parseValue(value)
+
+        chains = []
+
+        for start, tokens, closed in self._scanChains(text):
+            for token in tokens:
+                # References and the sender and receiver of the signals &
+                # slots are resolved here.
+                if token[0] in [TokenType.Element, TokenType.Property]:
+                    misplaced = prefix in token[1]
+                elif token[0] == TokenType.SignalSlot:
+                    misplaced = prefix in token[2] + token[4]
+                else:
+                    misplaced = False
+
+                if misplaced:
+                    raise ValueError('Placeholders are only supported in '
+                                     'property values')
+
+            chains.append(self._parseChain(tokens, parseValue))
+
+        return PipelineTemplate(self,
+                                self._buildGraph(chains),
+                                {markers[name]: name for name in markers})
+
+    """
+    Converts a pipeline description string into an indexed PipelineGraph
+    instead of the (instances, connections, ss) lists.
+    """
+    def parseGraph(self, pipeline=''):
+        return PipelineGraph(*self.parsePipeline(pipeline))
+
+    """
+    Converts a pipeline description string into a PipelineArrays object with
+    the connections as NumPy arrays. NumPy is needed.
+    """
+    def parseArrays(self, pipeline=''):
+        return PipelineArrays(self.parsePipeline(pipeline))
+
+    """
+    Parse a pipeline description read from a text file object or from an
+    iterable of text chunks, and yields the elements, connections and signals
+    & slots as StreamRecord tuples, with the same Ids parsePipeline() gives.
+
+    The records are yielded as soon as the chain of elements they belong to
+    is complete and their references are solved, so only the chain being
+    read, the objectNames found and the records waiting for an objectName
+    not defined yet are kept in memory. objectNames must be unique to get
+    the same graph as parsePipeline(), a forward reference is solved to the
+    first element defining it. Duplicated connections and signals & slots
+    are not merged.
+
+    Fail and Force modes need the whole graph before yielding anything, in
+    these modes the records are yielded after reading the whole stream.
+    """
+    def parseStream(self, stream, chunkSize=65536):
+        StreamRecord = self.StreamRecord
+        mode = self.pipelineRoutingMode
+        chains = self._streamChains(stream, chunkSize)
+
+        if mode == self.PipelineRoutingMode.Fail or \
+           mode == self.PipelineRoutingMode.Force:
+            instances, connections, ss = \
+                self._buildGraph([self._parseChain(tokens)
+                                  for tokens in chains])
+
+            for id in instances:
+                yield StreamRecord.Element, id, \
+                      instances[id][0], instances[id][1]
+
+            for src, dst in connections:
+                yield StreamRecord.Connection, src, dst
+
+            for sender, signal, receiver, slot in ss:
+                yield StreamRecord.SignalSlot, sender, signal, receiver, slot
+
+            return
+
+        remove = mode == self.PipelineRoutingMode.Remove
+        availableElementTypes = set(self.availableElementTypes)
+        names = {}   # objectName -> (Id, available)
+        pending = {} # objectName -> records waiting for it
+        j = 0 # Row
+
+        for tokens in chains:
+            elements, pipe, ss, chainNames = self._parseChain(tokens)
+            elementId = self._rowIds(j)
+            removed = set()
+
+            # The columns are converted to Ids right away, only the
+            # references are left.
+            def endpoint(item):
+                return elementId(item) if isinstance(item, int) else item
+
+            for i, elementName, properties in elements:
+                if remove and not elementName in availableElementTypes:
+                    removed.add(i)
+                else:
+                    yield StreamRecord.Element, elementId(i), \
+                          elementName, properties
+
+            records = []
+
+            for k in range(1, len(pipe)):
+                if not pipe[k - 1] in removed and not pipe[k] in removed:
+                    records.append([StreamRecord.Connection,
+                                    endpoint(pipe[k - 1]),
+                                    endpoint(pipe[k])])
+
+            for sender, signal, receiver, slot in ss:
+                if not sender in removed and not receiver in removed:
+                    records.append([StreamRecord.SignalSlot,
+                                    endpoint(sender),
+                                    signal,
+                                    endpoint(receiver),
+                                    slot])
+
+            for objectName, i in chainNames:
+                names[objectName] = (elementId(i), not i in removed)
+
+            # The records waiting for the objectNames of this chain.
+            for objectName, i in chainNames:
+                records += pending.pop(objectName, [])
+
+            for record in records:
+                record = self._solveStreamRecord(record, names, pending)
+
+                if record != None:
+                    yield record
+
+            # Chains without elements don't take a row.
+            if pipe != []:
+                j += 1
+
+        for objectName in pending:
+            raise self.UnresolvedReferenceError(objectName + '.')
+
+    """
+    Replace the references in the endpoints of a stream record by Ids.
+    Returns the record as a tuple, or None if it connects a removed element
+    or if it must wait for an objectName, then it's added to 'pending'.
+    """
+    def _solveStreamRecord(self, record, names, pending):
+        if record[0] == self.StreamRecord.Connection:
+            endpoints = (1, 2)
+        else:
+            endpoints = (1, 3)
+
+        for k in endpoints:
+            item = record[k]
+
+            if isinstance(item, str) and item.endswith('.'):
+                if not item[: -1] in names:
+                    pending.setdefault(item[: -1], []).append(record)
+
+                    return None
+
+                id, available = names[item[: -1]]
+
+                if not available:
+                    return None
+
+                record[k] = id
+
+        return tuple(record)
+
+    """
+    Read the chunks of a stream and yields the tokens of each chain as soon
+    as no more text can change them. Only the text after the last final
+    token is kept and scanned again, and it's scanned again when a line
+    break is read or when the text read since the last scan is as long as
+    it, so a long unclosed value is not scanned on every chunk.
+    """
+    def _streamChains(self, stream, chunkSize):
+        if hasattr(stream, 'read'):
+            read = stream.read
+            stream = iter(lambda: read(chunkSize), '')
+
+        TokenType = self.TokenType
+        buffer = '' # Text after the last final token.
+        chunks = [] # Text read since the last scan.
+        size = 0
+        chain = []  # Final tokens of the current chain.
+        piped = True
+
+        # None marks the end of the stream, then every token is final.
+        for chunk in itertools.chain(stream, [None]):
+            if chunk != None:
+                chunks.append(chunk)
+                size += len(chunk)
+
+                if size < len(buffer) \
+                   and not '\n' in chunk \
+                   and not '\r' in chunk:
+                    continue
+
+            buffer = ''.join([buffer] + chunks)
+            chunks = []
+            size = 0
+
+            if chunk == None:
+                tokens = list(self._scanTokens(buffer))
+                final = len(tokens)
+            else:
+                tokens, final = self._finalTokens(buffer)
+
+            # Same grouping as _scanChains().
+            for k in range(final):
+                token = tokens[k][1]
+                kind = token[0]
+
+                if kind == TokenType.Element or kind == TokenType.Reference:
+                    if not piped:
+                        yield chain
+                        chain = []
+
+                    piped = False
+                elif kind == TokenType.Pipe:
+                    piped = True
+
+                chain.append(token)
+
+            if final < len(tokens):
+                buffer = buffer[tokens[final][0]:]
+            else:
+                buffer = ''
+
+        if chain != []:
+            yield chain
+
+    """
+    Scan the text read so far of a stream up to the first unclosed value,
+    returns the (start, token, closed) tokens and how many of them can't
+    change with the text coming after. No token spans lines, so the tokens
+    before a line break are final. A pipe, an element not followed by '=',
+    '(', ',' or ')', or a reference not followed by a name, can't become
+    part of a longer token, so it's final along with the tokens before it.
+    """
+    def _finalTokens(self, pipeline):
+        TokenType = self.TokenType
+        lineEnd = max(pipeline.rfind('\n'), pipeline.rfind('\r'))
+        tokens = []
+
+        for start, token, closed in self._scanTokens(pipeline):
+            tokens.append((start, token, closed))
+
+            if not closed and start > lineEnd:
+                break
+
+        # The last final token gives the number of final tokens.
+        for final in range(len(tokens), 0, -1):
+            start, token, closed = tokens[final - 1]
+            kind = token[0]
+
+            if start < lineEnd or kind == TokenType.Pipe:
+                break
+            elif not closed:
+                continue
+            elif kind == TokenType.Element:
+                end = start + len(token[1])
+
+                if self._elementEndRe.match(pipeline, end) != None:
+                    break
+            elif kind == TokenType.Reference:
+                end = start + len(token[1])
+
+                if self._referenceEndRe.match(pipeline, end) != None:
+                    break
+        else:
+            final = 0
+
+        return tokens, final
+
+    """
+    Parse many pipelines in a pool of 'processes' worker processes, all the
+    cores by default. Returns the (instances, connections, ss) graph of each
+    pipeline, in the same order. The routing mode, the available elements
+    types, the parse cache size and the Ids and values modes are sent once to
+    each worker.
+    """
+    def parseMany(self, pipelines, processes=None):
+        return self._mapMany(_parseWorker, pipelines, processes)
+
+    """
+    Compare many (pipeline1, pipeline2) pairs in a pool of 'processes' worker
+    processes, all the cores by default. Returns the instructions to convert
+    each pipeline1 into pipeline2, in the same order.
+    """
+    def diffMany(self, pairs, processes=None):
+        return self._mapMany(_diffWorker, pairs, processes)
+
+    """
+    Run 'function' on each item in a pool of worker processes, each one with
+    its own parser configured like this one.
+    """
+    def _mapMany(self, function, items, processes):
+        items = list(items)
+        config = (self.pipelineRoutingMode,
+                  list(self.availableElementTypes),
+                  self.parseCacheSize,
+                  self.compactIds,
+                  self.lazyValues,
+                  self.deepDiffSize)
+
+        if processes == None:
+            processes = os.cpu_count() or 1
+
+        processes = max(min(processes, len(items)), 1)
+
+        # Not worth starting a pool.
+        if processes == 1:
+            _initWorker(*config)
+
+            return [function(item) for item in items]
+
+        # Send the items in a few big batches, but enough to balance the
+        # work between the workers.
+        chunkSize = max(len(items) // (4 * processes), 1)
+
+        with multiprocessing.Pool(processes, _initWorker, config) as pool:
+            return pool.map(function, items, chunkSize)
+
+    """
+    Returns the graph as a binary snapshot that loadGraph() can read back
+    without parsing the pipeline again.
+    """
+    def dumpGraph(self, graph):
+        return self._dumpSnapshot([graph], None)
+
+    """
+    Read a graph from a binary snapshot returned by dumpGraph() or written
+    by saveState(). 'data' can be bytes or a memory mapped file.
+    """
+    def loadGraph(self, data):
+        return self._loadSnapshot(data)[0][0]
+
+    """
+    Write the current graph, the routing settings, the cached graphs and the
+    last pipeline edited to a binary snapshot file.
+    """
+    def saveState(self, fileName):
+        graphs = [(self.instances1, self.connections1, self.ss1)]
+        cache = []
+
+        for key in self.parseCache:
+            cache.append((key[0], key[1], len(graphs)))
+            graphs.append(self.parseCache[key])
+
+        editState = None
+
+        if self.editState != None:
+            editState = (self.editState['pipeline'], self.editState['config'])
+
+        state = (self.pipelineRoutingMode,
+                 self.availableElementTypes,
+                 self.parseCacheSize,
+                 cache,
+                 editState)
+
+        with open(fileName, 'wb') as f:
+            f.write(self._dumpSnapshot(graphs, state))
+
+    """
+    Restore the parser from a snapshot file written by saveState(). The file
+    is memory mapped and the graphs are decoded directly from it.
+    """
+    def loadState(self, fileName):
+        with open(fileName, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                graphs, state = self._loadSnapshot(data)
+
+        if state == None:
+            raise ValueError('The snapshot has no parser state')
+
+        mode, availableElementTypes, parseCacheSize, cache, editState = state
+        self.instances1, self.connections1, self.ss1 = graphs[0]
+        self.pipelineRoutingMode = mode
+        self.availableElementTypes = availableElementTypes
+        self.parseCacheSize = parseCacheSize
+        self.parseCache = collections.OrderedDict()
+
+        for pipeline, config, graph in cache:
+            self.parseCache[(pipeline, config)] = graphs[graph]
+
+        if editState == None:
+            self.editState = None
+        else:
+            self.editState = {'pipeline': editState[0],
+                              'config': editState[1]}
+
+    """
+    Encode a list of graphs and an optional parser state as a snapshot.
+
+    All the integers are little endian, strings are written once in a string
+    table and referenced by index, and property values are encoded in a
+    values blob and referenced by offset:
+
+    header  '<4sHHI' magic, version, 0, CRC-32 of the rest of the snapshot
+    strings '<II'    number of strings, size of their text
+            '<I'     character offset of each string, plus the end offset
+            UTF-8 text of all the strings, one after the other
+    values  '<I'     size, followed by the encoded values
+    graphs  '<I'     number of graphs, and for each graph:
+            '<III'   number of elements, connections and signals & slots
+            '<III'   Id, elementName and properties offset of each element
+            '<II'    source and destination Ids of each connection
+            '<IIII'  sender, signal, receiver and slot of each signal & slot
+    state   '<B'     1 if there is a parser state, 0 otherwise, followed by:
+            '<iII'   routing mode, parse cache size, number of elements
+                     types, and the elements types
+            '<I'     number of cached graphs, and for each one:
+                     pipeline, routing settings and graph index
+            '<B'     1 if there is an edit state, followed by the pipeline
+                     and its routing settings
+
+    Routing settings are written as the routing mode and the number of
+    elements types plus 1, followed by the types, 0 stands for None.
+    """
+    def _dumpSnapshot(self, graphs, state):
+        strings = {}
+        values = bytearray()
+        body = bytearray()
+
+        def string(s):
+            index = strings.get(s)
+
+            if index == None:
+                index = strings[s] = len(strings)
+
+            return index
+
+        def config(routing):
+            body.extend(struct.pack('<iI',
+                                    routing[0],
+                                    0 if routing[1] == None
+                                      else len(routing[1]) + 1))
+
+            if routing[1] != None:
+                types = [string(t) for t in routing[1]]
+                body.extend(struct.pack('<{0}I'.format(len(types)), *types))
+
+        body.extend(struct.pack('<I', len(graphs)))
+
+        # Snapshots always have string Ids.
+        if self.compactIds:
+            graphs = [self.formatGraph(graph) for graph in graphs]
+
+        for instances, connections, ss in graphs:
+            nodes = []
+
+            for id in instances:
+                nodes += [string(id),
+                          string(instances[id][0]),
+                          len(values)]
+                self._encodeValue(instances[id][1], values, string)
+
+            edges = [string(id) for connection in connections
+                                for id in connection]
+            signals = [string(item) for s in ss for item in s]
+            body.extend(struct.pack('<III',
+                                    len(instances),
+                                    len(connections),
+                                    len(ss)))
+
+            for items in nodes, edges, signals:
+                body.extend(struct.pack('<{0}I'.format(len(items)), *items))
+
+        if state == None:
+            body.extend(struct.pack('<B', 0))
+        else:
+            mode, availableElementTypes, parseCacheSize, cache, edit = state
+            types = [string(t) for t in availableElementTypes]
+            body.extend(struct.pack('<BiII',
+                                    1,
+                                    mode,
+                                    parseCacheSize,
+                                    len(types)))
+            body.extend(struct.pack('<{0}I'.format(len(types)), *types))
+            body.extend(struct.pack('<I', len(cache)))
+
+            for pipeline, routing, graph in cache:
+                body.extend(struct.pack('<I', string(pipeline)))
+                config(routing)
+                body.extend(struct.pack('<I', graph))
+
+            if edit == None:
+                body.extend(struct.pack('<B', 0))
+            else:
+                body.extend(struct.pack('<BI', 1, string(edit[0])))
+                config(edit[1])
+
+        offsets = [0]
+
+        for s in strings:
+            offsets.append(offsets[-1] + len(s))
+
+        text = ''.join(strings).encode('utf-8', 'surrogatepass')
+        snapshot = b''.join([struct.pack('<II', len(strings), len(text)),
+                             struct.pack('<{0}I'.format(len(offsets)),
+                                         *offsets),
+                             text,
+                             struct.pack('<I', len(values)),
+                             values,
+                             body])
+
+        return struct.pack('<4sHHI',
+                           self._snapshotMagic,
+                           self._snapshotVersion,
+                           0,
+                           zlib.crc32(snapshot)) + snapshot
+
+    """
+    Decode a snapshot written by _dumpSnapshot(). Returns (graphs, state),
+    state is None if the snapshot has no parser state. Raises ValueError if
+    the data isn't a snapshot of this version, or if it's corrupted or
+    truncated.
+    """
+    def _loadSnapshot(self, data):
+        data = memoryview(data)
+
+        if len(data) < 8:
+            raise ValueError('Not a pipeline snapshot')
+
+        magic, version, reserved = struct.unpack_from('<4sHH', data)
+
+        if magic != self._snapshotMagic:
+            raise ValueError('Not a pipeline snapshot')
+
+        if version != self._snapshotVersion:
+            raise ValueError('Unsupported snapshot version {0}'.
+                             format(version))
+
+        if len(data) < 12 or \
+           struct.unpack_from('<I', data, 8)[0] != zlib.crc32(data[12:]):
+            raise ValueError('Corrupted pipeline snapshot')
+
+        pos = 12
+        nStrings, size = struct.unpack_from('<II', data, pos)
+        pos += 8
+        offsets = struct.unpack_from('<{0}I'.format(nStrings + 1), data, pos)
+        pos += 4 * (nStrings + 1)
+
+        # The text is decoded at once, and sliced by character offsets.
+        text = str(data[pos: pos + size], 'utf-8', 'surrogatepass')
+        strings = [text[offsets[k]: offsets[k + 1]] for k in range(nStrings)]
+        pos += size
+        size = struct.unpack_from('<I', data, pos)[0]
+        values = data[pos + 4: pos + 4 + size]
+        pos += 4 + size
+
+        def unpack(count):
+            nonlocal pos
+            items = struct.unpack_from('<{0}I'.format(count), data, pos)
+            pos += 4 * count
+
+            return items
+
+        def config():
+            nonlocal pos
+            mode, nTypes = struct.unpack_from('<iI', data, pos)
+            pos += 8
+
+            if nTypes == 0:
+                return mode, None
+
+            return mode, frozenset(strings[t] for t in unpack(nTypes - 1))
+
+        graphs = []
+
+        for g in range(unpack(1)[0]):
+            nNodes, nEdges, nSs = unpack(3)
+            nodes = unpack(3 * nNodes)
+            edges = unpack(2 * nEdges)
+            signals = unpack(4 * nSs)
+            instances = {}
+
+            for k in range(0, len(nodes), 3):
+                instances[strings[nodes[k]]] = \
+                    [strings[nodes[k + 1]],
+                     self._decodeValue(values, nodes[k + 2], strings)]
+
+            graphs.append((instances,
+                           [[strings[edges[k]], strings[edges[k + 1]]]
+                            for k in range(0, len(edges), 2)],
+                           [[strings[signals[k]],
+                             strings[signals[k + 1]],
+                             strings[signals[k + 2]],
+                             strings[signals[k + 3]]]
+                            for k in range(0, len(signals), 4)]))
+
+        if self.compactIds:
+            graphs = [self._convertGraph(graph) for graph in graphs]
+
+        if data[pos] == 0:
+            return graphs, None
+
+        pos += 1
+        mode, parseCacheSize, nTypes = struct.unpack_from('<iII', data, pos)
+        pos += 12
+        availableElementTypes = [strings[t] for t in unpack(nTypes)]
+        cache = []
+
+        for k in range(unpack(1)[0]):
+            pipeline = strings[unpack(1)[0]]
+            routing = config()
+            cache.append((pipeline, routing, unpack(1)[0]))
+
+        editState = None
+
+        if data[pos] != 0:
+            pos += 1
+            pipeline = strings[unpack(1)[0]]
+            editState = (pipeline, config())
+
+        return graphs, (mode,
+                        availableElementTypes,
+                        parseCacheSize,
+                        cache,
+                        editState)
+
+    """
+    Append the binary encoding of a property value to 'out'. Strings are
+    stored in the string table through the 'string' function.
+    """
+    def _encodeValue(self, value, out, string):
+        # Iterators over the items left in each nested container.
+        stack = [iter((value,))]
+
+        while stack != []:
+            item = next(stack[-1], stack)
+
+            if item is stack:
+                stack.pop()
+            elif isinstance(item, bool):
+                out += struct.pack('<cB', b'b', item)
+            elif isinstance(item, int):
+                if -(1 << 63) <= item < (1 << 63):
+                    out += struct.pack('<cq', b'i', item)
+                else:
+                    out += struct.pack('<cI', b'I', string(str(item)))
+            elif isinstance(item, float):
+                out += struct.pack('<cd', b'f', item)
+            elif isinstance(item, str):
+                out += struct.pack('<cI', b's', string(item))
+            elif isinstance(item, list):
+                out += struct.pack('<cI', b'l', len(item))
+                stack.append(iter(item))
+            elif isinstance(item, dict):
+                out += struct.pack('<cI', b'd', len(item))
+                stack.append(itertools.chain.from_iterable(item.items()))
+            elif isinstance(item, LazyValue):
+                stack.append(iter((item.value(),)))
+            elif item == None:
+                out += b'n'
+            else:
+                raise TypeError('Can\'t encode a value of type {0}'.
+                                format(type(item).__name__))
+
+    """ Decode a property value encoded by _encodeValue() at 'pos'. """
+    def _decodeValue(self, data, pos, strings):
+        unpackIndex = self._snapshotIndex.unpack_from
+        root = []
+        # [container, items left, is dict, key, has key]
+        stack = [[root, 1, False, None, False]]
+
+        while stack != []:
+            frame = stack[-1]
+
+            if frame[1] == 0:
+                stack.pop()
+
+                continue
+
+            tag = data[pos]
+            container = None
+
+            if tag == 0x73: # s
+                item = strings[unpackIndex(data, pos + 1)[0]]
+                pos += 5
+            elif tag == 0x69: # i
+                item = self._snapshotInt.unpack_from(data, pos + 1)[0]
+                pos += 9
+            elif tag == 0x66: # f
+                item = self._snapshotFloat.unpack_from(data, pos + 1)[0]
+                pos += 9
+            elif tag == 0x6c: # l
+                item = []
+                container = [item, unpackIndex(data, pos + 1)[0],
+                             False, None, False]
+                pos += 5
+            elif tag == 0x64: # d
+                item = {}
+                container = [item, 2 * unpackIndex(data, pos + 1)[0],
+                             True, None, False]
+                pos += 5
+            elif tag == 0x49: # I
+                item = int(strings[unpackIndex(data, pos + 1)[0]])
+                pos += 5
+            elif tag == 0x62: # b
+                item = data[pos + 1] != 0
+                pos += 2
+            elif tag == 0x6e: # n
+                item = None
+                pos += 1
+            else:
+                raise ValueError('Invalid value tag {0}'.format(tag))
+
+            frame[1] -= 1
+
+            if not frame[2]:
+                frame[0].append(item)
+            elif frame[4]:
+                frame[0][frame[3]] = item
+                frame[4] = False
+            else:
+                frame[3] = item
+                frame[4] = True
+
+            if container != None:
+                stack.append(container)
+
+        return root[0]
+
+    """ Converts a value into a hashable one, comparing equal if both are. """
+    def _freeze(self, value):
+        # Lazy values are compared by their text, without decoding them.
+        if isinstance(value, LazyValue):
+            return (LazyValue, value.raw)
+        elif isinstance(value, dict):
+            return (dict, frozenset((key, self._freeze(value[key]))
+                                    for key in value))
+        elif isinstance(value, list):
+            return (list, tuple(self._freeze(item) for item in value))
+
+        return value
+
+    """
+    Returns the [PatchOp, path, value] changes that convert 'value1' into
+    'value2', or None if 'value2' must be set as a whole: it's too small,
+    it's not a container of the same type as 'value1', or it would take as
+    many changes as it has items.
+    """
+    def _patchValue(self, value1, value2):
+        if isinstance(value1, LazyValue):
+            value1 = value1.value()
+
+        if isinstance(value2, LazyValue):
+            value2 = value2.value()
+
+        if not isinstance(value2, (dict, list)) or \
+           type(value1) != type(value2) or \
+           self._valueSize(value2) < self.deepDiffSize:
+            return None
+
+        patches = []
+        self._diffItems(value1, value2, [], patches)
+
+        if len(patches) >= self._valueSize(value2):
+            return None
+
+        return patches
+
+    """ Returns the number of items of a value and its nested values. """
+    def _valueSize(self, value):
+        if isinstance(value, dict):
+            return len(value) + sum(self._valueSize(item)
+                                    for item in value.values())
+        elif isinstance(value, list):
+            return len(value) + sum(self._valueSize(item) for item in value)
+
+        return 0
+
+    """
+    Add to 'patches' the changes of the item at 'path', from 'value1' to
+    'value2'. Containers of the same type are compared item by item, unless
+    that takes as many changes as setting the whole item.
+    """
+    def _patchItem(self, value1, value2, path, patches):
+        if isinstance(value2, (dict, list)) and type(value1) == type(value2):
+            itemPatches = []
+            self._diffItems(value1, value2, path, itemPatches)
+
+            if len(itemPatches) < self._valueSize(value2):
+                patches += itemPatches
+
+                return
+
+        patches.append([self.PatchOp.SetItem, path, value2])
+
+    """
+    Add to 'patches' the changes of the items of two dictionaries or two
+    lists at 'path'. The lists are compared with difflib, so the items
+    inserted or deleted in the middle don't change the items after them.
+    """
+    def _diffItems(self, value1, value2, path, patches):
+        PatchOp = self.PatchOp
+
+        if isinstance(value2, dict):
+            for key in value2:
+                if not key in value1:
+                    patches.append([PatchOp.SetItem, path + [key], value2[key]])
+                elif value1[key] != value2[key]:
+                    self._patchItem(value1[key],
+                                    value2[key],
+                                    path + [key],
+                                    patches)
+
+            for key in value1:
+                if not key in value2:
+                    patches.append([PatchOp.DeleteItem, path + [key], None])
+
+            return
+
+        # The items before j are already the ones of value2.
+        matcher = difflib.SequenceMatcher(None,
+                                          [self._freeze(item)
+                                           for item in value1],
+                                          [self._freeze(item)
+                                           for item in value2],
+                                          False)
+
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+
+            common = min(i2 - i1, j2 - j1)
+
+            for k in range(common):
+                self._patchItem(value1[i1 + k],
+                                value2[j1 + k],
+                                path + [j1 + k],
+                                patches)
+
+            for k in range(i2 - i1 - common):
+                patches.append([PatchOp.DeleteItem, path + [j1 + common], None])
+
+            for j in range(j1 + common, j2):
+                patches.append([PatchOp.InsertItem, path + [j], value2[j]])
+
+    """
+    Pair each element of 'instances1' with an element of the same type in
+    'instances2' and returns the pairs as a {id1: id2} dictionary.
+
+    Every element in instances2 is indexed by type, by (type, objectName),
+    by (type, Id) and by (type, properties), and the pairs are looked up from
+    the best to the worst kind of match:
+
+    1. Same objectName.
+    2. Same Id, doesn't require a ChangeId and usually keeps the connections.
+    3. Same properties, doesn't require SetProperties or ResetProperties.
+    4. Any element of the same type.
+    """
+    def _matchElements(self, instances1, instances2):
+        byType = {}
+        byName = {}
+        byProperties = {}
+        keys = {} # id2 -> (objectName key, properties key)
+
+        for id2 in instances2:
+            elementName, properties = instances2[id2]
+            byType.setdefault(elementName, {})[id2] = None
+            objectName = properties.get('objectName')
+            nameKey = None
+
+            if objectName != None:
+                nameKey = (elementName, self._freeze(objectName))
+                byName.setdefault(nameKey, {})[id2] = None
+
+            propertiesKey = (elementName, self._freeze(properties))
+            byProperties.setdefault(propertiesKey, {})[id2] = None
+            keys[id2] = (nameKey, propertiesKey)
+
+        matches = {}
+
+        # Pair two elements and drop the new one from the indexes, so the
+        # first candidate in each index is always free.
+        def match(id1, id2):
+            matches[id1] = id2
+            nameKey, propertiesKey = keys.pop(id2)
+            del byType[instances2[id2][0]][id2]
+            del byProperties[propertiesKey][id2]
+
+            if nameKey != None:
+                del byName[nameKey][id2]
+
+        for id1 in instances1:
+            elementName, properties = instances1[id1]
+            objectName = properties.get('objectName')
+
+            if objectName != None:
+                candidates = byName.get((elementName,
+                                         self._freeze(objectName)))
+
+                if candidates:
+                    match(id1, next(iter(candidates)))
+
+        for id1 in instances1:
+            if not id1 in matches and id1 in keys and \
+               instances1[id1][0] == instances2[id1][0]:
+                match(id1, id1)
+
+        for id1 in instances1:
+            if not id1 in matches:
+                elementName, properties = instances1[id1]
+                candidates = byProperties.get((elementName,
+                                               self._freeze(properties)))
+
+                if candidates:
+                    match(id1, next(iter(candidates)))
+
+        for id1 in instances1:
+            if not id1 in matches:
+                candidates = byType.get(instances1[id1][0])
+
+                if candidates:
+                    match(id1, next(iter(candidates)))
+
+        return matches
+
+    """
+    Compare the 'pipeline2' graph with the previous pipeline graph and returns
+    the difference as instructions.
+    """
+    def pipelineDiff(self, pipeline2=''):
+        # Set pipeline2 as the new pipeline, with its chains if it's parsed.
+        state = {'pipeline': pipeline2, 'config': self._routingConfig()}
+        graph2 = self._parseCached(pipeline2, state)
+        ops = self._diffPrevious(graph2)
+
+        if 'chains' in state:
+            self._indexChains(state, graph2)
+
+        self.editState = state
+
+        return ops
+
+    """
+    Apply a text edit to the last pipeline given to pipelineDiff() or
+    pipelineEdit(): replace 'removed' characters at 'offset' by 'inserted'.
+    Returns the instructions to convert the previous graph into the graph of
+    the edited pipeline, like pipelineDiff().
+
+    Only the chains touched by the edit are tokenized and parsed again, and
+    compared with the chains they replace, together with the chains that
+    reference the objectNames they define and, when routing, the chains of
+    the unavailable elements they are connected to. The whole pipeline is
+    diffed again if the edit adds or removes chains, if an edited chain
+    defines an objectName defined in other chains too, or if it touches half
+    the chains. The chains are kept by pipelineDiff() unless the graph comes
+    from the parse cache, then the first edit diffs the whole pipeline too.
+    """
+    def pipelineEdit(self, offset, removed=0, inserted=''):
+        state = self.editState
+        pipeline1 = '' if state == None else state['pipeline']
+
+        if offset < 0 or removed < 0 or offset + removed > len(pipeline1):
+            raise IndexError('The edit is out of the pipeline bounds')
+
+        pipeline2 = pipeline1[: offset] + inserted + \
+                    pipeline1[offset + removed:]
+
+        if state != None and 'chains' in state and \
+           state['config'] == self._routingConfig():
+            ops = self._editChains(state,
+                                   pipeline2,
+                                   offset,
+                                   len(inserted) - removed,
+                                   offset + len(inserted))
+
+            if ops != None:
+                return ops
+
+        return self.pipelineDiff(pipeline2)
+
+    """
+    Index the chains kept in 'state' by _parsePipeline() for pipelineEdit(),
+    'graph' is the routed graph. Each chain is kept as a (columns,
+    connections, ss, unresolved, names) tuple, see _parseTokens(), and the
+    state has:
+
+    starts: the position of each chain in the pipeline.
+    open: the chains with unclosed tokens.
+    rows: the row of each chain, and rowChains the chain of each row.
+    defined: the number of chains defining each objectName.
+    users: the chains referencing each objectName.
+    written, writtenSs: how many times each connection and signal & slot is
+        written in the pipeline.
+    edges, signals: the connections and signals & slots of the graph.
+    rerouted: how many times each connection is added by rerouting the
+        unavailable elements in Force mode.
+    """
+    def _indexChains(self, state, graph):
+        records = state['chains']
+        instances = state['instances']
+        rows = []
+        rowChains = {} # chain of the Ids -> chain
+        defined = {}   # objectName -> chains
+        users = {}     # objectName -> {chain: None}
+        written = collections.Counter()
+        writtenSs = collections.Counter()
+        row = 0
+
+        for k, record in enumerate(records):
+            rows.append(row)
+
+            if record[2] > 0:
+                rowChains[self._chainOf(self._rowIds(row)(0))] = k
+                row += 1
+
+            for name in record[6]:
+                defined[name] = defined.get(name, 0) + 1
+
+            for reference, targets in record[5]:
+                users.setdefault(reference[: -1], {})[k] = None
+
+            written.update(map(tuple, record[3]))
+            writtenSs.update(map(tuple, record[4]))
+
+        removeIds = []
+
+        if self.pipelineRoutingMode != self.PipelineRoutingMode.NoCheck:
+            availableElementTypes = set(self.availableElementTypes)
+            removeIds = [id for id in instances
+                         if not instances[id][0] in availableElementTypes]
+
+        rerouted = collections.Counter()
+
+        if self.pipelineRoutingMode == self.PipelineRoutingMode.Force and \
+           removeIds != []:
+            rerouted.update(PipelineGraph(dict.fromkeys(removeIds),
+                                          written,
+                                          indexElements=False)
+                            .reroutedEdges(removeIds))
+
+        state['starts'] = [record[0] for record in records]
+        state['open'] = [k for k, record in enumerate(records)
+                         if not record[1]]
+        state['chains'] = [record[2:] for record in records]
+        state['rows'] = rows
+        state['rowChains'] = rowChains
+        state['defined'] = defined
+        state['users'] = users
+        state['written'] = written
+        state['writtenSs'] = writtenSs
+        state['edges'] = {edge: list(edge) for edge in map(tuple, graph[1])}
+        state['signals'] = {s: list(s) for s in map(tuple, graph[2])}
+        state['rerouted'] = rerouted
+
+    """
+    The pipelineEdit() of 'pipeline2', the previous pipeline with the
+    characters from 'offset' moved by 'delta' and the edited ones ending at
+    'editEnd'. Returns None if the whole pipeline must be diffed, the state
+    and the graph are updated only if the instructions are returned.
+    """
+    def _editChains(self, state, pipeline2, offset, delta, editEnd):
+        pipeline1 = state['pipeline']
+        starts = state['starts']
+        chains = state['chains']
+        open1 = state['open']
+        rows = state['rows']
+        rowChains = state['rowChains']
+        defined = state['defined']
+        users = state['users']
+        references = state['references']
+        instances = state['instances']
+        mode = self.pipelineRoutingMode
+        PipelineRoutingMode = self.PipelineRoutingMode
+
+        if starts == []:
+            return None
+
+        # Tokenize again from the last pipe before the edit until a chain
+        # starts at the same place it started before the edit. No token can
+        # go through a pipe, so the tokens before it can't change, and from
+        # the last chain on the tokens are the same. Unclosed values read up
+        # to the end of the pipeline, so the chains with them are tokenized
+        # again too.
+        first = bisect.bisect_right(starts, offset) - 1
+        end = offset
+
+        while first > 0 and not self._hasPipe(pipeline1, starts[first], end):
+            end = starts[first]
+            first -= 1
+
+        first = max(first, 0)
+
+        if open1 != [] and open1[0] < first:
+            first = open1[0]
+
+        sync = [len(starts)]
+
+        def stop(start):
+            if start < editEnd:
+                return False
+
+            k = bisect.bisect_left(starts, start - delta)
+
+            if k > first and k < len(starts) and starts[k] == start - delta:
+                sync[0] = k
+
+                return True
+
+            return False
+
+        newChains = []
+        newInstances, connections, ss, newReferences, unresolved, count = \
+            self._parseTokens(self._scanTokens(pipeline2, starts[first]),
+                              rows[first],
+                              chains=newChains,
+                              stop=stop,
+                              pos=starts[first])
+        last = sync[0]
+        availableElementTypes = set(self.availableElementTypes)
+
+        def unavailable(element):
+            return element != None and \
+                   not element[0] in availableElementTypes
+
+        # The chains aren't kept for failed graphs.
+        if mode == PipelineRoutingMode.Fail and \
+           any(map(unavailable, newInstances.values())):
+            return None
+
+        # The other chains keep their rows if the edit doesn't add or remove
+        # chains, or elements from empty chains.
+        if len(newChains) != last - first:
+            return None
+
+        for k, record in enumerate(newChains):
+            if (record[2] > 0) != (chains[first + k][0] > 0):
+                return None
+
+        # The objectNames defined in the edited chains must be defined only
+        # once, before and after the edit, so they can be updated alone.
+        names1 = collections.Counter(name
+                                     for k in range(first, last)
+                                     for name in chains[k][4])
+        names2 = collections.Counter(name
+                                     for record in newChains
+                                     for name in record[6])
+
+        for name in names1 + names2:
+            if defined.get(name, 0) > 1 or \
+               defined.get(name, 0) - names1[name] + names2[name] > 1:
+                return None
+
+        oldIds = [id for k in range(first, last)
+                     for id in map(self._rowIds(rows[k]),
+                                   range(chains[k][0]))
+                     if id in instances]
+
+        def solve(reference):
+            name = reference[: -1]
+
+            if name in newReferences:
+                return newReferences[name]
+
+            if name in names1 or not name in references:
+                raise self.UnresolvedReferenceError(reference)
+
+            return references[name]
+
+        for reference, targets in unresolved:
+            id = solve(reference)
+
+            for item, k in targets:
+                item[k] = id
+
+        # The chains referencing the objectNames of the edited chains are
+        # compared too, and parsed again if the Id of the objectName changes.
+        region = dict.fromkeys(range(first, last)) # chain -> None
+        newRecords = {first + k: record[2:]
+                      for k, record in enumerate(newChains)}
+
+        for name in names1 + names2:
+            chainUsers = users.get(name, {})
+            region.update(chainUsers)
+
+            if name in names1 and references[name] == newReferences.get(name):
+                continue
+
+            for k in chainUsers:
+                if k in newRecords:
+                    continue
+
+                start = starts[k] if k < first else starts[k] + delta
+                records = []
+                parsed = self._parseTokens(self._scanTokens(pipeline2, start),
+                                           rows[k],
+                                           chains=records,
+                                           stop=lambda start: True,
+                                           pos=start)
+
+                for reference, targets in parsed[4]:
+                    id = solve(reference)
+
+                    for item, j in targets:
+                        item[j] = id
+
+                newRecords[k] = records[0][2:]
+
+        # Elements of the pipeline before and after the edit.
+        oldEdited = set(oldIds)
+
+        def element2(id):
+            if id in newInstances:
+                return newInstances[id]
+
+            return None if id in oldEdited else instances.get(id)
+
+        routing = mode == PipelineRoutingMode.Remove or \
+                  mode == PipelineRoutingMode.Force
+
+        # Removing or rerouting an element depends on all the chains
+        # connected to it.
+        removed1 = []
+        removed2 = []
+
+        if routing:
+            pending = list(region)
+
+            while pending != []:
+                k = pending.pop()
+
+                for elements, record in ((instances.get, chains[k]),
+                                         (element2,
+                                          newRecords.get(k, chains[k]))):
+                    ids = itertools.chain(map(self._rowIds(rows[k]),
+                                              range(record[0])),
+                                          *record[1],
+                                          *((s[0], s[2]) for s in record[2]))
+
+                    for id in ids:
+                        element = elements(id)
+
+                        if not unavailable(element):
+                            continue
+
+                        chain = rowChains[self._chainOf(id)]
+                        objectName = element[1].get('objectName')
+                        found = [chain]
+
+                        if isinstance(objectName, str):
+                            found += users.get(objectName, {})
+
+                        for chain in found:
+                            if not chain in region:
+                                region[chain] = None
+                                pending.append(chain)
+
+            for k in region:
+                rowIds = self._rowIds(rows[k])
+                columns = max(chains[k][0], newRecords.get(k, chains[k])[0])
+
+                for column in range(columns):
+                    id = rowIds(column)
+
+                    if unavailable(instances.get(id)):
+                        removed1.append(id)
+
+                    if unavailable(element2(id)):
+                        removed2.append(id)
+
+        if len(region) * 2 > len(chains):
+            return None
+
+        # Connections and signals & slots written or rerouted in the chains
+        # compared, before and after the edit.
+        written1 = collections.Counter()
+        written2 = collections.Counter()
+        writtenSs1 = collections.Counter()
+        writtenSs2 = collections.Counter()
+
+        for k in region:
+            written1.update(map(tuple, chains[k][1]))
+            writtenSs1.update(map(tuple, chains[k][2]))
+            written2.update(map(tuple, newRecords.get(k, chains[k])[1]))
+            writtenSs2.update(map(tuple, newRecords.get(k, chains[k])[2]))
+
+        rerouted1 = collections.Counter()
+        rerouted2 = collections.Counter()
+
+        if mode == PipelineRoutingMode.Force:
+            if removed1 != []:
+                rerouted1.update(PipelineGraph(dict.fromkeys(removed1),
+                                               written1,
+                                               indexElements=False)
+                                 .reroutedEdges(removed1))
+
+            if removed2 != []:
+                rerouted2.update(PipelineGraph(dict.fromkeys(removed2),
+                                               written2,
+                                               indexElements=False)
+                                 .reroutedEdges(removed2))
+
+        written = state['written']
+        writtenSs = state['writtenSs']
+        rerouted = state['rerouted']
+        edges = state['edges']
+        signals = state['signals']
+
+        def kept(id):
+            return not routing or not unavailable(element2(id))
+
+        def present(edge):
+            if written[edge] - written1[edge] + written2[edge] > 0 and \
+               kept(edge[0]) and kept(edge[1]):
+                return True
+
+            return rerouted[edge] - rerouted1[edge] + rerouted2[edge] > 0
+
+        def presentSs(s):
+            return writtenSs[s] - writtenSs1[s] + writtenSs2[s] > 0 and \
+                   kept(s[0]) and kept(s[2])
+
+        edges2 = [edge for edge in dict.fromkeys(itertools.chain(written1,
+                                                                 written2,
+                                                                 rerouted1,
+                                                                 rerouted2))
+                  if present(edge)]
+        signals2 = [s for s in dict.fromkeys(itertools.chain(writtenSs1,
+                                                             writtenSs2))
+                    if presentSs(s)]
+        routed2 = {id: newInstances[id] for id in newInstances
+                   if not routing or not unavailable(newInstances[id])}
+
+        graph1 = ({id: self.instances1[id] for id in oldIds
+                   if id in self.instances1},
+                  [edges[edge] for edge in written1 + written2
+                                          + rerouted1 + rerouted2
+                   if edge in edges],
+                  [signals[s] for s in writtenSs1 + writtenSs2
+                   if s in signals])
+        graph2 = (routed2,
+                  [list(edge) for edge in edges2],
+                  [list(s) for s in signals2])
+        ops = self.graphDiff(graph1, graph2)
+
+        # Update the state.
+        for counter, old, new in ((written, written1, written2),
+                                  (writtenSs, writtenSs1, writtenSs2),
+                                  (rerouted, rerouted1, rerouted2)):
+            counter.subtract(old)
+            counter.update(new)
+
+            for key in old:
+                if counter[key] < 1:
+                    del counter[key]
+
+        changed = False
+
+        for present2, lists, keys in ((edges2, edges, written1 + written2
+                                                      + rerouted1
+                                                      + rerouted2),
+                                      (signals2, signals, writtenSs1
+                                                          + writtenSs2)):
+            present2 = set(present2)
+
+            for key in keys:
+                if key in present2 and not key in lists:
+                    lists[key] = list(key)
+                    changed = True
+                elif not key in present2 and key in lists:
+                    del lists[key]
+                    changed = True
+
+        for id in oldIds:
+            del instances[id]
+
+        instances.update(newInstances)
+
+        for id in oldIds:
+            self.instances1.pop(id, None)
+
+        self.instances1.update(routed2)
+
+        if changed:
+            self.connections1 = list(edges.values())
+            self.ss1 = list(signals.values())
+
+        for name in names1:
+            del references[name]
+            defined[name] -= 1
+
+            if defined[name] < 1:
+                del defined[name]
+
+        references.update(newReferences)
+
+        for name in names2:
+            defined[name] = defined.get(name, 0) + 1
+
+        for k in range(first, last):
+            for reference, targets in chains[k][3]:
+                chainUsers = users.get(reference[: -1], {})
+                chainUsers.pop(k, None)
+
+                if chainUsers == {}:
+                    users.pop(reference[: -1], None)
+
+        for k in range(first, last):
+            for reference, targets in newRecords[k][3]:
+                users.setdefault(reference[: -1], {})[k] = None
+
+        for k in newRecords:
+            chains[k] = newRecords[k]
+
+        state['starts'] = starts[: first] + \
+                          [record[0] for record in newChains] + \
+                          [start + delta for start in starts[last:]]
+        state['open'] = [k for k in open1 if k < first] + \
+                        [first + k for k, record in enumerate(newChains)
+                         if not record[1]] + \
+                        [k for k in open1 if k >= last]
+        state['pipeline'] = pipeline2
+        self.structure1 = None
+
+        if self.history != None:
+            self.history.commit((self.instances1, self.connections1, self.ss1))
+
+        return ops
+
+    """
+    Returns True if there is a pipe token starting between 'start' and 'end'
+    when the pipeline is tokenized from 'start'.
+    """
+    def _hasPipe(self, pipeline, start, end):
+        for pos, token, closed in self._scanTokens(pipeline, start):
+            if pos >= end:
+                break
+
+            if token[0] == self.TokenType.Pipe:
+                return True
+
+        return False
+
+    """
+    Compare the previous pipeline graph with 'graph2' and set it as the new
+    one. The groups of connected chains, and then the chains, that are the
+    same in both graphs apart from their Ids are paired first, so only the
+    elements and connections of the groups that changed are compared. The
+    structure of the new graph is kept for the next diff.
+    """
+    def _diffPrevious(self, graph2):
+        graph1 = (self.instances1, self.connections1, self.ss1)
+        cached = self.structure1
+        stats = self.stats
+
+        if stats != None:
+            clock = stats.clock()
+
+        # The structure of the previous graph is valid while the graph isn't
+        # replaced.
+        if cached != None and all(a is b for a, b in zip(cached, graph1)):
+            structure1 = cached[3]
+        else:
+            structure1 = self._graphStructure(graph1)
+
+        structure2 = self._graphStructure(graph2)
+
+        if stats != None:
+            clock.lap('structure')
+
+        ops = self._graphDiff(graph1, graph2, structure1, structure2)
+        self.instances1, self.connections1, self.ss1 = graph2
+        self.structure1 = tuple(graph2) + (structure2,)
+
+        if self.history != None:
+            self.history.commit(graph2)
+
+        return ops
+
+    """
+    Returns the structure of a graph, used to find the parts of two graphs
+    that didn't change, as a list with a (key, ids, chains) tuple for each
+    group of chains connected between them.
+
+    A chain contains the elements in the same row, and it's given as a
+    (key, ids) tuple. The key of a chain is built from the elementName and
+    properties of its elements, and the connections and signals & slots
+    between them, with the elements given by their position in the chain.
+    The key of a group is built from the keys of its chains and the
+    connections and signals & slots between them, so two chains or groups
+    with the same key are the same subgraph with other Ids, and their
+    elements can be paired in the order of 'ids'. Groups connected to Ids
+    that aren't elements have no key.
+    """
+    def _graphStructure(self, graph):
+        instances, connections, ss = graph
+        chains = {}   # row -> [ids, connections, ss]
+        rowOf = {}    # id -> row
+        position = {} # id -> position in the chain
+
+        for id in instances:
+            row = self._chainOf(id)
+            chain = chains.get(row)
+
+            if chain == None:
+                chain = chains[row] = [[], [], []]
+
+            rowOf[id] = row
+            position[id] = len(chain[0])
+            chain[0].append(id)
+
+        # Union-find of the chains with path halving, the roots have None as
+        # parent.
+        parent = dict.fromkeys(chains)
+
+        def find(row):
+            while parent[row] != None:
+                if parent[parent[row]] != None:
+                    parent[row] = parent[parent[row]]
+
+                row = parent[row]
+
+            return row
+
+        def union(row1, row2):
+            row1 = find(row1)
+            row2 = find(row2)
+
+            if row1 != row2:
+                parent[row1] = row2
+
+        crossConnections = []
+        crossSs = []
+        foreign = [] # Rows connected to Ids that aren't elements.
+
+        for src, dst in connections:
+            if not src in rowOf or not dst in rowOf:
+                foreign += [rowOf[id] for id in (src, dst) if id in rowOf]
+            elif rowOf[src] == rowOf[dst]:
+                chains[rowOf[src]][1].append((position[src], position[dst]))
+            else:
+                union(rowOf[src], rowOf[dst])
+                crossConnections.append((src, dst))
+
+        for sender, signal, receiver, slot in ss:
+            if not sender in rowOf or not receiver in rowOf:
+                foreign += [rowOf[id] for id in (sender, receiver)
+                            if id in rowOf]
+            elif rowOf[sender] == rowOf[receiver]:
+                chains[rowOf[sender]][2].append((position[sender],
+                                                 signal,
+                                                 position[receiver],
+                                                 slot))
+            else:
+                union(rowOf[sender], rowOf[receiver])
+                crossSs.append((sender, signal, receiver, slot))
+
+        groups = {} # root -> [rows, connections, ss]
+        index = {}  # row -> index of the chain in its group
+
+        for row in chains:
+            rows = groups.setdefault(find(row), [[], [], []])[0]
+            index[row] = len(rows)
+            rows.append(row)
+
+        # The elements of other chains are given as (chain index, position).
+        def place(id):
+            return index[rowOf[id]], position[id]
+
+        for src, dst in crossConnections:
+            groups[find(rowOf[src])][1].append((place(src), place(dst)))
+
+        for sender, signal, receiver, slot in crossSs:
+            groups[find(rowOf[sender])][2].append((place(sender),
+                                                   signal,
+                                                   place(receiver),
+                                                   slot))
+
+        foreign = set(find(row) for row in foreign)
+        structure = []
+
+        for root in groups:
+            rows, gConnections, gSs = groups[root]
+
+            # repr() is a fast canonical form of the elements, the values
+            # that are equal but written in other way only miss the
+            # shortcut.
+            units = [(repr(([instances[id] for id in chains[row][0]],
+                            chains[row][1],
+                            chains[row][2])),
+                      chains[row][0])
+                     for row in rows]
+            key = None
+
+            if not root in foreign:
+                key = (tuple(unit[0] for unit in units),
+                       tuple(gConnections),
+                       tuple(gSs))
+
+            structure.append((key,
+                              [id for unit in units for id in unit[1]],
+                              units))
+
+        return structure
+
+    """ Returns the chain of an element, the row of an 'i,j' Id. """
+    def _chainOf(self, id):
+        if isinstance(id, int):
+            return id >> self._columnBits
+
+        # Ids that aren't 'i,j' are chains of their own.
+        return id[id.find(',') + 1:]
+
+    """
+    Pair the units of two graphs with the same key, preferring the units
+    starting with the same Id. Returns the (ids1, ids2) pairs.
+    """
+    def _pairUnits(self, units1, units2):
+        byKey = {} # key -> {first Id: ids}
+
+        for unit in units1:
+            if unit[0] != None:
+                byKey.setdefault(unit[0], {})[unit[1][0]] = unit[1]
+
+        pairs = []
+        left = []
+
+        for unit in units2:
+            candidates = byKey.get(unit[0])
+
+            if candidates and unit[1][0] in candidates:
+                pairs.append((candidates.pop(unit[1][0]), unit[1]))
+            elif candidates:
+                left.append(unit)
+
+        for unit in left:
+            candidates = byKey[unit[0]]
+
+            if candidates:
+                pairs.append((candidates.pop(next(iter(candidates))), unit[1]))
+
+        return pairs
+
+    """
+    Returns the [id1, id2] Id changes that rename the elements as in
+    'renames', an {id1: id2} dictionary, after the removed elements are
+    gone.
+
+    The renames form chains and cycles, since every Id is given to one
+    element at most. A chain is renamed from its end, where the new Id is
+    free, back to its start, so each element is renamed once. A cycle needs
+    a free Id: its last element is moved to a ghost Id, the rest are renamed
+    backwards, and the ghost gets its final Id, one more change per cycle.
+    """
+    def _planRenames(self, renames):
+        changeId = []
+        done = set()
+
+        for start in renames:
+            if start in done:
+                continue
+
+            # Follow the renames blocked by 'start' until a free Id.
+            path = [start]
+            id = renames[start]
+
+            while id in renames and not id in done and id != start:
+                path.append(id)
+                id = renames[id]
+
+            done.update(path)
+
+            if id == start:
+                ghost = self._ghostId(start)
+                changeId.append([path.pop(), ghost])
+
+            for id1 in reversed(path):
+                changeId.append([id1, renames[id1]])
+
+            if id == start:
+                changeId.append([ghost, start])
+
+        return changeId
+
+    """
+    Compare two revisions of the history and returns the instructions to
+    convert 'revision1' into 'revision2'. Raises ValueError if there is no
+    history, see setHistory().
+    """
+    def revisionDiff(self, revision1, revision2):
+        if self.history == None:
+            raise ValueError('There is no history to diff revisions from')
+
+        graph1 = self.history.graph(revision1)
+        graph2 = self.history.graph(revision2)
+
+        return self._graphDiff(graph1,
+                               graph2,
+                               self._graphStructure(graph1),
+                               self._graphStructure(graph2))
+
+    """
+    Set a revision of the history as the previous pipeline graph, and returns
+    the instructions to convert the current previous graph into it, as
+    pipelineDiff() does. The revision is recorded again as the last one, so
+    rolling back is part of the history too. There is no pipeline for it,
+    so pipelineEdit() starts from an empty pipeline until pipelineDiff() is
+    called. Raises ValueError if there is no history, see setHistory().
+    """
+    def checkoutRevision(self, revision):
+        if self.history == None:
+            raise ValueError('There is no history to check out revisions '
+                             'from')
+
+        ops = self._diffPrevious(self.history.graph(revision))
+        self.editState = None
+
+        return ops
+
+    """
+    Compare two (instances, connections, ss) graphs and returns the
+    instructions to convert 'graph1' into 'graph2'.
+    """
+    def graphDiff(self, graph1, graph2):
+        return self._graphDiff(graph1, graph2, None, None)
+
+    """
+    graphDiff() pairing first the parts of the graphs that didn't change, if
+    their structures are given, see _graphStructure().
+    """
+    def _graphDiff(self, graph1, graph2, structure1, structure2):
+        instances1 = graph1[0]
+        instances2 = graph2[0]
+
+        disconnectSignalsAndSlots = []
+        disconnectElement = []
+        removeElement = []
+        changeId = []
+        setProperties = {}
+        patchProperties = {}
+        resetProperties = {}
+        addElement = {}
+        connectElement = []
+        connectSignalsAndSlots = []
+
+        stats = self.stats
+
+        if stats != None:
+            clock = stats.clock()
+
+        # Pair the groups of chains without changes, their connections and
+        # signals & slots are the same in both graphs.
+        matches = {}
+        paired1 = set()
+        paired2 = set()
+
+        if structure1 != None:
+            for ids1, ids2 in self._pairUnits(structure1, structure2):
+                matches.update(zip(ids1, ids2))
+
+            paired1 = set(matches)
+            paired2 = set(matches.values())
+
+            # Then the chains without changes in the other groups.
+            for ids1, ids2 in \
+                    self._pairUnits([chain for group in structure1
+                                           if not group[1][0] in paired1
+                                           for chain in group[2]],
+                                    [chain for group in structure2
+                                           if not group[1][0] in paired2
+                                           for chain in group[2]]):
+                matches.update(zip(ids1, ids2))
+
+        # Elements without changes in their properties.
+        unchanged = set(matches)
+
+        if stats != None:
+            clock.lap('pairUnchanged')
+            stats.addCount('unchangedElements', len(unchanged))
+
+        if matches == {}:
+            matches = self._matchElements(instances1, instances2)
+        else:
+            matched2 = set(matches.values())
+            matches.update(self._matchElements({id: instances1[id]
+                                                for id in instances1
+                                                if not id in unchanged},
+                                               {id: instances2[id]
+                                                for id in instances2
+                                                if not id in matched2}))
+
+        if stats != None:
+            clock.lap('match')
+            stats.addCount('matches', len(matches))
+
+        renames = {} # id1 -> id2
+
+        for id1 in instances1:
+            # There are no similar elements, remove it from the previous
+            # pipeline.
+            if not id1 in matches:
+                removeElement.append(id1)
+
+                continue
+
+            # Change the Id of the element in pipeline1 by the Id of the
+            # element in pipeline2.
+            id2 = matches[id1]
+
+            if id1 != id2:
+                renames[id1] = id2
+
+            if id1 in unchanged:
+                continue
+
+            # Copy the properties from pipeline2 to the pipeline1.
+            properties1 = instances1[id1][1]
+            properties2 = instances2[id2][1]
+            setProps = {}
+
+            for prop in properties2:
+                if not prop in properties1 or \
+                   properties2[prop] != properties1[prop]:
+                    patches = None
+
+                    if self.deepDiffSize > 0 and prop in properties1:
+                        patches = self._patchValue(properties1[prop],
+                                                   properties2[prop])
+
+                    if patches == None:
+                        setProps[prop] = properties2[prop]
+                    else:
+                        patchProperties.setdefault(id2, {})[prop] = patches
+
+            if setProps != {}:
+                setProperties[id2] = setProps
+
+            resetProps = []
+
+            for prop in properties1:
+                if not prop in properties2:
+                    resetProps.append(prop)
+
+            if resetProps != []:
+                resetProperties[id2] = resetProps
+
+        changeId = self._planRenames(renames)
+        removed = set(removeElement)
+
+        # Add elements in pipeline2 to pipeline1.
+        newIds = {}  # id2 -> id1
+
+        for id1 in matches:
+            newIds[matches[id1]] = id1
+
+        for id2 in instances2:
+            if not id2 in newIds:
+                addElement[id2] = instances2[id2][0]
+
+                if instances2[id2][1] != {}:
+                    setProperties[id2] = instances2[id2][1]
+
+        if stats != None:
+            clock.lap('diffElements')
+
+        # Solve connections. Both graphs are compared by translating the old
+        # Ids into the new ones, a removed or added element maps to None.
+        # Ids that aren't elements are kept as they are.
+        def oldToNew(id):
+            return None if id in removed else matches.get(id, id)
+
+        def newToOld(id):
+            return None if id in addElement else newIds.get(id, id)
+
+        # Only the connections of the groups that changed can change, both
+        # ends of a connection are in the same group.
+        edges1 = dict.fromkeys(tuple(connection)
+                               for connection in graph1[1]
+                               if not connection[0] in paired1)
+        edges2 = dict.fromkeys(tuple(connection)
+                               for connection in graph2[1]
+                               if not connection[0] in paired2)
+
+        for src, dst in edges1:
+            src2 = oldToNew(src)
+            dst2 = oldToNew(dst)
+
+            if src2 == None or dst2 == None or not (src2, dst2) in edges2:
+                disconnectElement.append([src, dst])
+
+        for src, dst in edges2:
+            src1 = newToOld(src)
+            dst1 = newToOld(dst)
+
+            if src1 == None or dst1 == None or not (src1, dst1) in edges1:
+                connectElement.append([src, dst])
+
+        if stats != None:
+            clock.lap('diffConnections')
+
+        # Solve signals & slots.
+        signals1 = dict.fromkeys(tuple(s) for s in graph1[2]
+                                          if not s[0] in paired1)
+        signals2 = dict.fromkeys(tuple(s) for s in graph2[2]
+                                          if not s[0] in paired2)
+
+        for s in signals1:
+            sender = oldToNew(s[0])
+            receiver = oldToNew(s[2])
+
+            if sender == None or receiver == None or \
+               not (sender, s[1], receiver, s[3]) in signals2:
+                disconnectSignalsAndSlots.append(list(s))
+
+        for s in signals2:
+            sender = newToOld(s[0])
+            receiver = newToOld(s[2])
+
+            if sender == None or receiver == None or \
+               not (sender, s[1], receiver, s[3]) in signals1:
+                connectSignalsAndSlots.append(list(s))
+
+        if stats != None:
+            clock.lap('diffSignalsAndSlots')
+
+        ops = []
+
+        for ss in disconnectSignalsAndSlots:
+            ops.append([self.DiffOp.DisconnectSignalsAndSlots, ss])
+
+        for connection in disconnectElement:
+            ops.append([self.DiffOp.DisconnectElement, connection])
+
+        for elementId in removeElement:
+            ops.append([self.DiffOp.RemoveElement, [elementId]])
+
+        for change in changeId:
+            ops.append([self.DiffOp.ChangeId, change])
+
+        for elementId in addElement:
+            ops.append([self.DiffOp.AddElement,
+                        [elementId, addElement[elementId]]])
+
+        for elementId in setProperties:
+            for prop in setProperties[elementId]:
+                value = setProperties[elementId][prop]
+
+                if isinstance(value, LazyValue):
+                    value = value.value()
+
+                ops.append([self.DiffOp.SetProperties,
+                            [elementId, prop, value]])
+
+        for elementId in patchProperties:
+            for prop in patchProperties[elementId]:
+                for patch in patchProperties[elementId][prop]:
+                    ops.append([self.DiffOp.PatchProperty,
+                                [elementId, prop] + patch])
+
+        for elementId in resetProperties:
+            for prop in resetProperties[elementId]:
+                ops.append([self.DiffOp.ResetProperties, [elementId, prop]])
+
+        for connection in connectElement:
+            ops.append([self.DiffOp.ConnectElement, connection])
+
+        for ss in connectSignalsAndSlots:
+            ops.append([self.DiffOp.ConnectSignalsAndSlots, ss])
+
+        if stats != None:
+            clock.lap('emitOps')
+            opNames = {getattr(self.DiffOp, name): name
+                       for name in vars(self.DiffOp)
+                       if not name.startswith('_')}
+
+            for op in ops:
+                stats.addCount('ops.' + opNames[op[0]])
+
+        return ops
+
+    """
+    Compact a list of instructions into groups of instructions of the same
+    kind, that can be applied in bulk. Returns a list of [DiffOp, items]
+    groups, each group applied after the previous one:
+
+    DisconnectSignalsAndSlots  [[sender, signal, receiver, slot], ...]
+    DisconnectElement          [[src, dst], ...]
+    RemoveElement              [id, ...]
+    ChangeId                   [[oldId, newId], ...]
+    AddElement                 [[id, elementName], ...]
+    SetProperties              [[id, {property: value, ...}], ...]
+    PatchProperty              [[id, property, PatchOp, path, value], ...]
+    ResetProperties            [[id, [property, ...]], ...]
+    ConnectElement             [[src, dst], ...]
+    ConnectSignalsAndSlots     [[sender, signal, receiver, slot], ...]
+
+    The Id changes of a group happen all at once, so the chains of renames
+    through ghost Ids are collapsed into a single change per element, and a
+    connection or signal & slot disconnected and connected again between the
+    same elements is kept instead.
+
+    The instructions are compacted in runs in the order pipelineDiff()
+    returns them, a list with several diffs one after the other gives a
+    group sequence for each diff.
+    """
+    def compactDiff(self, ops):
+        groups = []
+        run = []
+
+        for op in ops:
+            if run != [] and \
+               self._diffOrder[op[0]] < self._diffOrder[run[-1][0]]:
+                groups += self._compactRun(run)
+                run = []
+
+            run.append(op)
+
+        if run != []:
+            groups += self._compactRun(run)
+
+        return groups
+
+    """ Compact a list of instructions sorted by kind. """
+    def _compactRun(self, ops):
+        DiffOp = self.DiffOp
+        items = {}
+
+        for op in ops:
+            items.setdefault(op[0], []).append(op[1])
+
+        # Collapse the Id changes, origin -> final Id.
+        origins = {} # current Id -> original Id
+
+        for oldId, newId in items.get(DiffOp.ChangeId, []):
+            origins[newId] = origins.pop(oldId, oldId)
+
+        changeId = {origins[id]: id for id in origins if origins[id] != id}
+        removed = set(id for id, in items.get(DiffOp.RemoveElement, []))
+
+        def final(id):
+            return None if id in removed else changeId.get(id, id)
+
+        # The connections that are restored with the final Ids.
+        for disconnectOp, connectOp, endpoints in \
+                ((DiffOp.DisconnectElement, DiffOp.ConnectElement, (0, 1)),
+                 (DiffOp.DisconnectSignalsAndSlots,
+                  DiffOp.ConnectSignalsAndSlots,
+                  (0, 2))):
+            connects = collections.Counter(tuple(item) for item
+                                           in items.get(connectOp, []))
+            disconnects = []
+
+            for item in items.get(disconnectOp, []):
+                restored = list(item)
+
+                for k in endpoints:
+                    restored[k] = final(item[k])
+
+                restored = tuple(restored)
+
+                if not None in restored and connects[restored] > 0:
+                    connects[restored] -= 1
+                else:
+                    disconnects.append(item)
+
+            items[disconnectOp] = disconnects
+            connected = []
+
+            for item in items.get(connectOp, []):
+                if connects[tuple(item)] > 0:
+                    connects[tuple(item)] -= 1
+                    connected.append(item)
+
+            items[connectOp] = connected
+
+        groups = []
+
+        for op in sorted(items, key=self._diffOrder.get):
+            if op == DiffOp.RemoveElement:
+                group = [item[0] for item in items[op]]
+            elif op == DiffOp.ChangeId:
+                group = [[oldId, changeId[oldId]] for oldId in changeId]
+            elif op == DiffOp.SetProperties:
+                properties = {}
+
+                for id, prop, value in items[op]:
+                    properties.setdefault(id, {})[prop] = value
+
+                group = [[id, properties[id]] for id in properties]
+            elif op == DiffOp.ResetProperties:
+                properties = {}
+
+                for id, prop in items[op]:
+                    properties.setdefault(id, []).append(prop)
+
+                group = [[id, properties[id]] for id in properties]
+            else:
+                group = items[op]
+
+            if group != []:
+                groups.append([op, group])
+
+        return groups
+
+    """
+    Returns the dependencies of each instruction as a list with the indexes
+    of the previous instructions that must be applied before it.
+
+    Adding, removing or renaming an element must wait for, and be waited by,
+    every instruction using its Id, while setting properties and connecting
+    the element only wait for the instructions changing the same property
+    or connection. Besides, the connections of an element wait for the
+    previous signals & slots of the element, and the signals & slots wait
+    for the previous connections.
+    """
+    def diffDependencies(self, ops):
+        writers = {} # key -> index of the last instruction changing it
+        readers = {} # key -> indexes of the instructions using it since then
+        dependencies = []
+
+        for k, op in enumerate(ops):
+            reads, writes, after = self._opKeys(op)
+            depends = set()
+
+            for key in itertools.chain(reads, writes, after):
+                if key in writers:
+                    depends.add(writers[key])
+
+            for key in itertools.chain(writes, after):
+                depends.update(readers.get(key, []))
+
+            for key in writes:
+                writers[key] = k
+                readers[key] = []
+
+            for key in reads:
+                readers.setdefault(key, []).append(k)
+
+            dependencies.append(sorted(depends))
+
+        return dependencies
+
+    """
+    Returns the keys used by an instruction as (reads, writes, after), after
+    are the keys the instruction must wait for without using them.
+    """
+    def _opKeys(self, op):
+        DiffOp = self.DiffOp
+        kind, args = op
+
+        if kind == DiffOp.DisconnectElement or kind == DiffOp.ConnectElement:
+            src, dst = args
+
+            return [src, dst, ('links', src), ('links', dst)], \
+                   [('connection', src, dst)], \
+                   [('signals', src), ('signals', dst)]
+        elif kind == DiffOp.DisconnectSignalsAndSlots or \
+             kind == DiffOp.ConnectSignalsAndSlots:
+            sender, receiver = args[0], args[2]
+
+            return [sender,
+                    receiver,
+                    ('signals', sender),
+                    ('signals', receiver)], \
+                   [('ss',) + tuple(args)], \
+                   [('links', sender), ('links', receiver)]
+        elif kind == DiffOp.SetProperties or \
+             kind == DiffOp.PatchProperty or \
+             kind == DiffOp.ResetProperties:
+            return [args[0]], [('property', args[0], args[1])], []
+        elif kind == DiffOp.ChangeId:
+            return [], [args[0], args[1]], []
+
+        # AddElement and RemoveElement
+        return [], [args[0]], []
+
+    """
+    Split the instructions in waves: every instruction in a wave only
+    depends on instructions of the previous waves, so the instructions of a
+    wave can be applied in any order or at the same time, one wave after the
+    other.
+    """
+    def diffWaves(self, ops):
+        levels = []
+        waves = []
+
+        for k, dependencies in enumerate(self.diffDependencies(ops)):
+            level = max([levels[d] + 1 for d in dependencies], default=0)
+            levels.append(level)
+
+            if level == len(waves):
+                waves.append([])
+
+            waves[level].append(ops[k])
+
+        return waves
+
+    """
+    Apply the instructions calling apply(op), the instructions of each wave
+    run in a pool of 'workers' threads. The first exception raised by apply
+    stops before the next wave and is raised again.
+    """
+    def applyWaves(self, ops, apply, workers=None):
+        waves = self.diffWaves(ops)
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for wave in waves:
+                for future in [executor.submit(apply, op) for op in wave]:
+                    future.result()
+
+    """
+    Same as applyWaves() with a coroutine function, the instructions of each
+    wave are awaited at the same time. If one of them fails, the rest of the
+    wave is cancelled and awaited before raising the exception again.
+    """
+    async def applyWavesAsync(self, ops, apply):
+        for wave in self.diffWaves(ops):
+            tasks = [asyncio.ensure_future(apply(op)) for op in wave]
+
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+                raise
+
+
+""" Element of a graph with compact Ids, see PipelineParser.setCompactIds() """
+class PipelineElement(collections.namedtuple('PipelineElement',
+                                             ['elementName', 'properties'])):
+    __slots__ = ()
+
+
+"""
+Property value decoded on first use, see PipelineParser.setLazyValues().
+The decoded value must not be modified, it would not match the text anymore.
+"""
+class LazyValue:
+    __slots__ = ('raw', '_value')
+
+    # Value of the values not decoded yet.
+    _notDecoded = object()
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._value = self._notDecoded
+
+    """ Returns the decoded value. """
+    def value(self):
+        if self._value is self._notDecoded:
+            self._value = _valueParser.parseValue(self.raw)
+
+        return self._value
+
+    """ Equal values written the same way are not decoded. """
+    def __eq__(self, other):
+        if isinstance(other, LazyValue):
+            if self.raw == other.raw:
+                return True
+
+            other = other.value()
+
+        return self.value() == other
+
+    def __hash__(self):
+        return hash(self.value())
+
+    def __repr__(self):
+        return 'LazyValue({0!r})'.format(self.raw)
+
+    # The decoded value isn't copied nor pickled.
+    def __reduce__(self):
+        return LazyValue, (self.raw,)
+
+
+""" Property value with placeholders in a compiled template """
+class _TemplateValue(str):
+    def __new__(cls, value, raw):
+        # Placeholders in objectName must give the same string as in the
+        # references.
+        self = str.__new__(cls, value if isinstance(value, str) else raw)
+        self.raw = raw
+
+        return self
+
+
+""" Pipeline compiled by PipelineParser.compileTemplate() """
+class PipelineTemplate:
+    def __init__(self, parser, graph, markers):
+        self.parser = parser
+        self.markers = markers # marker -> placeholder name
+        self.markerRe = re.compile('|'.join(re.escape(marker)
+                                            for marker in markers)
+                                   or '(?!)')
+        instances, self.connections, self.ss = graph
+        self.instances = {}
+        self.slots = [] # [id, property, raw value, placeholder name or None]
+
+        for id in instances:
+            properties = instances[id][1]
+
+            for key in properties:
+                value = properties[key]
+
+                if isinstance(value, _TemplateValue):
+                    self.slots.append([id,
+                                       key,
+                                       value.raw,
+                                       markers.get(value.raw)])
+                    properties[key] = str(value)
+
+            self.instances[id] = instances[id]
+
+    """ Returns the names of the placeholders. """
+    def placeholders(self):
+        return set(self.markers.values())
+
+    """
+    Returns the (instances, connections, ss) graph with the placeholders
+    replaced by 'values', a {name: value} dictionary. The values are
+    inserted in the property value text and parsed, except if a placeholder
+    is a whole property value and its value isn't a string, then it's used
+    as is.
+
+    The instances are a read only view of the template elements with the
+    elements with placeholders replaced, so instantiating only costs the
+    placeholders. The rest of the graph is shared by all the instances of
+    the template and must not be modified, use PipelineParser.copyGraph() to
+    get a private copy.
+    """
+    def instantiate(self, values):
+        parseValue = self.parser.parseValue
+        instances = self.instances
+        replaced = {}
+
+        def substitute(match):
+            return str(values[self.markers[match.group(0)]])
+
+        for id, key, raw, name in self.slots:
+            if not id in replaced:
+                elementName, properties = instances[id]
+
+                if isinstance(instances[id], PipelineElement):
+                    replaced[id] = PipelineElement(elementName,
+                                                   dict(properties))
+                else:
+                    replaced[id] = [elementName, dict(properties)]
+
+            if name != None and not isinstance(values[name], str):
+                value = values[name]
+            else:
+                value = parseValue(self.markerRe.sub(substitute, raw))
+
+            replaced[id][1][key] = value
+
+        return _InstancesView(instances, replaced), self.connections, self.ss
+
+
+"""
+Read only {id: element} view of the elements of a template, with the
+elements in 'replaced' taking the place of the ones with the same Id.
+"""
+class _InstancesView(collections.abc.Mapping):
+    __slots__ = ('instances', 'replaced')
+
+    def __init__(self, instances, replaced):
+        self.instances = instances
+        self.replaced = replaced
+
+    def __getitem__(self, id):
+        if id in self.replaced:
+            return self.replaced[id]
+
+        return self.instances[id]
+
+    def __contains__(self, id):
+        return id in self.instances
+
+    def __iter__(self):
+        return iter(self.instances)
+
+    def __len__(self):
+        return len(self.instances)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+"""
+Revisions of a pipeline graph, see PipelineParser.setHistory(). The unchanged
+elements, connections and signals & slots are shared by all the revisions, so
+each new revision only takes the memory of what changed.
+"""
+class PipelineHistory:
+    # The elements, connections and signals & slots of each revision are kept
+    # in trees of tuples. A leaf ends after an item with the lower bits of the
+    # hash of its key set to 0, so the leaves depend only on the items in them
+    # and the leaves without changes are the same tuples in every revision.
+    # The upper levels are split the same way, with the next bits of the hash
+    # of the first key of each node.
+    _nodeBits = 4
+    _maxNodeSize = 64
+
+    """
+    maxRevisions: number of revisions kept, the oldest ones are dropped.
+                  0 keeps all of them.
+    """
+    def __init__(self, maxRevisions=0):
+        self.maxRevisions = maxRevisions
+        self.first = 0  # Number of the oldest revision kept.
+        self.roots = [] # (instances, connections, ss) trees of each revision.
+
+    """ Returns the numbers of the revisions kept. """
+    def revisions(self):
+        return range(self.first, self.first + len(self.roots))
+
+    """
+    Add an (instances, connections, ss) graph as a new revision and returns
+    its number. The elements are kept as they are, not copied, so the graph
+    must not be modified after committing it, commit a
+    PipelineParser.copyGraph() copy otherwise.
+    """
+    def commit(self, graph):
+        instances, connections, ss = graph
+
+        if self.roots == []:
+            previous = ((0, ()), (0, ()), (0, ()))
+        else:
+            previous = self.roots[-1]
+
+        self.roots.append((self._update(previous[0],
+                                        [(id, instances[id])
+                                         for id in instances],
+                                        True),
+                           self._update(previous[1],
+                                        [tuple(connection)
+                                         for connection in connections],
+                                        False),
+                           self._update(previous[2],
+                                        [tuple(s) for s in ss],
+                                        False)))
+
+        while self.maxRevisions > 0 and len(self.roots) > self.maxRevisions:
+            del self.roots[0]
+            self.first += 1
+
+        return self.first + len(self.roots) - 1
+
+    """
+    Returns the (instances, connections, ss) graph of a revision. The
+    dictionary and the lists are new, but the elements are shared with the
+    other revisions and must not be modified, use PipelineParser.copyGraph()
+    to get a private copy.
+    """
+    def graph(self, revision):
+        if not revision in self.revisions():
+            raise IndexError('There is no revision {0}'.format(revision))
+
+        instances, connections, ss = self.roots[revision - self.first]
+
+        return dict(self._items(instances)), \
+               [list(connection) for connection in self._items(connections)], \
+               [list(s) for s in self._items(ss)]
+
+    """ Returns the items in the leaves of a (height, node) tree. """
+    def _items(self, tree):
+        height, node = tree
+        nodes = [node]
+
+        for i in range(height):
+            nodes = [child for node in nodes for child in node]
+
+        return [item for node in nodes for item in node]
+
+    """
+    Returns the (height, node) tree of 'items', reusing the nodes of the
+    'previous' tree that didn't change. The items are (id, element) tuples
+    keyed by the Id if 'keyed' is True, otherwise the items are their own
+    keys.
+    """
+    def _update(self, previous, items, keyed):
+        if items == []:
+            return 0, ()
+
+        # Nodes of the previous tree by their height and first key.
+        nodes = {}
+        self._indexNodes(previous[1], previous[0], keyed, nodes)
+
+        mask = (1 << self._nodeBits) - 1
+        keys = [item[0] for item in items] if keyed else items
+        height = 0
+
+        while True:
+            shift = height * self._nodeBits
+            level = []
+            levelKeys = []
+            start = 0
+
+            for k, key in enumerate(keys):
+                if (hash((key,)) >> shift) & mask != 0 and \
+                   k + 1 - start < self._maxNodeSize and \
+                   k + 1 < len(keys):
+                    continue
+
+                node = tuple(items[start: k + 1])
+                old = nodes.get((height, keys[start]))
+
+                if old != None:
+                    if height > 0:
+                        if len(old) == len(node) and \
+                           all(a is b for a, b in zip(old, node)):
+                            node = old
+                    elif old == node:
+                        node = old
+                    elif keyed:
+                        # Keep the unchanged elements of the leaf.
+                        oldItems = {item[0]: item for item in old}
+                        node = tuple(oldItems[item[0]]
+                                     if item[0] in oldItems and
+                                        oldItems[item[0]] == item
+                                     else item
+                                     for item in node)
+
+                level.append(node)
+                levelKeys.append(keys[start])
+                start = k + 1
+
+            if len(level) == 1:
+                return height, level[0]
+
+            items = level
+            keys = levelKeys
+            height += 1
+
+    """
+    Add the nodes of a tree to 'nodes' by their (height, first key), and
+    returns the first key of 'node'.
+    """
+    def _indexNodes(self, node, height, keyed, nodes):
+        if node == ():
+            return None
+
+        if height == 0:
+            key = node[0][0] if keyed else node[0]
+        else:
+            key = self._indexNodes(node[0], height - 1, keyed, nodes)
+
+            for child in node[1:]:
+                self._indexNodes(child, height - 1, keyed, nodes)
+
+        nodes[(height, key)] = node
+
+        return key
+
+
+"""
+Pipeline graph indexed by element. The queries take a time proportional to
+the size of their results, not to the size of the graph.
+"""
+class PipelineGraph:
+    """
+    Build the graph from the lists returned by PipelineParser.parsePipeline().
+    The instances dictionary is used as is, not copied.
+
+    The elements are indexed by elementName and objectName when they are
+    added, change them with addElement() to keep the indexes right. If
+    'indexElements' is False these indexes are not kept, and
+    elementsOfType() and elementByObjectName() can't be used.
+    """
+    def __init__(self,
+                 instances=None,
+                 connections=[],
+                 ss=[],
+                 indexElements=True):
+        self.instances = {} if instances == None else instances # Nodes
+        self.edges = {}   # (src, dst) -> None, in insertion order.
+        self.inputs = {}  # dst -> {src: None}
+        self.outputs = {} # src -> {dst: None}
+        self.ss = {}      # (sender, signal, receiver, slot) -> None
+        self.sentSs = {}  # sender -> {(sender, signal, receiver, slot): None}
+        self.receivedSs = {} # receiver -> {(sender, ...): None}
+        self.types = {} if indexElements else None # elementName -> {id: None}
+        self.names = {} if indexElements else None # objectName -> id
+
+        types = self.types
+
+        for id in self.instances:
+            self.inputs[id] = {}
+            self.outputs[id] = {}
+
+            if types == None:
+                continue
+
+            elementName, properties = self.instances[id]
+
+            if elementName in types:
+                types[elementName][id] = None
+            else:
+                types[elementName] = {id: None}
+
+            if 'objectName' in properties:
+                objectName = properties['objectName']
+
+                if isinstance(objectName, str):
+                    self.names[objectName] = id
+
+        for connection in connections:
+            self.connect(connection[0], connection[1])
+
+        for s in ss:
+            self.connectSignalsAndSlots(s[0], s[1], s[2], s[3])
+
+    """ Add a new element to the graph, or replace an existing one. """
+    def addElement(self, id, elementName, properties=None):
+        if id in self.instances:
+            self._unindexElement(id)
+
+        self.instances[id] = [elementName, {} if properties == None
+                                              else properties]
+        self.inputs.setdefault(id, {})
+        self.outputs.setdefault(id, {})
+        self._indexElement(id)
+
+    """ Add an element to the elementName and objectName indexes. """
+    def _indexElement(self, id):
+        if self.types == None:
+            return
+
+        elementName, properties = self.instances[id]
+        self.types.setdefault(elementName, {})[id] = None
+
+        objectName = properties.get('objectName')
+
+        if isinstance(objectName, str):
+            self.names[objectName] = id
+
+    """ Remove an element from the elementName and objectName indexes. """
+    def _unindexElement(self, id):
+        if self.types == None:
+            return
+
+        elementName, properties = self.instances[id]
+        ids = self.types[elementName]
+        del ids[id]
+
+        if ids == {}:
+            del self.types[elementName]
+
+        objectName = properties.get('objectName')
+
+        if isinstance(objectName, str) and self.names.get(objectName) == id:
+            del self.names[objectName]
+
+    """
+    Remove an element with all of it's connections and signals & slots.
+    Returns the elements that were connected to it as (inputs, outputs).
+    """
+    def removeElement(self, id):
+        self._unindexElement(id)
+        del self.instances[id]
+        inputs = list(self.inputs.pop(id, {}))
+        outputs = list(self.outputs.pop(id, {}))
+
+        for src in inputs:
+            del self.edges[(src, id)]
+
+            if src != id:
+                del self.outputs[src][id]
+
+        for dst in outputs:
+            if dst != id:
+                del self.edges[(id, dst)]
+                del self.inputs[dst][id]
+
+        for s in list(self.sentSs.pop(id, {})) + \
+                 list(self.receivedSs.pop(id, {})):
+            if s in self.ss:
+                self.disconnectSignalsAndSlots(*s)
+
+        return [src for src in inputs if src != id], \
+               [dst for dst in outputs if dst != id]
+
+    """
+    Remove a set of elements. If 'reroute' is True, each remaining element
+    connected to a removed one is connected to every remaining element that
+    could be reached from it going only through removed elements.
+
+    All the removed elements are contracted at once: the runs of connected
+    removed elements are found as strongly connected components, and their
+    reachable outputs are shared along chains, so the cost is linear in the
+    size of the graph plus the number of new connections.
+    """
+    def removeElements(self, ids, reroute=False):
+        if not reroute:
+            for id in ids:
+                self.removeElement(id)
+
+            return
+
+        newEdges = dict.fromkeys(self.reroutedEdges(ids))
+
+        for id in ids:
+            self.removeElement(id)
+
+        for src, dst in newEdges:
+            self.connect(src, dst)
+
+    """
+    Returns the connections removeElements(ids, True) would add, without
+    removing anything, as a list with a (src, dst) pair for each removed
+    element connected from src. A connection reached from src through
+    several removed elements is repeated once for each of them.
+    """
+    def reroutedEdges(self, ids):
+        removed = set(ids)
+        outputs = self.outputs
+
+        # Find the strongly connected components of the removed elements,
+        # Tarjan's algorithm emits them in reverse topological order.
+        index = {}
+        lowLink = {}
+        stack = []
+        onStack = set()
+        components = []
+        componentOf = {}
+
+        for root in ids:
+            if root in index:
+                continue
+
+            index[root] = lowLink[root] = len(index)
+            stack.append(root)
+            onStack.add(root)
+            work = [(root, iter(outputs.get(root, {})))]
+
+            while work != []:
+                node, it = work[-1]
+
+                for nxt in it:
+                    if not nxt in removed:
+                        continue
+
+                    if not nxt in index:
+                        index[nxt] = lowLink[nxt] = len(index)
+                        stack.append(nxt)
+                        onStack.add(nxt)
+                        work.append((nxt, iter(outputs.get(nxt, {}))))
+
+                        break
+                    elif nxt in onStack and index[nxt] < lowLink[node]:
+                        lowLink[node] = index[nxt]
+                else:
+                    work.pop()
+
+                    if work != [] and lowLink[node] < lowLink[work[-1][0]]:
+                        lowLink[work[-1][0]] = lowLink[node]
+
+                    if lowLink[node] == index[node]:
+                        component = []
+
+                        while True:
+                            element = stack.pop()
+                            onStack.discard(element)
+                            componentOf[element] = len(components)
+                            component.append(element)
+
+                            if element == node:
+                                break
+
+                        components.append(component)
+
+        # Remaining elements reachable from each component.
+        reachable = []
+
+        for c, component in enumerate(components):
+            direct = {}
+            nextComponents = {}
+
+            for element in component:
+                for dst in outputs.get(element, {}):
+                    if not dst in removed:
+                        direct[dst] = None
+                    elif componentOf[dst] != c:
+                        nextComponents[componentOf[dst]] = None
+
+            # A plain chain shares the reachable set of the next link.
+            if direct == {} and len(nextComponents) == 1:
+                reachable.append(reachable[next(iter(nextComponents))])
+            else:
+                for nxt in nextComponents:
+                    direct.update(reachable[nxt])
+
+                reachable.append(direct)
+
+        newEdges = []
+
+        for element in ids:
+            dsts = reachable[componentOf[element]]
+
+            for src in self.inputs.get(element, {}):
+                if not src in removed:
+                    newEdges += [(src, dst) for dst in dsts if dst != src]
+
+        return newEdges
+
+    """ Connect two elements. Connecting them twice has no effect. """
+    def connect(self, src, dst):
+        edge = (src, dst)
+
+        if edge in self.edges:
+            return
+
+        self.edges[edge] = None
+        self.outputs.setdefault(src, {})[dst] = None
+        self.inputs.setdefault(dst, {})[src] = None
+
+    """ Disconnect two elements. """
+    def disconnect(self, src, dst):
+        del self.edges[(src, dst)]
+        del self.outputs[src][dst]
+        del self.inputs[dst][src]
+
+    """ Connect a signal with a slot. """
+    def connectSignalsAndSlots(self, sender, signal, receiver, slot):
+        s = (sender, signal, receiver, slot)
+
+        if s in self.ss:
+            return
+
+        self.ss[s] = None
+        self.sentSs.setdefault(sender, {})[s] = None
+        self.receivedSs.setdefault(receiver, {})[s] = None
+
+    """ Disconnect a signal from a slot. """
+    def disconnectSignalsAndSlots(self, sender, signal, receiver, slot):
+        s = (sender, signal, receiver, slot)
+        del self.ss[s]
+
+        if sender in self.sentSs:
+            self.sentSs[sender].pop(s, None)
+
+        if receiver in self.receivedSs:
+            self.receivedSs[receiver].pop(s, None)
+
+    """ Returns the Ids of the elements connected after 'id'. """
+    def successors(self, id):
+        return list(self.outputs.get(id, {}))
+
+    """ Returns the Ids of the elements connected before 'id'. """
+    def predecessors(self, id):
+        return list(self.inputs.get(id, {}))
+
+    """
+    Returns the (sender, signal, receiver, slot) signals & slots sent by
+    'id'.
+    """
+    def sentSignals(self, id):
+        return list(self.sentSs.get(id, {}))
+
+    """
+    Returns the (sender, signal, receiver, slot) signals & slots received
+    by 'id'.
+    """
+    def receivedSignals(self, id):
+        return list(self.receivedSs.get(id, {}))
+
+    """ Returns the Ids of the elements of type 'elementName'. """
+    def elementsOfType(self, elementName):
+        return list(self.types.get(elementName, {}))
+
+    """ Returns the Id of the element with 'objectName', or None. """
+    def elementByObjectName(self, objectName):
+        return self.names.get(objectName)
+
+    """
+    Returns the Ids of the elements that can be reached from 'id' following
+    the connections, nearest first. 'id' is included only if it's in a
+    loop.
+    """
+    def downstream(self, id):
+        return self._reachable(id, self.outputs)
+
+    """
+    Returns the Ids of the elements that can reach 'id' following the
+    connections, nearest first. 'id' is included only if it's in a loop.
+    """
+    def upstream(self, id):
+        return self._reachable(id, self.inputs)
+
+    """ Breadth first search from 'id' through the 'links' index. """
+    def _reachable(self, id, links):
+        found = {}
+        queue = collections.deque([id])
+
+        while queue:
+            for nxt in links.get(queue.popleft(), {}):
+                if not nxt in found:
+                    found[nxt] = None
+                    queue.append(nxt)
+
+        return list(found)
+
+    """ Returns the graph as (instances, connections, ss) lists. """
+    def toLists(self):
+        return self.instances, \
+               [list(edge) for edge in self.edges], \
+               [list(s) for s in self.ss]
+
+
+"""
+Connections of a pipeline graph as NumPy arrays in compressed sparse row
+format, with vectorized graph algorithms over them. The nodes are numbered
+in the order of the elements in the graph, followed by the Ids in the
+connections that aren't elements. Signals & slots are not included.
+"""
+class PipelineArrays:
+    # Levels with fewer nodes are walked in Python, the NumPy calls cost more
+    # than the nodes.
+    _minVectorSize = 64
+
+    """
+    Build the arrays from an (instances, connections, ss) graph. NumPy is
+    needed, ImportError is raised if it's not installed.
+    """
+    def __init__(self, graph):
+        if numpy == None:
+            raise ImportError('PipelineArrays requires NumPy')
+
+        instances, connections = graph[0], graph[1]
+        self.ids = list(instances)     # Node -> Id
+        self.index = {id: i for i, id in enumerate(self.ids)} # Id -> node
+
+        for connection in connections:
+            for id in connection:
+                if not id in self.index:
+                    self.index[id] = len(self.ids)
+                    self.ids.append(id)
+
+        n = len(self.ids)
+        index = self.index
+        sources = numpy.array([index[connection[0]]
+                               for connection in connections],
+                              dtype=numpy.int64)
+        targets = numpy.array([index[connection[1]]
+                               for connection in connections],
+                              dtype=numpy.int64)
+
+        # Keep only the first of the repeated connections.
+        first = numpy.unique(sources * n + targets, return_index=True)[1]
+        first.sort()
+        self.sources = sources[first] # Source node of each connection.
+        self.targets = targets[first] # Target node of each connection.
+
+        # The outputs of node i are indices[indptr[i]: indptr[i + 1]], and
+        # its inputs are rindices[rindptr[i]: rindptr[i + 1]].
+        self.indptr, self.indices = self._csr(self.sources, self.targets)
+        self.rindptr, self.rindices = self._csr(self.targets, self.sources)
+        self._lists = {} # reverse -> (indptr, indices) as lists
+
+    """ Returns the (indptr, indices) arrays of the edges from 'a' to 'b'. """
+    def _csr(self, a, b):
+        indptr = numpy.zeros(len(self.ids) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(a, minlength=len(self.ids)),
+                     out=indptr[1:])
+
+        return indptr, b[numpy.argsort(a, kind='stable')]
+
+    """ Returns the nodes of a list of Ids as an array. """
+    def nodes(self, ids):
+        return numpy.array([self.index[id] for id in ids],
+                           dtype=numpy.int64)
+
+    """ Returns the Ids of an array of nodes as a list. """
+    def idsOf(self, nodes):
+        return [self.ids[node] for node in nodes.tolist()]
+
+    """
+    Returns the targets of all the edges going out of 'nodes', one for each
+    edge, given the (indptr, indices) arrays of the edges. O(len(nodes) +
+    number of edges found).
+    """
+    def _neighbours(self, nodes, indptr, indices):
+        starts = indptr[nodes]
+        counts = indptr[nodes + 1] - starts
+        ends = numpy.cumsum(counts)
+
+        if len(ends) == 0 or ends[-1] == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        # Position of each edge in 'indices': the start of its node plus its
+        # position in the output minus the output position of its node.
+        return indices[numpy.repeat(starts - ends + counts, counts) +
+                       numpy.arange(ends[-1])]
+
+    """
+    Returns the (indptr, indices) arrays of the outputs, or of the inputs if
+    'reverse' is True, and the same arrays as lists, built on the first
+    call. The lists are faster than the arrays to read one item at a time.
+    """
+    def _adjacency(self, reverse):
+        if reverse:
+            arrays = self.rindptr, self.rindices
+        else:
+            arrays = self.indptr, self.indices
+
+        if not reverse in self._lists:
+            self._lists[reverse] = (arrays[0].tolist(), arrays[1].tolist())
+
+        return arrays + self._lists[reverse]
+
+    """
+    Remove the nodes without incoming edges level by level, following the
+    outputs, or the inputs if 'reverse' is True, and returns the removed
+    nodes in that order, each level in increasing order. 'indegree' is
+    modified.
+
+    O(n + m log m): the small levels are walked in Python, the big ones with
+    NumPy, where each level costs a sort of its edges.
+    """
+    def _peel(self, indegree, reverse):
+        indptr, indices, ptr, idx = self._adjacency(reverse)
+        frontier = numpy.flatnonzero(indegree == 0)
+        levels = []
+        walked = [] # Nodes of the levels walked in Python.
+
+        while len(frontier) > 0:
+            if len(frontier) >= self._minVectorSize:
+                levels.append(frontier)
+                nodes, counts = numpy.unique(self._neighbours(frontier,
+                                                              indptr,
+                                                              indices),
+                                             return_counts=True)
+                indegree[nodes] -= counts
+                frontier = nodes[indegree[nodes] == 0]
+
+                continue
+
+            level = frontier.tolist()
+
+            # Walk in Python until a level is big enough for NumPy.
+            while level != [] and len(level) < self._minVectorSize:
+                walked += level
+                found = []
+
+                for node in level:
+                    for k in range(ptr[node], ptr[node + 1]):
+                        target = idx[k]
+                        degree = indegree[target] - 1
+                        indegree[target] = degree
+
+                        if degree == 0:
+                            found.append(target)
+
+                found.sort()
+                level = found
+
+            levels.append(numpy.array(walked, dtype=numpy.int64))
+            walked = []
+            frontier = numpy.array(level, dtype=numpy.int64)
+
+        if levels == []:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        return numpy.concatenate(levels)
+
+    """
+    Returns the nodes in topological order, every node before the nodes
+    connected after it. If 'reverse' is True the sinks come before the
+    sources, the order to start the elements of a pipeline. The nodes in a
+    cycle or after one are left out. O(n + m log m), see _peel().
+    """
+    def topologicalOrder(self, reverse=False):
+        order = self._peel(numpy.bincount(self.targets,
+                                          minlength=len(self.ids)),
+                           False)
+
+        return order[::-1] if reverse else order
+
+    """ Returns True if the connections have cycles. O(n + m log m). """
+    def hasCycles(self):
+        return len(self.topologicalOrder()) < len(self.ids)
+
+    """
+    Returns the nodes that are in a cycle, or in a path between two
+    cycles. O(n + m log m), a peel in each direction.
+    """
+    def cycleNodes(self):
+        n = len(self.ids)
+        left = numpy.ones(n, dtype=bool)
+        left[self.topologicalOrder()] = False
+        left[self._peel(numpy.bincount(self.sources, minlength=n),
+                        True)] = False
+
+        return numpy.flatnonzero(left)
+
+    """
+    Returns the connected component of each node, ignoring the direction of
+    the connections, as the smallest node in the component.
+
+    Shiloach-Vishkin: each round hooks the root of the larger label of every
+    edge to the smaller label, then jumps the pointers until every node
+    points to its root. O((n + m) log n): every tree hooks or gets a smaller
+    neighbour within two rounds, so there are O(log n) rounds, each one
+    with O(log n) jumps at most.
+    """
+    def components(self):
+        labels = numpy.arange(len(self.ids))
+        sources, targets = self.sources, self.targets
+
+        while True:
+            low = numpy.minimum(labels[sources], labels[targets])
+            high = numpy.maximum(labels[sources], labels[targets])
+            hook = low < high
+
+            if not hook.any():
+                return labels
+
+            # The edges inside a tree stay inside it.
+            sources, targets = sources[hook], targets[hook]
+
+            # Every label is a root, so this only hooks roots.
+            numpy.minimum.at(labels, high[hook], low[hook])
+
+            while True:
+                parents = labels[labels]
+
+                if numpy.array_equal(parents, labels):
+                    break
+
+                labels = parents
+
+    """
+    Returns the nodes that can be reached from 'nodes' following the
+    connections, or that can reach them if 'reverse' is True, in increasing
+    order. The given nodes are included only if they are reached from
+    another one.
+
+    O(n + m log m) like _peel(), O(n + m) if no level of the search reaches
+    enough nodes to use NumPy.
+    """
+    def reachable(self, nodes, reverse=False):
+        indptr, indices, ptr, idx = self._adjacency(reverse)
+        reached = numpy.zeros(len(self.ids), dtype=bool)
+        frontier = numpy.unique(numpy.asarray(nodes, dtype=numpy.int64))
+
+        while len(frontier) > 0:
+            if len(frontier) >= self._minVectorSize:
+                found = self._neighbours(frontier, indptr, indices)
+                frontier = numpy.unique(found[~reached[found]])
+                reached[frontier] = True
+
+                continue
+
+            level = frontier.tolist()
+
+            # Walk in Python until a level is big enough for NumPy.
+            while level != [] and len(level) < self._minVectorSize:
+                found = []
+
+                for node in level:
+                    for k in range(ptr[node], ptr[node + 1]):
+                        target = idx[k]
+
+                        if not reached[target]:
+                            reached[target] = True
+                            found.append(target)
+
+                level = found
+
+            frontier = numpy.array(level, dtype=numpy.int64)
+
+        return numpy.flatnonzero(reached)
+
+
+""" Timings and counters of a PipelineParser """
+class PipelineStats:
+    """
+    'callback' is called as callback(kind, name, value) for every time and
+    count added, kind is 'time' or 'count', to forward them to a metrics
+    system.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.times = {}  # phase -> seconds
+        self.counts = {} # name -> count
+
+    """ Add 'seconds' to the time spent in 'phase'. """
+    def addTime(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+        if self.callback != None:
+            self.callback('time', phase, seconds)
+
+    """ Add 'count' to the counter 'name'. """
+    def addCount(self, name, count=1):
+        self.counts[name] = self.counts.get(name, 0) + count
+
+        if self.callback != None:
+            self.callback('count', name, count)
+
+    """
+    Returns a clock that adds the time since it was created, or since the
+    last lap, to a phase on each lap(phase) call.
+    """
+    def clock(self):
+        return _StatsClock(self)
+
+    """ Discard all the times and counts. """
+    def reset(self):
+        self.times.clear()
+        self.counts.clear()
+
+
+""" Clock of PipelineStats.clock() """
+class _StatsClock:
+    def __init__(self, stats):
+        self.stats = stats
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.stats.addTime(phase, now - self.last)
+        self.last = now
+
+
+# Parser decoding the LazyValue objects.
+_valueParser = PipelineParser()
+
+# Parser of each worker process in PipelineParser.parseMany() and
+# PipelineParser.diffMany().
+_workerParser = None
+
+""" Configure the parser of a worker process. """
+def _initWorker(pipelineRoutingMode,
+                availableElementTypes,
+                parseCacheSize,
+                compactIds,
+                lazyValues,
+                deepDiffSize):
+    global _workerParser
+
+    _workerParser = PipelineParser()
+    _workerParser.setPipelineRoutingMode(pipelineRoutingMode)
+    _workerParser.setAvailableElementsTypes(availableElementTypes)
+    _workerParser.setParseCacheSize(parseCacheSize)
+    _workerParser.setCompactIds(compactIds)
+    _workerParser.setLazyValues(lazyValues)
+    _workerParser.setDeepDiff(deepDiffSize)
+
+""" Parse a pipeline in a worker process. """
+def _parseWorker(pipeline):
+    return _workerParser.parsePipeline(pipeline)
+
+""" Compare a (pipeline1, pipeline2) pair in a worker process. """
+def _diffWorker(pair):
+    return _workerParser.graphDiff(_workerParser.parsePipeline(pair[0]),
+                                   _workerParser.parsePipeline(pair[1]))
 
 
 if __name__ == '__main__':
@@ -691,6 +4605,8 @@ if __name__ == '__main__':
             opName = 'AddElement'
         elif op[0] == PipelineParser.DiffOp.SetProperties:
             opName = 'SetProperties'
+        elif op[0] == PipelineParser.DiffOp.PatchProperty:
+            opName = 'PatchProperty'
         elif op[0] == PipelineParser.DiffOp.ResetProperties:
             opName = 'ResetProperties'
         elif op[0] == PipelineParser.DiffOp.ConnectElement:
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import unittest
+
+from benchmarks import PipelineGenerator
+from pipelineparser import PipelineArrays, PipelineGraph, PipelineParser
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+"""
+Compare the arrays of synthetic pipelines with the indexed graph, walking
+the levels in Python and with NumPy.
+"""
+@unittest.skipUnless(numpy, 'NumPy is not installed')
+class PipelineArraysTest(unittest.TestCase):
+    pipelines = ['',
+                 'element1 element2',
+                 'element1 objectName=a ! element2 ! element3 ! a.',
+                 'element1 objectName=a ! element2 objectName=b ! a. '
+                 'b. ! element3 ! element4 element5 ! b.']
+
+    """
+    Yields (graph, arrays) pairs, with the levels walked in Python and with
+    NumPy.
+    """
+    def graphs(self):
+        parser = PipelineParser()
+        pipelines = list(self.pipelines)
+
+        for seed in range(4):
+            generator = PipelineGenerator(seed,
+                                          elements=300,
+                                          chainLength=4,
+                                          referenceDensity=0.3,
+                                          elementTypes=10)
+            pipelines.append(generator.pipeline())
+
+        for pipeline in pipelines:
+            graph = parser.parsePipeline(pipeline)
+
+            for minVectorSize in [PipelineArrays._minVectorSize, 1]:
+                arrays = PipelineArrays(graph)
+                arrays._minVectorSize = minVectorSize
+
+                yield pipeline, graph, arrays
+
+    """ Returns the set of Ids of an array of nodes. """
+    def ids(self, arrays, nodes):
+        return set(arrays.idsOf(nodes))
+
+    def testCsr(self):
+        for pipeline, graph, arrays in self.graphs():
+            with self.subTest(pipeline=pipeline[: 40]):
+                indexed = PipelineGraph(graph[0], graph[1], graph[2])
+                self.assertEqual(arrays.ids[: len(graph[0])], list(graph[0]))
+                self.assertEqual(len(arrays.sources), len(indexed.edges))
+
+                for node, id in enumerate(arrays.ids):
+                    self.assertEqual(arrays.index[id], node)
+                    outputs = arrays.indices[arrays.indptr[node]:
+                                             arrays.indptr[node + 1]]
+                    inputs = arrays.rindices[arrays.rindptr[node]:
+                                             arrays.rindptr[node + 1]]
+                    self.assertEqual(arrays.idsOf(outputs),
+                                     indexed.successors(id))
+                    self.assertEqual(self.ids(arrays, inputs),
+                                     set(indexed.predecessors(id)))
+
+    def testComponents(self):
+        for pipeline, graph, arrays in self.graphs():
+            with self.subTest(pipeline=pipeline[: 40]):
+                indexed = PipelineGraph(graph[0], graph[1], graph[2])
+                labels = arrays.components()
+
+                for node, id in enumerate(arrays.ids):
+                    # The component found ignoring the directions.
+                    component = {id}
+                    pending = [id]
+
+                    while pending != []:
+                        for nxt in indexed.successors(pending[-1]) + \
+                                   indexed.predecessors(pending.pop()):
+                            if not nxt in component:
+                                component.add(nxt)
+                                pending.append(nxt)
+
+                    self.assertEqual(labels[node],
+                                     min(arrays.index[other]
+                                         for other in component))
+                    self.assertEqual(self.ids(arrays,
+                                              numpy.flatnonzero(labels ==
+                                                                labels[node])),
+                                     component)
+
+    def testReachable(self):
+        for pipeline, graph, arrays in self.graphs():
+            with self.subTest(pipeline=pipeline[: 40]):
+                indexed = PipelineGraph(graph[0], graph[1], graph[2])
+
+                for id in arrays.ids:
+                    nodes = arrays.nodes([id])
+                    self.assertEqual(self.ids(arrays,
+                                              arrays.reachable(nodes)),
+                                     set(indexed.downstream(id)))
+                    self.assertEqual(self.ids(arrays,
+                                              arrays.reachable(nodes, True)),
+                                     set(indexed.upstream(id)))
+
+                if len(arrays.ids) > 0:
+                    nodes = arrays.nodes(arrays.ids[:: 7])
+                    reached = set()
+
+                    for id in arrays.ids[:: 7]:
+                        reached.update(indexed.downstream(id))
+
+                    self.assertEqual(self.ids(arrays,
+                                              arrays.reachable(nodes)),
+                                     reached)
+
+    def testTopologicalOrder(self):
+        for pipeline, graph, arrays in self.graphs():
+            with self.subTest(pipeline=pipeline[: 40]):
+                indexed = PipelineGraph(graph[0], graph[1], graph[2])
+                order = arrays.idsOf(arrays.topologicalOrder())
+                position = {id: k for k, id in enumerate(order)}
+                cycles = self.ids(arrays, arrays.cycleNodes())
+
+                # The nodes left out are in a cycle or after one.
+                for id in arrays.ids:
+                    if not id in position:
+                        self.assertTrue(id in indexed.downstream(id) or
+                                        any(other in cycles
+                                            for other in
+                                            indexed.upstream(id)))
+
+                for src, dst in indexed.edges:
+                    if dst in position:
+                        self.assertLess(position[src], position[dst])
+
+                self.assertEqual(arrays.hasCycles(), len(order) <
+                                                     len(arrays.ids))
+                self.assertEqual(arrays.idsOf(arrays.topologicalOrder(True)),
+                                 order[:: -1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import unittest
+
+from pipelineparser import LazyValue, PipelineParser
+
+
+class ParseCacheTest(unittest.TestCase):
+    pipelines = ['element1 p0=[1, {a: [2]}] ! element2 p0=3 sig()>s.slot() '
+                 'element3 objectName=s p0={b: [4, 5]}',
+                 'element1 ! element2',
+                 'element3 p0=1']
+
+    def assertStats(self, parser, size, hits, misses, evictions):
+        self.assertEqual(parser.parseCacheStats(),
+                         {'size': size,
+                          'maxSize': parser.parseCacheSize,
+                          'hits': hits,
+                          'misses': misses,
+                          'evictions': evictions})
+
+    def testHitsAndMisses(self):
+        a, b, c = self.pipelines
+        modes = PipelineParser.PipelineRoutingMode
+        parser = PipelineParser()
+        parser.setParseCacheSize(4)
+
+        graph = parser.parsePipeline(a)
+        self.assertStats(parser, 1, 0, 1, 0)
+        self.assertEqual(parser.parsePipeline(a), graph)
+        self.assertStats(parser, 1, 1, 1, 0)
+        parser.parsePipeline(b)
+        self.assertStats(parser, 2, 1, 2, 0)
+
+        # The available types only change the graph if they are checked.
+        parser.setAvailableElementsTypes(['element1'])
+        parser.parsePipeline(a)
+        self.assertStats(parser, 2, 2, 2, 0)
+
+        parser.setPipelineRoutingMode(modes.Remove)
+        element = ['element1', {'p0': [1, {'a': [2]}]}]
+        self.assertEqual(parser.parsePipeline(a), ({'0,0': element}, [], []))
+        self.assertStats(parser, 3, 2, 3, 0)
+        parser.setAvailableElementsTypes(['element1', 'element2'])
+        parser.parsePipeline(a)
+        self.assertStats(parser, 4, 2, 4, 0)
+
+        # The same settings again.
+        parser.setAvailableElementsTypes(['element2', 'element1'])
+        parser.parsePipeline(a)
+        self.assertStats(parser, 4, 3, 4, 0)
+
+        # pipelineDiff() goes through the cache too.
+        parser.setPipelineRoutingMode(modes.NoCheck)
+        parser.pipelineDiff(c)
+        parser.pipelineDiff(a)
+        self.assertStats(parser, 4, 4, 5, 1)
+
+        parser.clearParseCache()
+        self.assertStats(parser, 0, 0, 0, 0)
+
+    def testEviction(self):
+        a, b, c = self.pipelines
+        parser = PipelineParser()
+        parser.setParseCacheSize(2)
+
+        parser.parsePipeline(a)
+        parser.parsePipeline(b)
+
+        # a is used again, so b is the least recently used.
+        parser.parsePipeline(a)
+        parser.parsePipeline(c)
+        self.assertStats(parser, 2, 1, 3, 1)
+        self.assertEqual([key[0] for key in parser.parseCache], [a, c])
+
+        parser.parsePipeline(a)
+        self.assertStats(parser, 2, 2, 3, 1)
+        parser.parsePipeline(b)
+        self.assertStats(parser, 2, 2, 4, 2)
+        self.assertEqual([key[0] for key in parser.parseCache], [a, b])
+
+        # Shrinking the cache evicts the oldest graphs.
+        parser.setParseCacheSize(1)
+        self.assertStats(parser, 1, 2, 4, 3)
+        self.assertEqual([key[0] for key in parser.parseCache], [b])
+
+        parser.setParseCacheSize(0)
+        parser.parsePipeline(b)
+        parser.parsePipeline(b)
+        self.assertStats(parser, 0, 2, 4, 4)
+
+    """ Change every mutable object of a graph. """
+    def mutate(self, graph):
+        instances, connections, ss = graph
+
+        for id in instances:
+            properties = instances[id][1]
+
+            for name in list(properties):
+                value = properties[name]
+
+                if isinstance(value, LazyValue):
+                    value = value.value()
+
+                if isinstance(value, list):
+                    value.append('changed')
+                elif isinstance(value, dict):
+                    value['changed'] = [value.pop(key) for key in list(value)]
+
+                properties[name] = 'changed'
+
+            properties['new'] = 'changed'
+
+        for connection in connections:
+            connection[0] = 'changed'
+
+        for s in ss:
+            s[1] = 'changed'
+
+        instances.clear()
+        instances['changed'] = ['changed', {}]
+        connections.append(['changed', 'changed'])
+
+    def testIsolation(self):
+        for compactIds in [False, True]:
+            for lazyValues in [False, True]:
+                parser = PipelineParser()
+                parser.setCompactIds(compactIds)
+                parser.setLazyValues(lazyValues)
+                parser.setParseCacheSize(4)
+                uncached = PipelineParser()
+                uncached.setCompactIds(compactIds)
+                uncached.setLazyValues(lazyValues)
+
+                with self.subTest(compactIds=compactIds,
+                                  lazyValues=lazyValues):
+                    pipeline = self.pipelines[0]
+                    expected = uncached.parsePipeline(pipeline)
+
+                    # The graph of a miss, then the graphs of the hits.
+                    for k in range(3):
+                        graph = parser.parsePipeline(pipeline)
+                        self.assertEqual(graph, expected)
+                        self.mutate(graph)
+
+                    # The graph kept by pipelineDiff() and its edits, the
+                    # edited pipeline is parsed and cached too.
+                    parser.pipelineDiff(pipeline)
+                    parser.pipelineEdit(len(pipeline), 0, ' element4')
+                    self.mutate((parser.instances1,
+                                 parser.connections1,
+                                 parser.ss1))
+                    self.assertEqual(parser.parsePipeline(pipeline), expected)
+                    self.assertEqual(parser.parseCacheStats()['misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import asyncio
+import copy
+import itertools
+import random
+import threading
+import unittest
+import unittest.mock
+
+from benchmarks import PipelineGenerator
+from pipelineparser import LazyValue, PipelineHistory, PipelineParser
+
+
+""" Returns a property value with the lazy values decoded. """
+def decoded(value):
+    return value.value() if isinstance(value, LazyValue) else value
+
+
+"""
+Returns a graph as ({id: [elementName, properties]}, {connection},
+{signal & slot}), with the values decoded and copied, to compare graphs
+regardless of the order and repetitions of the connections.
+"""
+def normalized(graph):
+    instances, connections, ss = graph
+
+    return {id: [instances[id][0],
+                 {key: copy.deepcopy(decoded(value))
+                  for key, value in instances[id][1].items()}]
+            for id in instances}, \
+           set(tuple(connection) for connection in connections), \
+           set(tuple(s) for s in ss)
+
+
+"""
+Apply the diff instructions to graphs, checking that each one can be
+applied, and compare the result with the expected graph.
+"""
+class DiffTestCase(unittest.TestCase):
+    # Routing modes, Ids modes, values modes and deep diff sizes tested.
+    configs = list(itertools.product(range(4),
+                                     [False, True],
+                                     [False, True],
+                                     [0, 4]))
+
+    """ Returns a parser configured with 'config' and 'generator' types. """
+    def parser(self, generator, config):
+        mode, compactIds, lazyValues, deepDiffSize = config
+        parser = PipelineParser()
+        parser.setAvailableElementsTypes(generator.availableElementTypes)
+        parser.setPipelineRoutingMode(mode)
+        parser.setCompactIds(compactIds)
+        parser.setLazyValues(lazyValues)
+        parser.setDeepDiff(deepDiffSize)
+
+        return parser
+
+    """
+    Returns a generator with some unavailable element types, except for the
+    Fail mode, where they would give void graphs.
+    """
+    def generator(self, seed, config, elements=40):
+        mode = config[0]
+
+        return PipelineGenerator(seed,
+                                 elements=elements,
+                                 chainLength=4,
+                                 referenceDensity=0.2,
+                                 signalSlotDensity=0.3,
+                                 valueDepth=2,
+                                 elementTypes=10,
+                                 unavailableRatio=0 if mode == 1 else 0.2)
+
+    """
+    Returns a list of models, each one an edit of the previous one: elements
+    edited, chains moved and list items changed.
+    """
+    def models(self, generator, count):
+        model = generator.model()
+        rand = random.Random(generator.random.random())
+
+        for chain in model:
+            for item in chain:
+                if not isinstance(item, str):
+                    item[2]['items'] = list(range(rand.randrange(12)))
+
+        models = [model]
+
+        for i in range(count - 1):
+            model = generator.edit(models[-1], 0.2)
+
+            # Chains moved to other rows get new Ids.
+            if rand.random() < 0.5:
+                rand.shuffle(model)
+
+            for chain in model:
+                for item in chain:
+                    if isinstance(item, str) or rand.random() < 0.7:
+                        continue
+
+                    # The edits may replace the list with any value.
+                    items = item[2].get('items')
+
+                    if not isinstance(items, list):
+                        items = item[2]['items'] = []
+                    kind = rand.randrange(3)
+
+                    if kind == 0 and items != []:
+                        del items[rand.randrange(len(items))]
+                    elif kind == 1:
+                        items.insert(rand.randrange(len(items) + 1),
+                                     rand.randrange(100))
+                    elif items != []:
+                        items[rand.randrange(len(items))] = -1
+
+            models.append(model)
+
+        return models
+
+    """ Returns the pipelines of a list of models. """
+    def pipelines(self, generator, count):
+        return [generator.render(model)
+                for model in self.models(generator, count)]
+
+    """ Apply a single instruction to a normalized graph. """
+    def applyOp(self, graph, op, args):
+        DiffOp = PipelineParser.DiffOp
+        instances, connections, ss = graph
+
+        if op == DiffOp.DisconnectSignalsAndSlots:
+            self.assertIn(tuple(args), ss)
+            ss.remove(tuple(args))
+        elif op == DiffOp.DisconnectElement:
+            self.assertIn(tuple(args), connections)
+            connections.remove(tuple(args))
+        elif op == DiffOp.RemoveElement:
+            id = args[0]
+            self.assertIn(id, instances)
+
+            for connection in connections:
+                self.assertNotIn(id, connection)
+
+            for s in ss:
+                self.assertNotIn(id, (s[0], s[2]))
+
+            del instances[id]
+        elif op == DiffOp.ChangeId:
+            self.applyRenames(graph, {args[0]: args[1]})
+        elif op == DiffOp.AddElement:
+            self.assertNotIn(args[0], instances)
+            instances[args[0]] = [args[1], {}]
+        elif op == DiffOp.SetProperties:
+            self.assertIn(args[0], instances)
+            instances[args[0]][1][args[1]] = copy.deepcopy(args[2])
+        elif op == DiffOp.PatchProperty:
+            self.assertIn(args[1], instances[args[0]][1])
+            self.applyPatch(instances[args[0]][1][args[1]], *args[2:])
+        elif op == DiffOp.ResetProperties:
+            self.assertIn(args[1], instances[args[0]][1])
+            del instances[args[0]][1][args[1]]
+        elif op == DiffOp.ConnectElement:
+            self.assertIn(args[0], instances)
+            self.assertIn(args[1], instances)
+            self.assertNotIn(tuple(args), connections)
+            connections.add(tuple(args))
+        elif op == DiffOp.ConnectSignalsAndSlots:
+            self.assertIn(args[0], instances)
+            self.assertIn(args[2], instances)
+            self.assertNotIn(tuple(args), ss)
+            ss.add(tuple(args))
+        else:
+            self.fail('Unknown instruction {0}'.format(op))
+
+    """ Change the Ids of the elements, all at once. """
+    def applyRenames(self, graph, renames):
+        instances, connections, ss = graph
+        moved = {}
+
+        for oldId in renames:
+            self.assertIn(oldId, instances)
+            moved[renames[oldId]] = instances.pop(oldId)
+
+        for newId in moved:
+            self.assertNotIn(newId, instances)
+            instances[newId] = moved[newId]
+
+        def rename(id):
+            return renames.get(id, id)
+
+        renamed = set((rename(src), rename(dst)) for src, dst in connections)
+        connections.clear()
+        connections.update(renamed)
+        renamed = set((rename(s[0]), s[1], rename(s[2]), s[3]) for s in ss)
+        ss.clear()
+        ss.update(renamed)
+
+    """ Apply a PatchProperty change to a list or dictionary value. """
+    def applyPatch(self, value, patchOp, path, item):
+        PatchOp = PipelineParser.PatchOp
+
+        for key in path[: -1]:
+            value = value[key]
+
+        if patchOp == PatchOp.SetItem:
+            value[path[-1]] = copy.deepcopy(item)
+        elif patchOp == PatchOp.InsertItem:
+            value.insert(path[-1], copy.deepcopy(item))
+        else:
+            del value[path[-1]]
+
+    """ Apply a group of instructions returned by compactDiff(). """
+    def applyGroup(self, graph, op, items):
+        DiffOp = PipelineParser.DiffOp
+
+        if op == DiffOp.ChangeId:
+            self.assertEqual(len(set(oldId for oldId, newId in items)),
+                             len(items))
+            self.applyRenames(graph, dict(items))
+        elif op == DiffOp.RemoveElement:
+            for id in items:
+                self.applyOp(graph, op, [id])
+        elif op == DiffOp.SetProperties:
+            for id, properties in items:
+                for key, value in properties.items():
+                    self.applyOp(graph, op, [id, key, value])
+        elif op == DiffOp.ResetProperties:
+            for id, properties in items:
+                for key in properties:
+                    self.applyOp(graph, op, [id, key])
+        else:
+            for args in items:
+                self.applyOp(graph, op, args)
+
+    """ Check that applying 'ops' to 'graph1' gives 'graph2'. """
+    def assertApplies(self, graph1, ops, graph2):
+        graph = normalized(graph1)
+
+        for op, args in ops:
+            self.applyOp(graph, op, args)
+
+        self.assertEqual(graph, normalized(graph2))
+
+
+class PipelineDiffTest(DiffTestCase):
+    def testPipelineDiff(self):
+        for seed, config in itertools.product(range(3), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 4)
+            parser = self.parser(generator, config)
+
+            parser.pipelineDiff(pipelines[0])
+
+            for pipeline1, pipeline2 in zip(pipelines, pipelines[1:]):
+                with self.subTest(seed=seed, config=config):
+                    ops = parser.pipelineDiff(pipeline2)
+                    self.assertApplies(parser.parsePipeline(pipeline1),
+                                       ops,
+                                       parser.parsePipeline(pipeline2))
+
+    def testRenames(self):
+        parser = PipelineParser()
+        parser.pipelineDiff('a ! b c ! d e ! f')
+        ops = parser.pipelineDiff('e ! f a ! b c ! d')
+        changeId = [args for op, args in ops
+                    if op == PipelineParser.DiffOp.ChangeId]
+
+        # The rows form two cycles of three renames, each one broken with a
+        # ghost Id.
+        self.assertEqual(len(changeId), 8)
+        self.assertApplies(parser.parsePipeline('a ! b c ! d e ! f'),
+                           ops,
+                           parser.parsePipeline('e ! f a ! b c ! d'))
+
+
+class PipelineEditTest(DiffTestCase):
+    def testPipelineEdit(self):
+        for seed, config in itertools.product(range(3), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 4)
+            parser = self.parser(generator, config)
+
+            parser.pipelineDiff(pipelines[0])
+
+            for pipeline1, pipeline2 in zip(pipelines, pipelines[1:]):
+                # The edit replacing the text between the common prefix
+                # and the common suffix.
+                start = 0
+
+                while start < min(len(pipeline1), len(pipeline2)) and \
+                      pipeline1[start] == pipeline2[start]:
+                    start += 1
+
+                end = 0
+
+                while end < min(len(pipeline1), len(pipeline2)) - start \
+                      and pipeline1[-1 - end] == pipeline2[-1 - end]:
+                    end += 1
+
+                with self.subTest(seed=seed, config=config):
+                    text = pipeline2[start: len(pipeline2) - end]
+                    ops = parser.pipelineEdit(start,
+                                              len(pipeline1) - start - end,
+                                              text)
+                    self.assertApplies(parser.parsePipeline(pipeline1),
+                                       ops,
+                                       parser.parsePipeline(pipeline2))
+
+    def testLocalEdits(self):
+        pipeline = 'element1 objectName=a p0=1 ! element2 ! ' \
+                   'element3 objectName=b ' \
+                   'element4 ! a. ' \
+                   'element5 ! b. ' \
+                   'element6 objectName=c p0=2 ' \
+                   'element7 ! element1 ' \
+                   'element2 ! element3 ' \
+                   'element4 ! element5'
+
+        # A referenced element, an objectName and an element type. Fail mode
+        # diffs the whole pipeline when the graph fails.
+        edits = [('p0=1', 'p0=3'),
+                 ('objectName=c', 'objectName=d'),
+                 ('element7', 'element8')]
+
+        for mode in [PipelineParser.PipelineRoutingMode.NoCheck,
+                     PipelineParser.PipelineRoutingMode.Remove,
+                     PipelineParser.PipelineRoutingMode.Force]:
+            parser = PipelineParser()
+            parser.setAvailableElementsTypes(['element%d' % i
+                                              for i in range(1, 8)])
+            parser.setPipelineRoutingMode(mode)
+            parser.pipelineDiff(pipeline)
+            pipeline1 = pipeline
+
+            for old, new in edits:
+                with self.subTest(mode=mode, edit=new), \
+                     unittest.mock.patch.object(parser,
+                                                'pipelineDiff',
+                                                side_effect=AssertionError):
+                    pipeline2 = pipeline1.replace(old, new)
+                    graph1 = parser.parsePipeline(pipeline1)
+                    ops = parser.pipelineEdit(pipeline1.index(old),
+                                              len(old),
+                                              new)
+                    graph2 = parser.parsePipeline(pipeline2)
+                    self.assertApplies(graph1, ops, graph2)
+                    self.assertEqual(normalized((parser.instances1,
+                                                 parser.connections1,
+                                                 parser.ss1)),
+                                     normalized(graph2))
+
+                pipeline1 = pipeline2
+
+
+class ParseStreamTest(DiffTestCase):
+    def testParseStream(self):
+        StreamRecord = PipelineParser.StreamRecord
+        DiffOp = PipelineParser.DiffOp
+
+        for seed, config in itertools.product(range(3), self.configs):
+            generator = self.generator(seed, config, 200)
+            pipeline = generator.pipeline()
+            parser = self.parser(generator, config)
+
+            rand = random.Random(seed)
+            chunks = []
+            start = 0
+
+            while start < len(pipeline):
+                size = rand.randrange(1, 64)
+                chunks.append(pipeline[start: start + size])
+                start += size
+
+            # The records as instructions building the graph.
+            ops = []
+            connected = set()
+
+            for record in parser.parseStream(iter(chunks)):
+                if record[0] == StreamRecord.Element:
+                    ops.append([DiffOp.AddElement, record[1: 3]])
+                    ops += [[DiffOp.SetProperties, [record[1], key, value]]
+                            for key, value in record[3].items()]
+                elif not record in connected:
+                    connected.add(record)
+
+                    if record[0] == StreamRecord.Connection:
+                        ops.append([DiffOp.ConnectElement, record[1:]])
+                    else:
+                        ops.append([DiffOp.ConnectSignalsAndSlots,
+                                    record[1:]])
+
+            with self.subTest(seed=seed, config=config):
+                self.assertApplies(({}, [], []),
+                                   ops,
+                                   parser.parsePipeline(pipeline))
+
+
+class CompactDiffTest(DiffTestCase):
+    def testCompactDiff(self):
+        for seed, config in itertools.product(range(3), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 4)
+            parser = self.parser(generator, config)
+
+            parser.pipelineDiff(pipelines[0])
+            ops = []
+
+            for pipeline in pipelines[1:]:
+                ops += parser.pipelineDiff(pipeline)
+
+                # Several diffs compacted at once.
+                with self.subTest(seed=seed, config=config):
+                    graph = normalized(parser.parsePipeline(pipelines[0]))
+
+                    for op, items in parser.compactDiff(ops):
+                        self.applyGroup(graph, op, items)
+
+                    self.assertEqual(graph,
+                                     normalized(parser.parsePipeline(pipeline)))
+
+    def testCompactRenames(self):
+        parser = PipelineParser()
+        parser.pipelineDiff('a ! b c ! d e ! f')
+        groups = parser.compactDiff(parser.pipelineDiff('e ! f a ! b c ! d'))
+
+        # The renames through ghost Ids are collapsed, and the connections
+        # are kept.
+        self.assertEqual([group[0] for group in groups],
+                         [PipelineParser.DiffOp.ChangeId])
+        self.assertEqual(sorted(groups[0][1]),
+                         [['0,0', '0,1'],
+                          ['0,1', '0,2'],
+                          ['0,2', '0,0'],
+                          ['1,0', '1,1'],
+                          ['1,1', '1,2'],
+                          ['1,2', '1,0']])
+
+
+class DiffWavesTest(DiffTestCase):
+    """ Returns the diffs between generated pipelines, for every config. """
+    def diffs(self):
+        for seed, config in itertools.product(range(2), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 3)
+            parser = self.parser(generator, config)
+
+            parser.pipelineDiff(pipelines[0])
+
+            for pipeline1, pipeline2 in zip(pipelines, pipelines[1:]):
+                yield seed, config, parser, \
+                      parser.parsePipeline(pipeline1), \
+                      parser.pipelineDiff(pipeline2), \
+                      parser.parsePipeline(pipeline2)
+
+    def testShuffledWaves(self):
+        rand = random.Random(0)
+
+        for seed, config, parser, graph1, ops, graph2 in self.diffs():
+            waves = parser.diffWaves(ops)
+            self.assertEqual(sum(len(wave) for wave in waves), len(ops))
+
+            # The instructions of a wave can be applied in any order.
+            for wave in waves:
+                rand.shuffle(wave)
+
+            with self.subTest(seed=seed, config=config):
+                self.assertApplies(graph1,
+                                   [op for wave in waves for op in wave],
+                                   graph2)
+
+    def testApplyWaves(self):
+        for seed, config, parser, graph1, ops, graph2 in self.diffs():
+            graph = normalized(graph1)
+            lock = threading.Lock()
+
+            def apply(op):
+                with lock:
+                    self.applyOp(graph, *op)
+
+            with self.subTest(seed=seed, config=config):
+                parser.applyWaves(ops, apply, 4)
+                self.assertEqual(graph, normalized(graph2))
+
+    def testApplyWavesAsync(self):
+        for seed, config, parser, graph1, ops, graph2 in self.diffs():
+            graph = normalized(graph1)
+            rand = random.Random(seed)
+
+            async def apply(op):
+                # Interleave the instructions of the wave.
+                for i in range(rand.randrange(3)):
+                    await asyncio.sleep(0)
+
+                self.applyOp(graph, *op)
+
+            with self.subTest(seed=seed, config=config):
+                asyncio.run(parser.applyWavesAsync(ops, apply))
+                self.assertEqual(graph, normalized(graph2))
+
+    def testApplyWavesFailure(self):
+        DiffOp = PipelineParser.DiffOp
+        parser = PipelineParser()
+        parser.pipelineDiff('')
+        ops = parser.pipelineDiff('a ! b ! c d ! e')
+        applied = []
+
+        def apply(op):
+            if op[0] == DiffOp.AddElement and op[1][0] == '0,1':
+                raise ValueError(op)
+
+            applied.append(op)
+
+        with self.assertRaises(ValueError):
+            parser.applyWaves(ops, apply, 4)
+
+        # The connections wait for the elements, they are never applied.
+        self.assertNotIn(DiffOp.ConnectElement, [op[0] for op in applied])
+
+    def testApplyWavesAsyncFailure(self):
+        DiffOp = PipelineParser.DiffOp
+        parser = PipelineParser()
+        parser.pipelineDiff('')
+        ops = parser.pipelineDiff('a ! b ! c d ! e')
+        cancelled = []
+
+        async def apply(op):
+            if op[0] == DiffOp.AddElement and op[1][0] == '0,1':
+                raise ValueError(op)
+
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(op)
+
+                raise
+
+        async def run():
+            with self.assertRaises(ValueError):
+                await parser.applyWavesAsync(ops, apply)
+
+            # The rest of the wave was cancelled and awaited.
+            self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+
+        asyncio.run(run())
+        self.assertNotEqual(cancelled, [])
+
+
+class HistoryTest(DiffTestCase):
+    """ Returns the nodes of each level of a tree, from the root down. """
+    def levels(self, tree):
+        height, node = tree
+        levels = [[node]]
+
+        for i in range(height):
+            levels.append([child for node in levels[-1] for child in node])
+
+        return levels[:: -1]
+
+    def testChunking(self):
+        history = PipelineHistory()
+        mask = (1 << history._nodeBits) - 1
+        instances = {str(i): ['element{0}'.format(i % 10), {'p0': i}]
+                     for i in range(1000)}
+        connections = [[str(i), str(i + 1)] for i in range(999)]
+        graphs = []
+
+        for revision in range(4):
+            graphs.append((dict(instances), list(connections), []))
+            self.assertEqual(history.commit(graphs[-1]), revision)
+
+            # A property changed, an element added and one removed.
+            instances['7'] = ['element7', {'p0': revision}]
+            instances[str(1000 + revision)] = ['element1', {}]
+            del instances[str(500 + revision)]
+
+        for revision, graph in enumerate(graphs):
+            self.assertEqual(history.graph(revision), graph)
+            self.assertEqual(list(history.graph(revision)[0]), list(graph[0]))
+
+        for revision in history.revisions():
+            instances, connections, ss = history.roots[revision]
+
+            for k, level in enumerate(self.levels(instances)):
+                for node in level:
+                    self.assertLessEqual(len(node), history._maxNodeSize)
+
+                # Each node but the last ends at a key with its hash bits
+                # set to 0 or when it's full.
+                for node in level[: -1]:
+                    if len(node) == history._maxNodeSize:
+                        continue
+
+                    last = node[-1]
+
+                    for i in range(k):
+                        last = last[0]
+
+                    self.assertEqual((hash((last[0],))
+                                      >> k * history._nodeBits) & mask,
+                                     0)
+
+            self.assertEqual(ss, (0, ()))
+
+            if revision == 0:
+                continue
+
+            previous = history.roots[revision - 1]
+
+            # The connections didn't change, and only the leaves with
+            # changed elements are new.
+            self.assertIs(connections[1], previous[1][1])
+            leaves = {id(leaf) for leaf in self.levels(previous[0])[0]}
+            newLeaves = [leaf for leaf in self.levels(instances)[0]
+                         if not id(leaf) in leaves]
+            self.assertLessEqual(len(newLeaves), 5)
+            self.assertIs(history.graph(revision)[0]['0'],
+                          history.graph(revision - 1)[0]['0'])
+
+    def testMaxRevisions(self):
+        history = PipelineHistory(3)
+        graphs = [({str(i): ['element1', {}]}, [], []) for i in range(5)]
+
+        for revision, graph in enumerate(graphs):
+            self.assertEqual(history.commit(graph), revision)
+
+        self.assertEqual(history.revisions(), range(2, 5))
+
+        for revision in [-1, 0, 1, 5]:
+            with self.assertRaises(IndexError):
+                history.graph(revision)
+
+        for revision in history.revisions():
+            self.assertEqual(history.graph(revision), graphs[revision])
+
+    def testRevisionDiff(self):
+        for seed, config in itertools.product(range(2), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 4)
+            parser = self.parser(generator, config)
+            parser.setHistory(PipelineHistory())
+
+            for pipeline in pipelines:
+                parser.pipelineDiff(pipeline)
+
+            for revision1, revision2 in itertools.permutations(range(4), 2):
+                with self.subTest(seed=seed,
+                                  config=config,
+                                  revision1=revision1,
+                                  revision2=revision2):
+                    graph1 = parser.parsePipeline(pipelines[revision1])
+                    graph2 = parser.parsePipeline(pipelines[revision2])
+                    ops = parser.revisionDiff(revision1, revision2)
+                    self.assertApplies(graph1, ops, graph2)
+
+            self.assertEqual(parser.history.revisions(), range(4))
+
+    def testCheckout(self):
+        for seed, config in itertools.product(range(2), self.configs):
+            generator = self.generator(seed, config)
+            pipelines = self.pipelines(generator, 3)
+            parser = self.parser(generator, config)
+            history = PipelineHistory()
+            parser.setHistory(history)
+
+            for pipeline in pipelines:
+                parser.pipelineDiff(pipeline)
+
+            for k, revision in enumerate([0, 2, 1, 3]):
+                with self.subTest(seed=seed, config=config, revision=revision):
+                    graph1 = parser.instances1, \
+                             parser.connections1, \
+                             parser.ss1
+                    graph2 = history.graph(revision)
+                    ops = parser.checkoutRevision(revision)
+                    self.assertApplies(graph1, ops, graph2)
+                    self.assertEqual(normalized((parser.instances1,
+                                                 parser.connections1,
+                                                 parser.ss1)),
+                                     normalized(graph2))
+
+                    # The checked out graph is a new revision.
+                    self.assertEqual(history.revisions()[-1], 3 + k)
+                    self.assertEqual(normalized(history.graph(3 + k)),
+                                     normalized(graph2))
+
+            # pipelineEdit() goes on from an empty pipeline.
+            with self.subTest(seed=seed, config=config):
+                graph1 = history.graph(history.revisions()[-1])
+                ops = parser.pipelineEdit(0, 0, pipelines[0])
+                self.assertApplies(graph1,
+                                   ops,
+                                   parser.parsePipeline(pipelines[0]))
+
+    def testWithoutHistory(self):
+        parser = PipelineParser()
+        parser.pipelineDiff('element1 ! element2')
+
+        with self.assertRaisesRegex(ValueError, 'no history'):
+            parser.revisionDiff(0, 0)
+
+        with self.assertRaisesRegex(ValueError, 'no history'):
+            parser.checkoutRevision(0)
+
+        self.assertEqual(parser.instances1, {'0,0': ['element1', {}],
+                                             '1,0': ['element2', {}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
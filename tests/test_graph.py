@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import unittest
+
+from benchmarks import PipelineGenerator
+from pipelineparser import PipelineGraph, PipelineParser
+
+
+class PipelineGraphTest(unittest.TestCase):
+    # 0,0 -> 1,0 -> 2,0 -> 0,0 is a loop, 0,1 -> 1,1 joins it at 2,0 and 0,2
+    # isn't connected.
+    pipeline = 'element1 objectName=a ! element2 ! ' \
+               'element3 objectName=c ! a. ' \
+               'element4 objectName=b sig1()>a.slot1() ! element2 ! c. ' \
+               'a.sig2()>b.slot2() ' \
+               'element5'
+
+    def graph(self):
+        return PipelineParser().parseGraph(self.pipeline)
+
+    def testNeighbours(self):
+        graph = self.graph()
+
+        self.assertEqual(graph.successors('0,0'), ['1,0'])
+        self.assertEqual(graph.successors('1,1'), ['2,0'])
+        self.assertEqual(graph.successors('0,2'), [])
+        self.assertEqual(graph.successors('9,9'), [])
+        self.assertEqual(graph.predecessors('2,0'), ['1,0', '1,1'])
+        self.assertEqual(graph.predecessors('0,0'), ['2,0'])
+        self.assertEqual(graph.predecessors('0,1'), [])
+
+    def testSignals(self):
+        graph = self.graph()
+        s1 = ('0,1', 'sig1()', '0,0', 'slot1()')
+        s2 = ('0,0', 'sig2()', '0,1', 'slot2()')
+
+        self.assertEqual(graph.sentSignals('0,0'), [s2])
+        self.assertEqual(graph.sentSignals('0,1'), [s1])
+        self.assertEqual(graph.receivedSignals('0,0'), [s1])
+        self.assertEqual(graph.receivedSignals('0,1'), [s2])
+        self.assertEqual(graph.sentSignals('1,0'), [])
+        self.assertEqual(graph.receivedSignals('0,2'), [])
+
+    def testElementIndexes(self):
+        graph = self.graph()
+
+        self.assertEqual(graph.elementsOfType('element2'), ['1,0', '1,1'])
+        self.assertEqual(graph.elementsOfType('element5'), ['0,2'])
+        self.assertEqual(graph.elementsOfType('element6'), [])
+        self.assertEqual(graph.elementByObjectName('a'), '0,0')
+        self.assertEqual(graph.elementByObjectName('b'), '0,1')
+        self.assertEqual(graph.elementByObjectName('d'), None)
+
+    def testReachable(self):
+        graph = self.graph()
+
+        # Nearest first, and the start only if it's in a loop.
+        self.assertEqual(graph.downstream('0,1'), ['1,1', '2,0', '0,0', '1,0'])
+        self.assertEqual(graph.downstream('0,0'), ['1,0', '2,0', '0,0'])
+        self.assertEqual(graph.upstream('2,0'), ['1,0', '1,1', '0,0', '0,1',
+                                                 '2,0'])
+        self.assertEqual(graph.upstream('0,1'), [])
+        self.assertEqual(graph.downstream('0,2'), [])
+
+    def testUpdates(self):
+        graph = self.graph()
+
+        # Replacing an element moves it in the indexes.
+        graph.addElement('1,1', 'element6', {'objectName': 'a'})
+        self.assertEqual(graph.elementsOfType('element2'), ['1,0'])
+        self.assertEqual(graph.elementsOfType('element6'), ['1,1'])
+        self.assertEqual(graph.elementByObjectName('a'), '1,1')
+        self.assertEqual(graph.successors('1,1'), ['2,0'])
+
+        graph.addElement('1,1', 'element2')
+        self.assertEqual(graph.elementsOfType('element6'), [])
+        self.assertEqual(graph.elementByObjectName('a'), None)
+
+        self.assertEqual(graph.removeElement('0,0'), (['2,0'], ['1,0']))
+        self.assertEqual(graph.elementsOfType('element1'), [])
+        self.assertEqual(graph.predecessors('1,0'), [])
+        self.assertEqual(graph.receivedSignals('0,1'), [])
+        self.assertEqual(graph.sentSignals('0,1'), [])
+        self.assertEqual(graph.downstream('0,1'), ['1,1', '2,0'])
+
+        graph.removeElements(['2,0'], True)
+        self.assertEqual(graph.successors('1,1'), [])
+        self.assertEqual(graph.successors('1,0'), [])
+
+        graph.connect('0,1', '0,2')
+        self.assertEqual(graph.upstream('0,2'), ['0,1'])
+        self.assertEqual(graph.toLists(),
+                         ({'1,0': ['element2', {}],
+                           '0,1': ['element4', {'objectName': 'b'}],
+                           '1,1': ['element2', {}],
+                           '0,2': ['element5', {}]},
+                          [['0,1', '1,1'], ['0,1', '0,2']],
+                          []))
+
+    def testScans(self):
+        parser = PipelineParser()
+
+        for seed in range(4):
+            generator = PipelineGenerator(seed,
+                                          elements=200,
+                                          chainLength=4,
+                                          referenceDensity=0.3,
+                                          signalSlotDensity=0.3,
+                                          elementTypes=10)
+            instances, connections, ss = \
+                parser.parsePipeline(generator.pipeline())
+            graph = PipelineGraph(instances, connections, ss)
+
+            # The indexes give the same results as scanning the lists.
+            for id in instances:
+                with self.subTest(seed=seed, id=id):
+                    self.assertEqual(set(graph.successors(id)),
+                                     {dst for src, dst in connections
+                                      if src == id})
+                    self.assertEqual(set(graph.predecessors(id)),
+                                     {src for src, dst in connections
+                                      if dst == id})
+                    self.assertEqual(set(graph.sentSignals(id)),
+                                     {tuple(s) for s in ss if s[0] == id})
+                    self.assertEqual(set(graph.receivedSignals(id)),
+                                     {tuple(s) for s in ss if s[2] == id})
+
+                    elementName, properties = instances[id]
+                    self.assertIn(id, graph.elementsOfType(elementName))
+
+                    if 'objectName' in properties:
+                        self.assertEqual(graph.elementByObjectName(
+                                             properties['objectName']),
+                                         id)
+
+    def testWithoutElementIndexes(self):
+        parser = PipelineParser()
+        instances, connections, ss = parser.parsePipeline(self.pipeline)
+        graph = PipelineGraph(instances, connections, ss, False)
+
+        self.assertEqual(graph.types, None)
+        self.assertEqual(graph.names, None)
+        self.assertEqual(graph.downstream('0,1'), ['1,1', '2,0', '0,0', '1,0'])
+        graph.addElement('0,3', 'element6')
+        self.assertEqual(graph.removeElement('0,3'), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
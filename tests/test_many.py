@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import itertools
+import unittest
+
+from benchmarks import PipelineGenerator
+from pipelineparser import PipelineParser
+
+
+"""
+Compare the results of parseMany() and diffMany() with the results of
+parsing and diffing the pipelines one by one, in the workers and in the
+calling process.
+"""
+class ManyTest(unittest.TestCase):
+    # Routing modes, Ids modes and values modes tested.
+    configs = list(itertools.product(range(4), [False, True], [False, True]))
+
+    """ Returns a parser configured with 'config' and 'generator' types. """
+    def parser(self, generator, config):
+        mode, compactIds, lazyValues = config
+        parser = PipelineParser()
+        parser.setAvailableElementsTypes(generator.availableElementTypes)
+        parser.setPipelineRoutingMode(mode)
+        parser.setCompactIds(compactIds)
+        parser.setLazyValues(lazyValues)
+        parser.setDeepDiff(4)
+
+        return parser
+
+    """
+    Returns a generator and a list of pipelines, each one an edit of the
+    previous one.
+    """
+    def pipelines(self, seed, config, count=12):
+        mode = config[0]
+        generator = PipelineGenerator(seed,
+                                      elements=40,
+                                      chainLength=4,
+                                      referenceDensity=0.2,
+                                      signalSlotDensity=0.3,
+                                      valueDepth=2,
+                                      elementTypes=10,
+                                      unavailableRatio=0 if mode == 1
+                                                       else 0.2)
+        models = [generator.model()]
+
+        for i in range(count - 1):
+            models.append(generator.edit(models[-1], 0.2))
+
+        return generator, [generator.render(model) for model in models]
+
+    def testParseMany(self):
+        for seed, config in itertools.product(range(2), self.configs):
+            generator, pipelines = self.pipelines(seed, config)
+
+            for processes in [1, 3]:
+                with self.subTest(seed=seed,
+                                  config=config,
+                                  processes=processes):
+                    graphs = self.parser(generator, config).parseMany(
+                                 pipelines, processes)
+                    parser = self.parser(generator, config)
+                    self.assertEqual(graphs,
+                                     [parser.parsePipeline(pipeline)
+                                      for pipeline in pipelines])
+
+    def testDiffMany(self):
+        for seed, config in itertools.product(range(2), self.configs):
+            generator, pipelines = self.pipelines(seed, config)
+            pairs = list(zip(pipelines, pipelines[1:])) + \
+                    [(pipelines[-1], pipelines[0]), ('', pipelines[0])]
+
+            for processes in [1, 3]:
+                with self.subTest(seed=seed,
+                                  config=config,
+                                  processes=processes):
+                    diffs = self.parser(generator, config).diffMany(
+                                iter(pairs), processes)
+                    parser = self.parser(generator, config)
+                    self.assertEqual(diffs,
+                                     [parser.graphDiff(
+                                          parser.parsePipeline(pipeline1),
+                                          parser.parsePipeline(pipeline2))
+                                      for pipeline1, pipeline2 in pairs])
+
+    def testEmpty(self):
+        parser = PipelineParser()
+
+        self.assertEqual(parser.parseMany([]), [])
+        self.assertEqual(parser.diffMany([], 4), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
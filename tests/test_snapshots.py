@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import os
+import struct
+import tempfile
+import unittest
+
+from benchmarks import PipelineGenerator
+from pipelineparser import PipelineParser
+
+
+class SnapshotTest(unittest.TestCase):
+    pipeline = 'element1 objectName=src p0=[1, -2.5, "três", {a: []}] ' \
+               'p1=99999999999999999999 ! element2 p0={"x": [true, y]} ' \
+               'sig()>src.slot() ! src. ' \
+               'element3 p0="" ! element2'
+
+    """ Returns the parsers with string and compact Ids, and lazy values. """
+    def parsers(self):
+        for compactIds in [False, True]:
+            for lazyValues in [False, True]:
+                parser = PipelineParser()
+                parser.setCompactIds(compactIds)
+                parser.setLazyValues(lazyValues)
+
+                yield parser
+
+    """ Returns a path for a snapshot file removed after the test. """
+    def fileName(self):
+        fd, fileName = tempfile.mkstemp(suffix='.snapshot')
+        os.close(fd)
+        self.addCleanup(os.remove, fileName)
+
+        return fileName
+
+    def testRoundTrip(self):
+        pipelines = ['', self.pipeline]
+
+        for seed in range(3):
+            generator = PipelineGenerator(seed,
+                                          elements=100,
+                                          signalSlotDensity=0.3,
+                                          valueDepth=3)
+            pipelines.append(generator.pipeline())
+
+        for parser in self.parsers():
+            for pipeline in pipelines:
+                with self.subTest(pipeline=pipeline[: 40],
+                                  compactIds=parser.compactIds,
+                                  lazyValues=parser.lazyValues):
+                    graph = parser.parsePipeline(pipeline)
+                    loaded = parser.loadGraph(parser.dumpGraph(graph))
+                    self.assertEqual(loaded, graph)
+                    self.assertEqual(list(loaded[0]), list(graph[0]))
+
+    def testTruncated(self):
+        parser = PipelineParser()
+        data = parser.dumpGraph(parser.parsePipeline(self.pipeline))
+
+        for size in range(len(data)):
+            with self.subTest(size=size):
+                with self.assertRaises(ValueError):
+                    parser.loadGraph(data[: size])
+
+    def testCorrupted(self):
+        parser = PipelineParser()
+        data = parser.dumpGraph(parser.parsePipeline(self.pipeline))
+
+        # Every byte but the reserved field of the header.
+        for pos in list(range(6)) + list(range(8, len(data))):
+            for bit in [0, 7]:
+                corrupted = bytearray(data)
+                corrupted[pos] ^= 1 << bit
+
+                with self.subTest(pos=pos, bit=bit):
+                    with self.assertRaises(ValueError):
+                        parser.loadGraph(bytes(corrupted))
+
+        with self.assertRaises(ValueError):
+            parser.loadGraph(data + b'\0')
+
+        with self.assertRaises(ValueError):
+            parser.loadGraph(b'')
+
+    def testVersionMismatch(self):
+        parser = PipelineParser()
+        graph = parser.parsePipeline(self.pipeline)
+        data = bytearray(parser.dumpGraph(graph))
+
+        for version in [0, PipelineParser._snapshotVersion + 1]:
+            struct.pack_into('<H', data, 4, version)
+
+            with self.assertRaisesRegex(ValueError, 'version'):
+                parser.loadGraph(bytes(data))
+
+    def testLoadState(self):
+        mode = PipelineParser.PipelineRoutingMode.Force
+        pipeline1 = self.pipeline
+        pipeline2 = self.pipeline.replace('element3', 'element4')
+        fileName = self.fileName()
+
+        for parser in self.parsers():
+            with self.subTest(compactIds=parser.compactIds,
+                              lazyValues=parser.lazyValues):
+                parser.setAvailableElementsTypes(['element1', 'element2'])
+                parser.setPipelineRoutingMode(mode)
+                parser.setParseCacheSize(4)
+                parser.pipelineDiff(pipeline1)
+                parser.parsePipeline(pipeline2)
+                parser.saveState(fileName)
+
+                loaded = PipelineParser()
+                loaded.setCompactIds(parser.compactIds)
+                loaded.setLazyValues(parser.lazyValues)
+                loaded.loadState(fileName)
+
+                self.assertEqual((loaded.instances1,
+                                  loaded.connections1,
+                                  loaded.ss1),
+                                 (parser.instances1,
+                                  parser.connections1,
+                                  parser.ss1))
+                self.assertEqual(loaded.pipelineRoutingMode, mode)
+                self.assertEqual(loaded.availableElementTypes,
+                                 ['element1', 'element2'])
+                self.assertEqual(loaded.parseCacheSize, 4)
+                self.assertEqual(list(loaded.parseCache.items()),
+                                 list(parser.parseCache.items()))
+                self.assertEqual(loaded.editState['pipeline'], pipeline1)
+                self.assertEqual(loaded.editState['config'],
+                                 parser.editState['config'])
+
+                # The restored parser goes on from the saved graph.
+                self.assertEqual(loaded.parsePipeline(pipeline2),
+                                 parser.parsePipeline(pipeline2))
+                self.assertEqual(loaded.parseCacheStats()['hits'], 1)
+                offset = pipeline1.index('element3')
+                self.assertEqual(loaded.pipelineEdit(offset, 8, 'element4'),
+                                 parser.pipelineDiff(pipeline2))
+                self.assertEqual(loaded.instances1, parser.instances1)
+
+                # The current graph is the first graph of the snapshot.
+                with open(fileName, 'rb') as f:
+                    self.assertEqual(loaded.loadGraph(f.read()),
+                                     parser.parsePipeline(pipeline1))
+
+    def testLoadStateWithoutState(self):
+        parser = PipelineParser()
+        fileName = self.fileName()
+
+        with open(fileName, 'wb') as f:
+            f.write(parser.dumpGraph(parser.parsePipeline(self.pipeline)))
+
+        with self.assertRaises(ValueError):
+            parser.loadState(fileName)
+
+
+if __name__ == '__main__':
+    unittest.main()
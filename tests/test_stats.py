@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import collections
+import io
+import unittest
+
+from benchmarks import PipelineGenerator
+from pipelineparser import PipelineParser, PipelineStats
+
+
+class PipelineStatsTest(unittest.TestCase):
+    # 14 tokens: 5 elements, 2 properties, 4 pipes, 2 references and a
+    # signal & slot referencing a. element3 is in two chains, and the one in
+    # the middle of the first chain is rerouted in Force mode.
+    pipeline = 'element1 objectName=a p0=[1, 2] ! element3 ! element2 ! a. ' \
+               'element3 sig()>a.slot() ' \
+               'element4 ! a.'
+    counts = {'tokens': 14,
+              'chains': 3,
+              'references': 3,
+              'elements': 5,
+              'connections': 4,
+              'signalsAndSlots': 1}
+    routedCounts = {'removedElements': 2,
+                    'removedConnections': 2}
+
+    """ Returns a parser with 'stats' in routing mode 'mode'. """
+    def parser(self, stats, mode):
+        parser = PipelineParser()
+        parser.setAvailableElementsTypes(['element1', 'element2', 'element4'])
+        parser.setPipelineRoutingMode(mode)
+        parser.setStats(stats)
+
+        return parser
+
+    def testParseCounts(self):
+        modes = PipelineParser.PipelineRoutingMode
+        routed = dict(self.counts, **self.routedCounts)
+        expected = {modes.NoCheck: self.counts,
+                    modes.Fail: {'failedGraphs': 1},
+                    modes.Remove: dict(routed, reroutedConnections=0),
+                    modes.Force: dict(routed, reroutedConnections=1)}
+
+        for mode in range(4):
+            with self.subTest(mode=mode):
+                stats = PipelineStats()
+                parser = self.parser(stats, mode)
+                parser.parsePipeline(self.pipeline)
+                self.assertEqual(stats.counts, expected[mode])
+
+                # The counts add up.
+                parser.parsePipeline(self.pipeline)
+                self.assertEqual(stats.counts,
+                                 {name: 2 * count
+                                  for name, count in expected[mode].items()})
+
+                stats.reset()
+                self.assertEqual(stats.counts, {})
+                self.assertEqual(stats.times, {})
+
+    def testStreamCounts(self):
+        mode = PipelineParser.PipelineRoutingMode.Force
+        stats = PipelineStats()
+        parser = self.parser(stats, mode)
+        list(parser.parseStream(io.StringIO(self.pipeline), 8))
+
+        # The chains are joined in a graph, without counting the tokens.
+        expected = dict(self.counts, **self.routedCounts)
+        del expected['tokens']
+        del expected['chains']
+        expected['reroutedConnections'] = 1
+        self.assertEqual(stats.counts, expected)
+        self.assertEqual(set(stats.times), {'resolve', 'join', 'route'})
+
+    def testDiffCounts(self):
+        stats = PipelineStats()
+        parser = self.parser(stats, PipelineParser.PipelineRoutingMode.NoCheck)
+        parser.pipelineDiff('element1 ! element2 p0=1 element3')
+        stats.reset()
+        ops = parser.pipelineDiff('element1 ! element2 p0=2 '
+                                  'element4 ! element3')
+
+        self.assertEqual(len(ops), 4)
+        self.assertEqual(stats.counts, {'tokens': 7,
+                                        'chains': 2,
+                                        'references': 0,
+                                        'elements': 4,
+                                        'connections': 2,
+                                        'signalsAndSlots': 0,
+                                        'unchangedElements': 0,
+                                        'matches': 3,
+                                        'ops.ChangeId': 1,
+                                        'ops.AddElement': 1,
+                                        'ops.SetProperties': 1,
+                                        'ops.ConnectElement': 1})
+        self.assertEqual(set(stats.times), {'parse',
+                                            'parseValue',
+                                            'resolve',
+                                            'structure',
+                                            'pairUnchanged',
+                                            'match',
+                                            'diffElements',
+                                            'diffConnections',
+                                            'diffSignalsAndSlots',
+                                            'emitOps'})
+
+    def testSyntheticCounts(self):
+        opNames = {getattr(PipelineParser.DiffOp, name): name
+                   for name in vars(PipelineParser.DiffOp)
+                   if not name.startswith('_')}
+
+        for seed in range(3):
+            generator = PipelineGenerator(seed,
+                                          elements=200,
+                                          chainLength=4,
+                                          referenceDensity=0.2,
+                                          signalSlotDensity=0.3,
+                                          valueDepth=2)
+            model = generator.model()
+            pipeline1 = generator.render(model)
+            pipeline2 = generator.render(generator.edit(model, 0.2))
+            measures = []
+            stats = PipelineStats(lambda *measure: measures.append(measure))
+            parser = PipelineParser()
+            parser.setStats(stats)
+
+            with self.subTest(seed=seed):
+                instances, connections, ss = parser.parsePipeline(pipeline1)
+                self.assertEqual(stats.counts['tokens'],
+                                 len(list(parser._scanTokens(pipeline1))))
+                self.assertEqual(stats.counts['elements'], len(instances))
+                self.assertEqual(stats.counts['connections'],
+                                 len(connections))
+                self.assertEqual(stats.counts['signalsAndSlots'], len(ss))
+
+                parser.pipelineDiff(pipeline1)
+                stats.reset()
+                del measures[:]
+                ops = parser.pipelineDiff(pipeline2)
+                self.assertEqual({name[4:]: count
+                                  for name, count in stats.counts.items()
+                                  if name.startswith('ops.')},
+                                 collections.Counter(opNames[op[0]]
+                                                     for op in ops))
+
+                # The callback gets every measure.
+                counts = collections.Counter()
+                times = collections.Counter()
+
+                for kind, name, value in measures:
+                    if kind == 'count':
+                        counts[name] += value
+                    else:
+                        self.assertEqual(kind, 'time')
+                        self.assertGreaterEqual(value, 0)
+                        times[name] += value
+
+                self.assertEqual(counts, stats.counts)
+                self.assertEqual(set(times), set(stats.times))
+
+                for phase in times:
+                    self.assertAlmostEqual(times[phase], stats.times[phase])
+
+    def testDisabled(self):
+        stats = PipelineStats()
+        parser = self.parser(stats, PipelineParser.PipelineRoutingMode.Force)
+        parser.setStats(None)
+        parser.pipelineDiff(self.pipeline)
+        parser.pipelineDiff('')
+
+        self.assertEqual(stats.counts, {})
+        self.assertEqual(stats.times, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
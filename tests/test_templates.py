@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Pipeline parser.
+# Copyright (C) 2012  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with This program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Email   : hipersayan DOT x AT gmail DOT com
+# Web-Site: http://hipersayanx.blogspot.com/
+
+import unittest
+
+from pipelineparser import PipelineParser
+
+
+class TemplateTest(unittest.TestCase):
+    """ Compare the instance of a template with the parsed pipeline. """
+    def assertInstance(self, parser, template, values):
+        text = template
+
+        for name in values:
+            text = text.replace('${' + name + '}', str(values[name]))
+
+        graph = parser.compileTemplate(template).instantiate(values)
+
+        self.assertEqual(graph, parser.parsePipeline(text))
+
+    def testPropertyValues(self):
+        parser = PipelineParser()
+        template = 'filesrc location=${uri} ! encoder bitrate=${bitrate} ' \
+                   'caps="video/x-raw, width=${width}"'
+
+        for values in [{'uri': '/tmp/a.ogv', 'bitrate': 128, 'width': 640},
+                       {'uri': 'b', 'bitrate': '256', 'width': 320}]:
+            self.assertInstance(parser, template, values)
+
+    def testReferences(self):
+        parser = PipelineParser()
+        template = 'filesrc objectName=src_${n} ! decoder ! ' \
+                   'sink_${n}. mixer objectName=sink_${n} ! src_${n}.'
+
+        for n in range(3):
+            self.assertInstance(parser, template, {'n': n})
+
+    def testSignalsAndSlots(self):
+        parser = PipelineParser()
+        template = 'timer objectName=timer_${n} ' \
+                   'timer_${n}.timeout()>label_${n}.update() ' \
+                   'label objectName=label_${n} ' \
+                   'timer_${n}.stopped()>clear()'
+
+        for n in ['a', 'b']:
+            self.assertInstance(parser, template, {'n': n})
+
+    def testWholeValues(self):
+        parser = PipelineParser()
+        template = parser.compileTemplate('element list=${list} ! sink')
+        instances, connections, ss = template.instantiate({'list': [1, 2]})
+
+        self.assertEqual(instances['0,0'][1]['list'], [1, 2])
+
+    def testSharedElements(self):
+        parser = PipelineParser()
+        template = parser.compileTemplate('source ! element value=${v}')
+        instances1 = template.instantiate({'v': 1})[0]
+        instances2 = template.instantiate({'v': 2})[0]
+
+        self.assertIs(instances1['0,0'], instances2['0,0'])
+        self.assertEqual(instances1['1,0'][1], {'value': 1})
+        self.assertEqual(instances2['1,0'][1], {'value': 2})
+        self.assertEqual(list(instances1), ['0,0', '1,0'])
+
+    def testUnsupportedPlaceholders(self):
+        parser = PipelineParser()
+
+        for template in ['element_${n} ! sink',
+                         'element property_${n}=1',
+                         'element signal_${n}()>sink.slot() '
+                         'sink objectName=sink']:
+            with self.assertRaises(ValueError):
+                parser.compileTemplate(template)
+
+
+if __name__ == '__main__':
+    unittest.main()